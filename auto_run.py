@@ -26,7 +26,7 @@ status_python = tk.StringVar()
 status_node.set("Node App: Not running")
 status_python.set("Python Server: Not running")
 
-SERIAL_PORT = "COM1"  # Match with server.py
+SERIAL_PORT = "COM1"  # Match serial_port in table_config.json
 BAUD_RATE = 9600
 
 def start_servers():
@@ -43,7 +43,7 @@ def start_servers():
     if python_proc is None or python_proc.poll() is not None:
         python_proc = subprocess.Popen(
             # f'"{VENV_PYTHON}" server.py',
-            "python server.py",
+            "python -m server",  # -m runs from cached bytecode, which starts faster
             cwd=os.getcwd(),
             shell=True
         )
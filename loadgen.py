@@ -0,0 +1,333 @@
+"""Synthetic websocket load for server.py's display fan-out.
+
+Opens hundreds of display clients against one server, in the mix of roles a
+table runs (dealer, stats wall, player tablets, surveillance), then has a
+controller client play rounds of manual actions (add_card, player_played,
+reveal_hands, undo_last) and measures how long each broadcast takes to reach
+every display and how many frames never arrive.
+
+    python loadgen.py                           # 200 displays, 10 rounds, own server
+    python loadgen.py --clients 500 --rate 50   # heavier
+    python loadgen.py --no-actions              # connect and hold only
+    python loadgen.py --url ws://host:6789      # against a server that is already running
+
+Unless --url is given, a server is started with --memory-db so no MongoDB is
+needed. Latency runs from the controller sending an action to a display
+receiving each numbered frame it caused. The displays share this process, so
+the figures include their own scheduling; on a small box run the server on
+another core or machine for the server's share alone.
+
+Prints a JSON report. Exits 1 when frames were dropped, displays were
+disconnected, or p99 exceeds --max-p99-ms.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import msgpack
+import websockets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CARDS = [rank + suit for rank in "A23456789TJQK" for suit in "SDCH"]
+# One table's worth of displays; repeated to make up --clients
+ROLES = ("dealer", "stats", "player1", "player2", "player3", "player4", "player5", "player6", "stats")
+# The frame each controller action broadcasts first; an "error" frame also answers any of them
+FIRST_FRAMES = {
+    "add_player": ("player_added",),
+    "start_manual": ("deck_shuffled",),
+    "shuffle_deck": ("deck_shuffled",),
+    "add_card": ("card_added", "duplicate_card"),
+    "undo_last": ("undo_completed",),
+    "player_played": ("player_acted",),
+    "reveal_hands": ("hands_revealed",),
+    "reset_table": ("table_reset",),
+}
+HEARTBEAT = '{"action": "heartbeat"}'  # Sent by the server; clients that do not answer are reaped
+ANSWER_TIMEOUT = 5  # Seconds the controller waits for an action's first frame
+DRAIN_SECONDS = 2  # Quiet time after the last action before the displays are read out
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+
+def summary_ms(seconds):
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def frame_info(payload):
+    """(seq or None, action or None) of a received frame, without decoding the whole of a JSON one."""
+    if isinstance(payload, bytes):
+        message = msgpack.unpackb(payload, strict_map_key=False)
+        return message.get("seq"), message.get("action")
+    seq = None
+    if payload.startswith('{"seq": '):
+        end = payload.index(",", 8)
+        seq = int(payload[8:end])
+        payload = "{" + payload[end + 2:]
+    if payload.startswith('{"action": "'):
+        return seq, payload[12:payload.index('"', 12)]
+    return seq, None
+
+
+class Display:
+    """One connected display: when it connected and every numbered frame it received."""
+
+    def __init__(self, role, binary):
+        self.role = role
+        self.binary = binary
+        self.connect_seconds = None
+        self.received = []  # (seq, perf_counter at receipt)
+        self.closed = None
+
+    async def run(self, url, ready):
+        started = time.perf_counter()
+        query = f"role={self.role}" + ("&codec=msgpack" if self.binary else "")
+        try:
+            async with websockets.connect(f"{url}/?{query}", max_size=None, open_timeout=30) as ws:
+                async for payload in ws:
+                    if payload == HEARTBEAT:
+                        await ws.send(HEARTBEAT)
+                        continue
+                    now = time.perf_counter()
+                    seq, action = frame_info(payload)
+                    if seq is not None:
+                        self.received.append((seq, now))
+                    elif action == "update_game" and self.connect_seconds is None:
+                        # The snapshot ends the session start; from here on it is broadcast to
+                        self.connect_seconds = now - started
+                        ready.release()
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            self.closed = f"{type(e).__name__}: {e}"
+        if self.connect_seconds is None:
+            ready.release()
+
+
+class Controller:
+    """The client that plays the rounds; remembers when each action was sent and the first frame it caused.
+
+    Commands run one at a time on the server, so the frames an action causes
+    all come before the next action's; frames from seq up to the next action's
+    first frame are attributed to the action that caused seq.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.sent = []  # (first seq, perf_counter when sent), in seq order
+        self.unanswered = 0
+        self.last_seq = 0
+
+    async def session_seq(self):
+        """The server's last frame number, from the session frame sent on connect."""
+        async for payload in self.ws:
+            if isinstance(payload, str) and payload.startswith('{"action": "session"'):
+                return json.loads(payload)["seq"]
+        raise ConnectionError("server closed before the session frame")
+
+    async def act(self, action, **fields):
+        sent_at = time.perf_counter()
+        await self.ws.send(json.dumps({"action": action, **fields}))
+        deadline = sent_at + ANSWER_TIMEOUT
+        while True:
+            try:
+                payload = await asyncio.wait_for(self.ws.recv(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                self.unanswered += 1
+                return
+            if payload == HEARTBEAT:
+                await self.ws.send(HEARTBEAT)
+                continue
+            seq, frame_action = frame_info(payload)
+            if seq is None:
+                if frame_action in ("error", "action_ignored"):  # Rejected or ignored, so nothing was broadcast
+                    return
+                continue
+            self.last_seq = max(self.last_seq, seq)
+            if frame_action in FIRST_FRAMES[action] or frame_action == "error":
+                self.sent.append((seq, sent_at))
+                return
+
+    async def drain(self):
+        """Reads until the server has been quiet for DRAIN_SECONDS, noting the last frame number."""
+        while True:
+            try:
+                payload = await asyncio.wait_for(self.ws.recv(), DRAIN_SECONDS)
+            except asyncio.TimeoutError:
+                return
+            if payload == HEARTBEAT:
+                await self.ws.send(HEARTBEAT)
+            seq, _ = frame_info(payload)
+            if seq is not None:
+                self.last_seq = max(self.last_seq, seq)
+
+    def origin(self, seq):
+        """When the action that caused frame seq was sent, or None for frames no action caused."""
+        i = bisect.bisect_right(self.sent, (seq, float("inf"))) - 1
+        return self.sent[i][1] if i >= 0 else None
+
+
+async def paced(controller, rate, action, **fields):
+    """Sends one action, then waits out the rest of its 1/rate slot."""
+    started = time.perf_counter()
+    await controller.act(action, **fields)
+    await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - started)))
+
+
+async def play_round(controller, seats, rate, undo_rate, rng):
+    """A manually dealt round: shuffle, three cards per hand, undos, every seat plays, reveal, reset."""
+    await paced(controller, rate, "shuffle_deck")
+    deck = CARDS[:]
+    rng.shuffle(deck)
+    for card in deck[:3 * (seats + 1)]:
+        await paced(controller, rate, "add_card", card=card)
+        if rng.random() < undo_rate:
+            await paced(controller, rate, "undo_last")
+            await paced(controller, rate, "add_card", card=card)
+    for seat in range(1, seats + 1):
+        await paced(controller, rate, "player_played", player=f"player{seat}")
+    await paced(controller, rate, "reveal_hands")
+    await paced(controller, rate, "reset_table")
+
+
+async def run(args):
+    url = args.url.rstrip("/")
+    rng = random.Random(args.seed)
+    async with websockets.connect(f"{url}/?role=stats", max_size=None) as ws:
+        controller = Controller(ws)
+        controller.last_seq = await controller.session_seq()
+        if not args.no_actions:
+            await controller.drain()  # The snapshot
+            for seat in range(1, args.seats + 1):
+                await controller.act("add_player", player=f"player{seat}")
+            await controller.act("start_manual")
+            await controller.act("reset_table")
+            await controller.drain()
+
+        # Connect the displays, a limited number of handshakes at a time
+        displays = [Display(ROLES[i % len(ROLES)], args.codec == "msgpack" or (args.codec == "mixed" and i % 2)) for i in range(args.clients)]
+        ready = asyncio.Semaphore(args.connect_concurrency)
+        tasks = []
+        connect_started = time.perf_counter()
+        for display in displays:
+            await ready.acquire()
+            tasks.append(asyncio.create_task(display.run(url, ready)))
+        for _ in range(args.connect_concurrency):
+            await ready.acquire()
+        connect_seconds = time.perf_counter() - connect_started
+        await controller.drain()
+        start_seq = controller.last_seq
+
+        actions_started = time.perf_counter()
+        if args.no_actions:
+            await asyncio.sleep(args.hold)
+        else:
+            for _ in range(args.rounds):
+                await play_round(controller, args.seats, args.rate, args.undo_rate, rng)
+        actions_seconds = time.perf_counter() - actions_started
+        await controller.drain()
+        end_seq = controller.last_seq
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    expected = end_seq - start_seq
+    latencies = []
+    dropped = 0
+    disconnected = 0
+    for display in displays:
+        seen = set()
+        for seq, at in display.received:
+            if start_seq < seq <= end_seq and seq not in seen:
+                seen.add(seq)
+                origin = controller.origin(seq)
+                if origin is not None:
+                    latencies.append(at - origin)
+        if display.connect_seconds is None or display.closed:
+            disconnected += 1
+        dropped += expected - len(seen)
+    connected = [d.connect_seconds for d in displays if d.connect_seconds is not None]
+    return {
+        "clients": args.clients,
+        "codec": args.codec,
+        "connected": len(connected),
+        "disconnected": disconnected,
+        "connect_all_seconds": round(connect_seconds, 2),
+        "connect_ms": summary_ms(connected),
+        "actions": len(controller.sent) + controller.unanswered,
+        "unanswered_actions": controller.unanswered,
+        "actions_per_sec": round((len(controller.sent) + controller.unanswered) / actions_seconds, 1) if actions_seconds else 0,
+        "frames_broadcast": expected,
+        "frames_expected": expected * args.clients,
+        "frames_dropped": dropped,
+        "delivery_ms": summary_ms(latencies),
+    }
+
+
+def wait_for_port(port, process, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=timeout).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load server.py with many websocket displays")
+    parser.add_argument("--clients", type=int, default=200, help="display clients to open")
+    parser.add_argument("--codec", choices=("json", "msgpack", "mixed"), default="json")
+    parser.add_argument("--rounds", type=int, default=10, help="manual rounds the controller plays")
+    parser.add_argument("--seats", type=int, default=6, help="active seats in each round")
+    parser.add_argument("--rate", type=float, default=20, help="controller actions per second")
+    parser.add_argument("--undo-rate", type=float, default=0.05, help="share of dealt cards that are undone and dealt again")
+    parser.add_argument("--no-actions", action="store_true", help="only connect the displays and hold them")
+    parser.add_argument("--hold", type=float, default=10, help="--no-actions: seconds to hold the connections")
+    parser.add_argument("--connect-concurrency", type=int, default=50, help="handshakes in flight at once")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="server to load; by default one is started on --port with --memory-db")
+    parser.add_argument("--port", type=int, default=6798)
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 when delivery p99 is above this")
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        args.url = f"ws://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "server", "--port", str(args.port), "--memory-db"],
+            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        if not wait_for_port(args.port, server, 30):
+            server.kill()
+            print(f"Server did not start on port {args.port}")
+            raise SystemExit(1)
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.kill()
+            server.wait()
+    print(json.dumps(report, indent=2))
+    p99 = report["delivery_ms"].get("p99")
+    failed = report["frames_dropped"] or report["disconnected"] or (args.max_p99_ms is not None and p99 is not None and p99 > args.max_p99_ms)
+    raise SystemExit(1 if failed else 0)
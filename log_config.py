@@ -0,0 +1,152 @@
+"""Logging setup for server.py: queued, rate limited, per-logger levels, rotating files.
+
+server.py logs through named loggers under "miniflush" (deal, serial, state,
+clients, records, config, shoe, turbo). configure() puts a QueueHandler on
+the root logger so a log call on the event loop only enqueues the record; a
+background QueueListener thread formats it and writes it to the console and,
+optionally, to a size-rotated file of JSON lines.
+
+Repetitive lines are rate limited per call site (logger and message
+template): after `burst` records in `period` seconds the rest are dropped,
+and the next one let through says how many were.
+
+The per-card loggers (miniflush.deal, .serial, .state) default to WARNING, so
+dealing a card logs nothing unless something is wrong. Turn them up with
+levels={"deal": "DEBUG"} (or --log-levels deal=DEBUG) when chasing a problem.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from datetime import datetime
+
+DEFAULT_LEVELS = {
+    "miniflush.deal": "WARNING",
+    "miniflush.serial": "WARNING",
+    "miniflush.state": "WARNING",
+    "websockets": "WARNING",  # Logs every connection and handshake at INFO
+}
+CONSOLE_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# LogRecord attributes; anything else on a record came from extra={...} and goes into the JSON line
+RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most burst records per period seconds from each call site."""
+
+    def __init__(self, burst=20, period=10.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.windows = {}  # (logger name, message template) -> [window start, records let through, records dropped]
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None and len(self.windows) >= 4096:  # Messages built with f-strings make a new key each time
+            self.windows.clear()
+        if window is None or now - window[0] >= self.period:
+            dropped = window[2] if window is not None else 0
+            self.windows[key] = [now, 1, 0]
+            if dropped:
+                record.msg = f"{record.msg} [{dropped} similar lines suppressed]"
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+SCALARS = (str, bytes, int, float, bool, type(None))
+
+
+def frozen_args(args):
+    """Log call arguments with anything mutable replaced by its str(), as %s would show it now."""
+    if isinstance(args, dict):  # "%(name)s" formatting
+        return {key: value if isinstance(value, SCALARS) else str(value) for key, value in args.items()}
+    return tuple(arg if isinstance(arg, SCALARS) else str(arg) for arg in args)
+
+
+class RawQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted, so the listener thread does the formatting.
+
+    The stock prepare() merges the arguments into the message and renders any
+    traceback before enqueueing, on the logging thread. Here only arguments
+    that are not scalars (hands, players, dicts) are turned into strings, so
+    a line shows the state at the call and the listener never reads an object
+    the game loop is changing.
+    """
+
+    def prepare(self, record):
+        if record.args:
+            record.args = frozen_args(record.args)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def logger_name(name):
+    """Short names ("deal") refer to loggers under miniflush."""
+    return name if "." in name or name in ("miniflush", "websockets") else f"miniflush.{name}"
+
+
+def parse_levels(text):
+    """"deal=DEBUG,serial=INFO" -> {"miniflush.deal": "DEBUG", "miniflush.serial": "INFO"}."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        name, _, level = item.partition("=")
+        if not level or not isinstance(logging.getLevelName(level.upper()), int):
+            raise ValueError(f"expected logger=LEVEL, got {item!r}")
+        levels[logger_name(name.strip())] = level.upper()
+    return levels
+
+
+def configure(level="INFO", levels=None, log_file=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+              burst=20, period=10.0, console=True):
+    """Routes all logging through a queue to a background thread; returns the started QueueListener.
+
+    Stop the listener on shutdown so queued records are written out.
+    """
+    handlers = []
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(stream)
+    if log_file:
+        rotating = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        rotating.setFormatter(JsonFormatter())
+        handlers.append(rotating)
+
+    records = queue.SimpleQueue()
+    queue_handler = RawQueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(burst, period))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    for name, logger_level in {**DEFAULT_LEVELS, **(levels or {})}.items():
+        logging.getLogger(logger_name(name)).setLevel(logger_level)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,116 @@
+"""In-process metrics for server.py, rendered in the Prometheus text format.
+
+Histograms keep a fixed list of bucket counts per label value, so observe()
+is a bisect and two additions on the hot path. Gauges and counters that
+mirror state server.py already keeps (client sets, queue sizes, action_stats)
+are read through a callback only when the endpoint is scraped.
+
+    ACTION_SECONDS = histogram("miniflush_action_seconds", "Handler latency", LATENCY_BUCKETS, "action")
+    ACTION_SECONDS.observe(0.004, "add_card")
+    render()  # -> text for GET /metrics
+"""
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (128, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = []
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    """Bucketed observations, optionally split by the value of one label."""
+
+    def __init__(self, name, help, buckets, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self.series = {}  # label value (None without a label) -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, label_value=None):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.series.items(), key=lambda item: str(item[0])):
+            base = [(self.label, label_value)] if self.label else []
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(base + [('le', format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(base)} {format_value(series[-1])}")
+            lines.append(f"{self.name}_count{format_labels(base)} {cumulative}")
+        return lines
+
+
+class Sampled:
+    """A gauge or counter whose value is read from a callback at scrape time.
+
+    The callback returns a number, or with a label a {label value: number} dict.
+    """
+
+    def __init__(self, name, help, kind, read, label=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.read = read
+        self.label = label
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        if self.label:
+            for label_value, v in sorted(value.items(), key=lambda item: str(item[0])):
+                lines.append(f"{self.name}{format_labels([(self.label, label_value)])} {format_value(v)}")
+        else:
+            lines.append(f"{self.name} {format_value(value)}")
+        return lines
+
+
+def histogram(name, help, buckets=LATENCY_BUCKETS, label=None):
+    metric = Histogram(name, help, buckets, label)
+    registry.append(metric)
+    return metric
+
+
+def gauge(name, help, read, label=None):
+    metric = Sampled(name, help, "gauge", read, label)
+    registry.append(metric)
+    return metric
+
+
+def counter(name, help, read, label=None):
+    metric = Sampled(name, help, "counter", read, label)
+    registry.append(metric)
+    return metric
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
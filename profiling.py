@@ -0,0 +1,179 @@
+"""On-demand profiling of the live server, started and stopped from the dealer console.
+
+A ProfileSession runs for a bounded window in one of two modes:
+
+    deterministic  cProfile on the event loop thread; exact call counts and
+                   times, with noticeable overhead while it runs
+    sampling       a background thread records the event loop thread's stack
+                   every interval; low overhead, statistical
+
+Either mode can also trace allocations with tracemalloc and compare a
+snapshot from the start of the window with one from the end.
+
+Results go to files named profile-<time>-<mode> in the output directory:
+.prof (cProfile, for pstats/snakeviz) and .txt, or .collapsed (stacks for
+flamegraph tools); -memory.txt with the largest allocation growth; and
+-summary.json with the time spent under each server handler. Nothing here
+runs, or costs anything, until a session is started.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+MODES = ("deterministic", "sampling")
+MAX_SECONDS = 300
+SAMPLE_INTERVAL = 0.005
+MEMORY_FRAMES = 10  # Stack depth tracemalloc keeps per allocation
+TOP_LINES = 40
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of one thread, sampled every interval seconds."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}  # ((file, line, function) outermost first, ...) -> samples
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ProfileSession:
+    """One profiling window; start() and finish() must be called on the event loop thread."""
+
+    def __init__(self, mode, seconds, directory, memory=True, source=None, handlers=()):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_SECONDS}")
+        self.mode = mode
+        self.seconds = seconds
+        self.directory = directory
+        self.memory = memory
+        self.source = source  # File whose functions named in handlers are summarized
+        self.handlers = set(handlers)
+        self.started_at = None
+        self.clock = None
+        self.elapsed = None
+        self.profiler = None
+        self.sampler = None
+        self.memory_start = None
+        self.memory_end = None
+        self.started_tracemalloc = False
+
+    def start(self):
+        self.started_at = datetime.now()
+        self.clock = time.perf_counter()
+        if self.memory:
+            self.started_tracemalloc = not tracemalloc.is_tracing()
+            if self.started_tracemalloc:
+                tracemalloc.start(MEMORY_FRAMES)
+            self.memory_start = tracemalloc.take_snapshot()
+        if self.mode == "deterministic":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = Sampler(threading.get_ident())
+            self.sampler.start()
+
+    def finish(self):
+        """Stops collecting; the results are then written by write(), which may run in another thread."""
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.memory:
+            self.memory_end = tracemalloc.take_snapshot()
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+        self.elapsed = time.perf_counter() - self.clock
+
+    def handler_key(self, filename, name):
+        return name if filename == self.source and name in self.handlers else None
+
+    def deterministic_summary(self, stats):
+        summary = {}
+        for (filename, _, name), (_, calls, _, cumulative, _) in stats.stats.items():
+            handler = self.handler_key(filename, name)
+            if handler is not None:
+                entry = summary.setdefault(handler, {"calls": 0, "cumulative_ms": 0.0})
+                entry["calls"] += calls
+                entry["cumulative_ms"] = round(entry["cumulative_ms"] + cumulative * 1000, 3)
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["cumulative_ms"]))
+
+    def sampling_summary(self):
+        summary = {}
+        total = self.sampler.samples or 1
+        for stack, count in self.sampler.stacks.items():
+            for handler in {self.handler_key(filename, name) for filename, _, name in stack} - {None}:
+                summary[handler] = summary.get(handler, 0) + count
+        return {
+            handler: {"samples": count, "share": round(count / total, 4), "approx_ms": round(count * self.sampler.interval * 1000, 1)}
+            for handler, count in sorted(summary.items(), key=lambda item: -item[1])
+        }
+
+    def write(self):
+        """Writes the result files; returns their paths."""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"profile-{self.started_at:%Y%m%d-%H%M%S}-{self.mode}")
+        files = []
+        report = {
+            "mode": self.mode,
+            "started": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(self.elapsed, 3),
+        }
+        if self.profiler is not None:
+            self.profiler.dump_stats(base + ".prof")
+            text = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=text)
+            stats.sort_stats("cumulative").print_stats(TOP_LINES)
+            with open(base + ".txt", "w") as f:
+                f.write(text.getvalue())
+            files += [base + ".prof", base + ".txt"]
+            report["handlers"] = self.deterministic_summary(stats)
+        if self.sampler is not None:
+            with open(base + ".collapsed", "w") as f:
+                for stack, count in sorted(self.sampler.stacks.items(), key=lambda item: -item[1]):
+                    frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in stack)
+                    f.write(f"{frames} {count}\n")
+            files.append(base + ".collapsed")
+            report["samples"] = self.sampler.samples
+            report["handlers"] = self.sampling_summary()
+        if self.memory_start is not None and self.memory_end is not None:
+            growth = self.memory_end.compare_to(self.memory_start, "lineno")
+            with open(base + "-memory.txt", "w") as f:
+                current = sum(stat.size for stat in self.memory_end.statistics("filename"))
+                f.write(f"Traced memory at the end: {current / 1024:.1f} KiB\n")
+                f.write(f"Largest growth over {self.elapsed:.1f}s:\n")
+                for stat in growth[:TOP_LINES]:
+                    f.write(f"{stat}\n")
+            files.append(base + "-memory.txt")
+            report["memory_growth_kib"] = round(sum(stat.size_diff for stat in growth) / 1024, 1)
+        with open(base + "-summary.json", "w") as f:
+            json.dump(report, f, indent=2)
+        files.append(base + "-summary.json")
+        return files
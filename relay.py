@@ -0,0 +1,311 @@
+"""Fan-out relay for display walls.
+
+Lobby screens and stats walls only watch the table, so instead of each one
+holding a connection to server.py they can connect to a relay, which holds
+one subscription per codec to the game server and re-broadcasts the
+numbered frame stream:
+
+    game server :6789  <-  relay.py :6790  <-  lobby screens
+                                       <-  relay.py :6791  <-  more screens
+
+A relay speaks the same protocol as server.py for ?role=stats clients
+(session frame, snapshot, numbered frames, ?resume=<epoch>.<seq>,
+?codec=msgpack), so relays chain for hierarchical fan-out. Dealer and
+player tablets still connect to the game server directly; the relay refuses
+them, and it is read-only.
+
+New clients are served from the relay's cache: the latest full update_game
+frame plus the frames since, or just the frames they missed when they resume.
+Each client has a bounded send queue; one that falls that far behind is
+disconnected and catches up through resume when it reconnects, so a slow
+screen never holds up the others or grows the relay's memory.
+
+    python relay.py --upstream ws://192.168.2.190:6789 --port 6790
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+
+import websockets
+
+import log_config
+
+try:
+    import msgpack
+except ImportError:  # Binary codec is optional, as in server.py
+    msgpack = None
+
+REPLAY_SIZE = 256  # Frames kept for resuming clients, as server.py's REPLAY_BUFFER_SIZE
+TAIL_LIMIT = 512  # Frames since the last update_game; beyond this the snapshot is refreshed upstream
+CLIENT_QUEUE = 256  # Frames a client may fall behind before it is disconnected
+RETRY_MAX_SECONDS = 30
+REPORT_SECONDS = 60
+HEARTBEAT = '{"action": "heartbeat"}'  # The game server reaps subscribers that do not answer it
+
+log = logging.getLogger("miniflush.relay")
+
+
+def frame_info(payload):
+    """(seq or None, action or None) of a frame, reading only the start of a JSON one."""
+    if isinstance(payload, bytes):
+        message = msgpack.unpackb(payload, strict_map_key=False)
+        action = message.get("action")
+        return (None if action == "session" else message.get("seq")), action  # A session frame's seq is its own field
+    seq = None
+    if payload.startswith('{"seq": '):
+        end = payload.index(",", 8)
+        seq = int(payload[8:end])
+        payload = "{" + payload[end + 2:]
+    if payload.startswith('{"action": "'):
+        return seq, payload[12:payload.index('"', 12)]
+    return seq, None
+
+
+def decode(payload):
+    return msgpack.unpackb(payload, strict_map_key=False) if isinstance(payload, bytes) else json.loads(payload)
+
+
+class Feed:
+    """One upstream subscription (per codec) and the cache its downstream clients are served from."""
+
+    def __init__(self, upstream, codec):
+        self.upstream = upstream.rstrip("/")
+        self.codec = codec
+        self.epoch = None
+        self.last_seq = 0
+        self.codec_tables = None  # The upstream's codec_tables frame, for msgpack clients
+        self.snapshot = None  # Latest full update_game frame
+        self.tail = []  # (seq, frame) received after the snapshot, deal timelines aside
+        self.timeline = None  # (latest deal_timeline message, perf_counter when it arrived)
+        self.replay = deque(maxlen=REPLAY_SIZE)  # (seq, frame) for resuming clients
+        self.refresh = False  # Reconnect without resume to get a fresh snapshot
+        self.clients = set()
+        self.ready = asyncio.Event()
+        self.stats = {"frames": 0, "slow_clients": 0, "reconnects": 0}
+        self.task = asyncio.create_task(self.run())
+
+    def encode(self, message):
+        return msgpack.packb(message) if self.codec == "msgpack" else json.dumps(message)
+
+    def session_frame(self):
+        return self.encode({"action": "session", "epoch": self.epoch, "seq": self.last_seq})
+
+    async def run(self):
+        """Holds the upstream subscription, reconnecting with backoff and resuming where it left off."""
+        delay = 1
+        while True:
+            query = "role=stats" + ("&codec=msgpack" if self.codec == "msgpack" else "")
+            if self.epoch is not None and not self.refresh:
+                query += f"&resume={self.epoch}.{self.last_seq}"
+            self.refresh = False
+            try:
+                async with websockets.connect(f"{self.upstream}/?{query}", max_size=None) as ws:
+                    log.info("Subscribed to %s (%s)", self.upstream, self.codec)
+                    delay = 1
+                    async for payload in ws:
+                        if payload == HEARTBEAT:
+                            await ws.send(HEARTBEAT)
+                            continue
+                        self.receive(payload)
+                        if self.refresh:
+                            break
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                log.error("Upstream %s unavailable, retrying in %ss: %s", self.upstream, delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+            self.stats["reconnects"] += 1
+
+    def receive(self, payload):
+        seq, action = frame_info(payload)
+        if seq is None:
+            if action == "codec_tables":
+                self.codec_tables = payload
+            elif action == "session":
+                session = decode(payload)
+                if session["epoch"] != self.epoch:
+                    # The game server restarted: its frame numbers start over
+                    self.epoch = session["epoch"]
+                    self.replay.clear()
+                    self.fan_out(self.encode({"action": "session", "epoch": self.epoch, "seq": session["seq"]}))
+                self.last_seq = session["seq"]
+            elif action == "update_game":
+                # A snapshot: sent on subscribing, or when the upstream could not resume us
+                self.snapshot = payload
+                self.tail = []
+                self.replay.clear()  # Frames were skipped, so resuming across this point needs a snapshot
+                self.ready.set()
+                self.fan_out(payload)
+            elif action == "deal_timeline":
+                self.timeline = (decode(payload), time.perf_counter())
+                self.fan_out(payload)
+            return
+        if self.replay and seq <= self.replay[-1][0]:
+            return  # Already relayed
+        if self.replay and seq > self.replay[-1][0] + 1:
+            self.replay.clear()  # The upstream could not resume us and started from its snapshot
+        self.last_seq = max(self.last_seq, seq)
+        self.replay.append((seq, payload))
+        if action == "update_game":
+            # Another relay's snapshot is its last numbered update_game
+            self.snapshot = payload
+            self.tail = []
+            self.ready.set()
+        elif action == "deal_timeline":
+            self.timeline = (decode(payload), time.perf_counter())
+        else:
+            self.tail.append((seq, payload))
+            if len(self.tail) > TAIL_LIMIT:
+                self.refresh = True
+        self.stats["frames"] += 1
+        self.fan_out(payload)
+
+    def fan_out(self, payload):
+        for client in list(self.clients):
+            client.push(payload)
+
+    def missed(self, resume):
+        """The frames after a resume token, or None if the client needs the snapshot (as server.missed_frames)."""
+        try:
+            epoch, seq = resume.split(".")
+            seq = int(seq)
+        except (AttributeError, ValueError):
+            return None
+        if epoch != self.epoch or seq > self.last_seq:
+            return None
+        if seq == self.last_seq:
+            return []
+        if not self.replay or self.replay[0][0] > seq + 1:
+            return None
+        return [frame for frame_seq, frame in self.replay if frame_seq > seq]
+
+    def running_timeline(self):
+        """The deal timeline frame, seeked to now, while its deal is still playing (as server.deal_timeline_payload)."""
+        if self.timeline is None:
+            return None
+        message, received = self.timeline
+        elapsed_ms = message["elapsed_ms"] + int((time.perf_counter() - received) * 1000)
+        if not message["cards"] or elapsed_ms >= message["cards"][-1]["offset_ms"]:
+            return None
+        message = {key: value for key, value in message.items() if key != "seq"}
+        message["elapsed_ms"] = elapsed_ms
+        return self.encode(message)
+
+    def catch_up(self, resume):
+        """Frames that bring a new client up to date, in server.start_session's order.
+
+        The client must be added to self.clients before anything else arrives.
+        """
+        frames = [self.codec_tables] if self.codec == "msgpack" and self.codec_tables else []
+        frames.append(self.session_frame())
+        missed = self.missed(resume)
+        timeline = self.running_timeline()
+        if missed is None:
+            if timeline is not None:
+                frames.append(timeline)
+            frames.append(self.snapshot)
+            frames.extend(frame for _, frame in self.tail)
+        else:
+            frames.extend(missed)
+            if timeline is not None:
+                frames.append(timeline)
+        return frames
+
+
+class Downstream:
+    """A connected screen with its own bounded send queue."""
+
+    def __init__(self, ws, feed, frames):
+        self.ws = ws
+        self.feed = feed
+        self.queue = asyncio.Queue(CLIENT_QUEUE)
+        self.catch_up = frames  # Sent before anything queued, however long
+        self.writer = asyncio.create_task(self.write())
+
+    def push(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            if self not in self.feed.clients:
+                return  # Already being disconnected
+            self.feed.stats["slow_clients"] += 1
+            self.feed.clients.discard(self)
+            log.warning("Disconnecting %s: %d frames behind", self.ws.remote_address, CLIENT_QUEUE)
+            asyncio.create_task(self.ws.close(1013, "too far behind; reconnect to resume"))
+
+    async def write(self):
+        try:
+            for payload in self.catch_up:
+                await self.ws.send(payload)
+            self.catch_up = None
+            while True:
+                await self.ws.send(await self.queue.get())
+        except websockets.ConnectionClosed:
+            pass
+
+
+upstream = "ws://localhost:6789"
+feeds = {}  # codec -> Feed
+
+
+def connection_params(websocket):
+    path = websocket.request.path if getattr(websocket, "request", None) is not None else ""
+    return {key: values[0] for key, values in parse_qs(urlparse(path).query).items()}
+
+
+async def handle_client(websocket):
+    params = connection_params(websocket)
+    if params.get("role") != "stats":
+        await websocket.send(json.dumps({"action": "error", "message": "This relay serves display screens (?role=stats); connect dealer and player tablets to the game server"}))
+        await websocket.close(1008, "relay serves role=stats only")
+        return
+    codec = "msgpack" if params.get("codec") == "msgpack" and msgpack is not None else "json"
+    feed = feeds.get(codec)
+    if feed is None:
+        feed = feeds[codec] = Feed(upstream, codec)
+    await feed.ready.wait()
+    client = Downstream(websocket, feed, feed.catch_up(params.get("resume")))
+    feed.clients.add(client)
+    try:
+        async for message in websocket:
+            if not (isinstance(message, str) and ('"trace_ack"' in message or '"heartbeat"' in message)):  # Render acks and heartbeat answers are dropped
+                await websocket.send(json.dumps({"action": "error", "message": "The relay is read-only"}))
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        feed.clients.discard(client)
+        client.writer.cancel()
+
+
+async def report():
+    """Logs client counts and relay volume every REPORT_SECONDS."""
+    while True:
+        await asyncio.sleep(REPORT_SECONDS)
+        for codec, feed in feeds.items():
+            log.info("%s: %d clients, seq %s, %s", codec, len(feed.clients), feed.last_seq, feed.stats)
+
+
+async def main(port):
+    feeds["json"] = Feed(upstream, "json")  # Subscribe straight away so the first screen is served from cache
+    async with websockets.serve(handle_client, "0.0.0.0", port, max_queue=4):
+        log.info("Relay for %s running on ws://localhost:%s", upstream, port)
+        await report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan-out relay for Mini Flush display screens")
+    parser.add_argument("--upstream", default="ws://localhost:6789", help="game server or another relay")
+    parser.add_argument("--port", type=int, default=6790)
+    parser.add_argument("--queue", type=int, default=CLIENT_QUEUE, help="frames a screen may fall behind before it is disconnected")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    upstream = args.upstream
+    CLIENT_QUEUE = args.queue
+    log_listener = log_config.configure(args.log_level)
+    try:
+        asyncio.run(main(args.port))
+    finally:
+        log_listener.stop()
@@ -0,0 +1,157 @@
+"""Re-runs recorded rounds through the current evaluator and flags any drift.
+
+Reads game_wins records from MongoDB (or a mongoexport JSON-lines file),
+recomputes every round with server.evaluate_round - the same code
+handle_reveal_hands uses - in a process pool, and reports each stored field
+that no longer matches. Run it after a rules change or an evaluator fix:
+
+    python replay.py                        # the live game_wins collection
+    python replay.py --file wins.jsonl      # mongoexport --collection game_wins
+    python replay.py --mismatches out.jsonl # also write every mismatch out
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import server
+from table_state import Player
+
+# Fields written by handle_reveal_hands that a replay can recompute
+ROUND_FIELDS = ("dealer_combination", "dealer_qualifies", "winners")
+PLAYER_FIELDS = (
+    "high_combination", "high_bet_result", "high_payout",
+    "low_combination", "low_bet_result", "low_payout",
+    "main_bet_result", "main_payout", "result",
+)
+# Only what the evaluator needs travels to the workers
+PROJECTION = {"dealer_hand": 1, "players": 1, "timestamp": 1, **{key: 1 for key in ROUND_FIELDS}}
+
+def record_id(record):
+    """Returns a printable id for a record from Motor or from mongoexport."""
+    record_id = record.get("_id")
+    if isinstance(record_id, dict):
+        return record_id.get("$oid", str(record_id))
+    return str(record_id)
+
+def slim_record(record):
+    """Strips a record down to what replay_chunk reads, so chunks pickle cheaply."""
+    slim = {"_id": record_id(record), "dealer_hand": record.get("dealer_hand", [])}
+    for key in ROUND_FIELDS:
+        if key in record:
+            slim[key] = record[key]
+    slim["players"] = {
+        pid: {
+            "hand": player.get("hand", []),
+            "action_type": player.get("action_type"),
+            **{key: player[key] for key in PLAYER_FIELDS if key in player},
+        }
+        for pid, player in record.get("players", {}).items()
+    }
+    return slim
+
+def replay_record(record):
+    """Recomputes one round and returns its mismatches as (field, stored, recomputed) tuples.
+
+    Fields missing from the stored record (older schema) are not compared.
+    """
+    players = {
+        pid: Player(hand=player["hand"], active=True, action_type=player["action_type"])
+        for pid, player in record["players"].items()
+    }
+    recomputed = server.evaluate_round(record["dealer_hand"], players)
+    mismatches = []
+    for key in ROUND_FIELDS:
+        if key in record and record[key] != getattr(recomputed, key):
+            mismatches.append((key, record[key], getattr(recomputed, key)))
+    for pid, player in record["players"].items():
+        results = recomputed.seats.get(pid)
+        if results is None:
+            mismatches.append((f"players.{pid}", "evaluated", "not evaluated (hand is not three cards)"))
+            continue
+        for key in PLAYER_FIELDS:
+            if key in player and player[key] != getattr(results, key):
+                mismatches.append((f"players.{pid}.{key}", player[key], getattr(results, key)))
+    return mismatches
+
+def replay_chunk(records):
+    """Worker entry point: replays a chunk and returns (rounds, [(id, field, stored, recomputed), ...])."""
+    found = []
+    for record in records:
+        for key, stored, recomputed in replay_record(record):
+            found.append((record["_id"], key, stored, recomputed))
+    return len(records), found
+
+async def mongo_records(batch_size):
+    """Streams records from the game_wins collection in timestamp order."""
+    collection = server.open_database(server.config.mongo_uri)
+    cursor = collection.find({}, PROJECTION).sort("timestamp", 1).batch_size(batch_size)
+    async for record in cursor:
+        yield record
+
+async def file_records(path):
+    """Streams records from a JSON-lines export."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+async def replay(records, workers, chunk_size, mismatches_path=None):
+    """Feeds chunks of records to a process pool and collects the mismatches."""
+    loop = asyncio.get_running_loop()
+    pending = set()
+    rounds = 0
+    mismatches = []
+    started = time.perf_counter()
+
+    def collect(done):
+        nonlocal rounds
+        for future in done:
+            count, found = future.result()
+            rounds += count
+            mismatches.extend(found)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk = []
+        async for record in records:
+            chunk.append(slim_record(record))
+            if len(chunk) < chunk_size:
+                continue
+            pending.add(loop.run_in_executor(pool, replay_chunk, chunk))
+            chunk = []
+            # Keep the reader a couple of chunks ahead of the pool and no further
+            if len(pending) >= workers * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+        if chunk:
+            pending.add(loop.run_in_executor(pool, replay_chunk, chunk))
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            collect(done)
+
+    elapsed = time.perf_counter() - started
+    for round_id, key, stored, recomputed in mismatches[:50]:
+        print(f"MISMATCH {round_id} {key}: stored {stored!r}, recomputed {recomputed!r}")
+    if len(mismatches) > 50:
+        print(f"... {len(mismatches) - 50} more mismatches")
+    if mismatches_path:
+        with open(mismatches_path, "w") as f:
+            for round_id, key, stored, recomputed in mismatches:
+                f.write(json.dumps({"_id": round_id, "field": key, "stored": stored, "recomputed": recomputed}) + "\n")
+    flagged = len({round_id for round_id, *_ in mismatches})
+    rate = rounds / elapsed if elapsed else 0
+    print(f"Replayed {rounds} rounds in {elapsed:.1f}s ({rate:.0f} rounds/s): {flagged} rounds with {len(mismatches)} mismatched fields")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run recorded rounds through the current evaluator")
+    parser.add_argument("--file", help="JSON-lines export of game_wins instead of reading MongoDB")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk", type=int, default=2000, help="rounds per worker task")
+    parser.add_argument("--mismatches", help="write every mismatch to this JSON-lines file")
+    args = parser.parse_args()
+    source = file_records(args.file) if args.file else mongo_records(args.chunk)
+    mismatches = asyncio.run(replay(source, args.workers, args.chunk, args.mismatches))
+    raise SystemExit(1 if mismatches else 0)
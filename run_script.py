@@ -28,7 +28,7 @@ WEB_URL = "http://192.168.2.190:3000"
 # status_node.set("Node App: Not running")
 # status_python.set("Python Server: Not running")
 
-SERIAL_PORT = "COM1"  # Match with server.py
+SERIAL_PORT = "COM1"  # Match serial_port in table_config.json
 BAUD_RATE = 9600
 
 # --- Chrome detection ---
@@ -60,7 +60,7 @@ def start_servers():
     if python_proc is None or python_proc.poll() is not None:
         python_proc = subprocess.Popen(
             # f'"{VENV_PYTHON}" server.py',
-            "python server.py", 
+            "python -m server",  # -m runs from cached bytecode, which starts faster
             cwd=os.getcwd(),
             shell=True
         )
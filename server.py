@@ -1,124 +1,291 @@
 import asyncio
+import argparse
+import os
 import websockets
 import json
-import motor.motor_asyncio
 from datetime import datetime
 import random
 import asyncio
 import logging
-from pymongo.errors import ServerSelectionTimeoutError
-import copy
 import re
-import serial
-
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-
-# Serial port configuration for shoe reader
-SERIAL_PORT = "COM1"  # Adjust this to match your serial port
+import time
+import uuid
+import itertools
+import importlib
+import gzip
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from table_state import TableState, SeatResult, RoundResult
+from shoe_monitor import ShoeMonitor
+import table_config
+import metrics
+import log_config
+import tracing
+import profiling
+from table_config import HIGH_COMBINATIONS, LOW_COMBINATIONS
+
+try:
+    import msgpack
+except ImportError:  # Binary codec is optional; clients fall back to JSON
+    msgpack = None
+
+# Named loggers; levels, rate limits and output are set up by log_config.configure()
+# at startup. The per-card ones (deal, serial, state) are quiet by default.
+log = logging.getLogger("miniflush")
+deal_log = logging.getLogger("miniflush.deal")
+serial_log = logging.getLogger("miniflush.serial")
+state_log = logging.getLogger("miniflush.state")
+clients_log = logging.getLogger("miniflush.clients")
+records_log = logging.getLogger("miniflush.records")
+config_log = logging.getLogger("miniflush.config")
+shoe_log = logging.getLogger("miniflush.shoe")
+turbo_log = logging.getLogger("miniflush.turbo")
+
+# Paytables, hand rankings, bet limits, undo depth, serial port and MongoDB URI
+# come from the versioned config file (see table_config.py). watch_config()
+# stages edits and they go live between rounds.
+CONFIG_PATH = os.environ.get("MINIFLUSH_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "table_config.json"))
+CONFIG_POLL_SECONDS = 2
+config = table_config.load_config(CONFIG_PATH)
+staged_config = None  # A newer version waiting for the current round to end
+
+# MongoDB and the shoe reader are connected in the background once the
+# websocket server is listening (see connect_database and run_shoe_reader), so
+# displays can connect while either is slow or missing. Motor and pyserial are
+# imported there too, keeping them off the startup path.
+RETRY_MAX_SECONDS = 30  # Longest wait between connection attempts
+
+# Serial port configuration for shoe reader (the port is config.serial_port)
 BAUD_RATE = 9600
 ser = None
 
-MONGO_URI = "mongodb://localhost:27017"  # or your Atlas URI
 DB_NAME = "game_db"
 COLLECTION_NAME = "game_wins"
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-db = client[DB_NAME]
-wins_collection = db[COLLECTION_NAME]
+client = None
+db = None
+wins_collection = None  # None until MongoDB has answered a ping
+database_task = None
+held_records = []  # Win records made before MongoDB connected, inserted once it does
+games_played = None  # Cached count of game_wins records; None until MongoDB has been counted
 
 connected_clients = set()
+msgpack_clients = set()  # Clients that negotiated the binary codec (?codec=msgpack)
+client_views = {}  # websocket -> seat id for player-role clients; everyone else gets the full view
+dealer_clients = {}  # Dealer-role clients, which also get live dealer odds -> odds_key() last sent to them
+
+# Every open connection gets a heartbeat each config.heartbeat_interval and answers it;
+# one silent for config.heartbeat_timeout is reaped (see send_heartbeats).
+HEARTBEAT_FRAME = json.dumps({"action": "heartbeat"})
+LOOPBACK = ("127.0.0.1", "::1")  # Exempt from config.max_clients_per_ip
+last_heard = {}  # websocket -> time.monotonic() of its last message, for every open connection
+connections_by_ip = {}  # remote address -> open connections from it
+session_stats = {"reaped": 0, "refused_total": 0, "refused_per_ip": 0}
+
+# Every broadcast frame gets a sequence number and is kept for reconnecting clients.
+# A client resumes with ?resume=<epoch>.<last seq seen>; the epoch changes on every server start.
+SERVER_EPOCH = uuid.uuid4().hex[:8]
+REPLAY_BUFFER_SIZE = 256
+replay_buffer = deque(maxlen=REPLAY_BUFFER_SIZE)  # (seq, frame) for the most recent broadcasts
+catching_up = {}  # client -> deque of broadcast payloads held while send_catch_up() sends its catch-up
+last_seq = 0
+# Broadcast frames numbered, bytes sent to clients, and JSON bytes of the frames themselves (one copy each,
+# counted with or without clients connected)
+broadcast_stats = {"frames": 0, "bytes": 0, "frame_bytes": 0}
+away_seats = {}  # seat -> last seq when its player-role client disconnected, kept while it can still resume
+
+# Single-writer command queue: every game_state mutation is applied by process_commands()
+command_queue = asyncio.Queue()
+MAX_COMMAND_BATCH = 32  # Commands applied before their broadcasts are flushed
+pending_frames = None  # Frames held while a command batch runs
+
+# Metrics served on GET /metrics (see metrics.py and handle_http). Histograms are
+# observed on the hot path; everything else is read when the endpoint is scraped.
+METRICS_PORT = 9108  # Bound to localhost only; --metrics-port 0 turns it off
+ACTION_SECONDS = metrics.histogram("miniflush_action_seconds", "Time from a client action being accepted to its broadcasts being sent.", label="action")
+BROADCAST_SECONDS = metrics.histogram("miniflush_broadcast_seconds", "Time to send one numbered frame to every connected client.")
+FRAME_BYTES = metrics.histogram("miniflush_frame_bytes", "Encoded size of each view of a broadcast frame.", metrics.SIZE_BUCKETS, label="codec")
+MONGO_SECONDS = metrics.histogram("miniflush_mongo_seconds", "MongoDB call latency.", label="operation")
+CARD_SECONDS = metrics.histogram("miniflush_card_read_to_broadcast_seconds", "Time from a shoe reader line being read to its card being broadcast.")
+serial_backlog = 0  # Bytes waiting in the shoe reader's input buffer when it was last polled
+
+# Table snapshot and recent rounds over plain HTTP for kiosks and reporting scripts
+# (GET /snapshot, GET /rounds). Bodies are encoded and gzipped once per version and
+# carry an ETag, so a repeat poll with If-None-Match is answered 304 without encoding.
+SNAPSHOT_PORT = 6788  # On all interfaces; --snapshot-port 0 turns it off
+RECENT_ROUNDS = 50
+recent_rounds = deque(maxlen=RECENT_ROUNDS)  # Win records of this server run, oldest first
+rounds_version = 0  # Bumped when recent_rounds changes
+state_version = 0  # Bumped whenever a cached update_game fragment is dropped
+http_bodies = {}  # path -> (etag, body, gzipped body) of the version last served
+metrics.gauge("miniflush_connected_clients", "Connected clients by role.", lambda: {
+    "dealer": sum(1 for ws in dealer_clients if ws in connected_clients),
+    "player": sum(1 for ws in client_views if ws in connected_clients),
+    "other": len(connected_clients) - sum(1 for ws in connected_clients if ws in dealer_clients or ws in client_views),
+}, label="role")
+metrics.gauge("miniflush_msgpack_clients", "Connected clients using the msgpack codec.", lambda: len(msgpack_clients))
+metrics.gauge("miniflush_command_queue_depth", "Commands waiting for the command processor.", lambda: command_queue.qsize())
+metrics.gauge("miniflush_serial_backlog_bytes", "Bytes waiting in the shoe reader's input buffer.", lambda: serial_backlog)
+metrics.gauge("miniflush_pending_records", "Win records being inserted into MongoDB.", lambda: len(pending_records))
+metrics.counter("miniflush_frames_total", "Numbered broadcast frames sent.", lambda: broadcast_stats["frames"])
+metrics.counter("miniflush_broadcast_bytes_total", "Bytes of broadcast frames sent to clients.", lambda: broadcast_stats["bytes"])
+metrics.counter("miniflush_actions_rejected_total", "Client actions rejected as malformed, unknown or invalid.", lambda: {
+    action: stats["rejected"] for action, stats in action_stats.items() if stats["rejected"]
+}, label="action")
+metrics.gauge("miniflush_open_connections", "Open websocket connections, including ones still starting their session.", lambda: len(last_heard))
+metrics.counter("miniflush_sessions_reaped_total", "Connections dropped for missing heartbeats.", lambda: session_stats["reaped"])
+metrics.counter("miniflush_connections_refused_total", "Connections refused by the connection caps.", lambda: {
+    "max_clients": session_stats["refused_total"], "max_clients_per_ip": session_stats["refused_per_ip"],
+}, label="cap")
+
+# Sampled card traces from the shoe reader to the screens (see tracing.py); off
+# unless --trace-file is given. A traced card's handlers run with active_trace set.
+tracer = tracing.Tracer()
+active_trace = None
+batch_traces = []  # (trace, time its handler finished) for the command batch being run
 
 # Global game state
-game_state = {
-    "dealer_hand": [],
-    "players": {
-        "player1": {"hand": [], "active": False, "result": None, "has_acted": False, "action_type": None},
-        "player2": {"hand": [], "active": False, "result": None, "has_acted": False, "action_type": None},
-        "player3": {"hand": [], "active": False, "result": None, "has_acted": False, "action_type": None},
-        "player4": {"hand": [], "active": False, "result": None, "has_acted": False, "action_type": None},
-        "player5": {"hand": [], "active": False, "result": None, "has_acted": False, "action_type": None},
-        "player6": {"hand": [], "active": False, "result": None, "has_acted": False, "action_type": None},
-    },
-    "deck": [],
-    "burned_cards": [],
-    "game_phase": "waiting", # waiting, dealing, revealed, finished
-    "winners": [],
-    "min_bet": 10,
-    "max_bet": 1000,
-    "table_number": "1FT",
-    "current_dealing_player": None,
-    "cards_dealt": 0
-}
-
-# Add state history for undo functionality
-state_history = []
-MAX_HISTORY = 10  # Keep last 10 states
-
-# Hand rankings for HIGH side bet (higher rank = better hand)
-HIGH_HAND_RANKINGS = {
-    "high_card": 0,           # High Card (no combination) - for cards below 10
-    "ten_top": 0,             # Ten Top
-    "jack_top": 0,            # Jack Top  
-    "queen_top": 0,           # Queen Top
-    "king_top": 0,            # King Top
-    "ace_top": 0,             # Ace Top
-    "pair": 1,                # One Pair  
-    "flush": 2,               # Flush (all same suit)
-    "straight": 3,            # Straight (sequence)
-    "straight_flush": 4,      # Straight Flush
-    "three_of_a_kind": 5,     # Three of a Kind (highest)
-}
+game_state = TableState(min_bet=config.min_bet, max_bet=config.max_bet, table_number="1FT")
+
+# Automatic deal being animated by the clients (see handle_deal_cards_with_delay)
+deal_timeline = None
+DEAL_LEAD_IN_MS = 1000  # Pause after the shuffle before the first card appears
+DEAL_CARD_INTERVAL_MS = 500  # Time between cards
+
+# Virtual clock used by turbo mode to skip the deal animation; None means real time
+virtual_now = None
+
+def clock():
+    """Monotonic seconds, or the virtual time while turbo mode is running."""
+    return virtual_now if virtual_now is not None else time.monotonic()
+
+# Win records handed to MongoDB but not yet acknowledged (see record_wins)
+pending_records = set()
+
+# Shoe integrity checks on every card read (see shoe_monitor.py). Alerts found
+# while a command batch runs are sent to dealer clients and logged after its flush.
+shoe_monitor = ShoeMonitor(decks=config.shoe_decks)  # Decks in the physical shoe; see apply_staged_config
+pending_shoe_alerts = []
+
+# Add state history for undo functionality: (game_state clone, foolproof_deal_state copy, shoe_monitor snapshot)
+state_history = []  # Keeps the last config.max_history states
+
+# Compact binary codec: cards and enum strings are sent as small integers.
+# The tables are sent to each msgpack client on connect so it can expand them.
+CARD_RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "T", "J", "Q", "K"]
+CARD_SUITS = ["S", "D", "C", "H"]
+CODEC_CARDS = [rank + suit for rank in CARD_RANKS for suit in CARD_SUITS]
+CODEC_ENUMS = (
+    ["waiting", "dealing", "revealed", "finished"]
+    + ["win", "lose", "tie", "ante", "push", "surrender", "play", "no_qualify"]
+    + ["player_wins", "dealer_wins", "dealer_no_qualify"]
+    + list(reversed(HIGH_COMBINATIONS)) + list(LOW_COMBINATIONS)
+)
+CARD_CODES = {card: i for i, card in enumerate(CODEC_CARDS)}
+ENUM_CODES = {value: i for i, value in enumerate(CODEC_ENUMS)}
+WIRE_CODES = (CARD_CODES, ENUM_CODES)  # For to_wire(codes=...) on the state model
+CODEC_CARD_FIELDS = ("card", "extracted_card")
+CODEC_CARD_LIST_FIELDS = ("dealer_hand", "hand")
+CODEC_ENUM_FIELDS = (
+    "game_phase", "result", "action_type", "dealer_combination", "high_combination",
+    "low_combination", "main_bet_result", "high_bet_result", "low_bet_result",
+)
+
+def to_compact(obj):
+    """Returns a copy of a message with card and enum fields replaced by their integer codes."""
+    if isinstance(obj, dict):
+        out = {}
+        for key, value in obj.items():
+            if key in CODEC_CARD_LIST_FIELDS and isinstance(value, list):
+                out[key] = [CARD_CODES.get(card, card) for card in value]
+            elif key in CODEC_CARD_FIELDS and isinstance(value, str):
+                out[key] = CARD_CODES.get(value, value)
+            elif key in CODEC_ENUM_FIELDS and isinstance(value, str):
+                out[key] = ENUM_CODES.get(value, value)
+            else:
+                out[key] = to_compact(value)
+        return out
+    if isinstance(obj, list):
+        return [to_compact(value) for value in obj]
+    return obj
+
+def codec_tables_message():
+    """The lookup tables a msgpack client needs to expand compact frames."""
+    return {
+        "action": "codec_tables",
+        "cards": CODEC_CARDS,
+        "enums": CODEC_ENUMS,
+        "card_fields": CODEC_CARD_FIELDS,
+        "card_list_fields": CODEC_CARD_LIST_FIELDS,
+        "enum_fields": CODEC_ENUM_FIELDS,
+    }
 
-# HIGH side bet payouts (typical casino payouts)
-HIGH_PAYOUTS = {
-    "three_of_a_kind": 5,     
-    "straight_flush": 4,       
-    "straight": 3,            
-    "flush": 2,            
-    "pair": 1,             
-    "ace_top": 0,          # Ace Top
-    "king_top": 0,         # King Top
-    "queen_top": 0,        # Queen Top
-    "jack_top": 0,         # Jack Top
-    "ten_top": 0,          # Ten Top
-    "high_card": 0         # For cards below 10
-}
+def connection_params(websocket):
+    """Returns the query parameters of the connection URL, e.g. ?codec=msgpack&role=player3."""
+    request = getattr(websocket, "request", None)
+    path = request.path if request is not None else getattr(websocket, "path", "")
+    return {key: values[0] for key, values in parse_qs(urlparse(path or "").query).items()}
+
+def requested_codec(params):
+    """Returns the codec asked for on connect (?codec=msgpack), default "json"."""
+    if params.get("codec") == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+# Subscription roles declared on connect (?role=...). dealer and stats see the
+# whole table; playerN sees its own seat in full and only the public fields of
+# the other seats.
+PLAYER_PUBLIC_FIELDS = ("active", "has_acted", "action_type")
+
+def requested_role(params):
+    """Returns the role asked for on connect; a missing or unknown role gets the read-only "stats"."""
+    role = params.get("role", "stats")
+    if role in ("dealer", "stats") or role in game_state.players:
+        return role
+    return "stats"
+
+def project_players(players, seat):
+    """The players dict as seen from one seat."""
+    return {
+        pid: player if pid == seat else {key: player.get(key) for key in PLAYER_PUBLIC_FIELDS}
+        for pid, player in players.items()
+    }
 
-# LOW side bet payouts (typical casino payouts)
-LOW_PAYOUTS = {
-    "5_top": 5,    
-    "6_top": 4,      
-    "7_top": 3,    
-    "8_top": 2,    
-    "9_top": 1,    
-    "10_top": 0  
-      
-}
+def project_message(message, seat):
+    """Returns the message as a player-role client sees it, leaving the original untouched."""
+    if message.get("target") in game_state.players and message["target"] != seat and "card" in message:
+        message = {key: value for key, value in message.items() if key != "card"}
+    if "players" in message:
+        message = dict(message, players=project_players(message["players"], seat))
+    state = message.get("game_state")
+    if isinstance(state, dict) and "players" in state:
+        message = dict(message, game_state=dict(state, players=project_players(state["players"], seat)))
+    if message.get("action") == "deal_timeline":
+        message = dict(message, cards=[
+            entry if entry["target"] in (seat, "dealer") else {"target": entry["target"], "offset_ms": entry["offset_ms"]}
+            for entry in message["cards"]
+        ])
+    return message
 
 def save_state():
     """Saves current game state to history for undo functionality, including deal order state."""
     global state_history, game_state, foolproof_deal_state
     
-    # Create a deep copy of the current state
-    state_copy = copy.deepcopy(game_state)
-    # Attach a copy of the deal state as a dict key
-    state_copy["foolproof_deal_state"] = copy.deepcopy(foolproof_deal_state)
-    state_history.append(state_copy)
+    # Copy the current state, and the deal state and shoe counts alongside it
+    state_history.append((game_state.clone(), copy_deal_state(foolproof_deal_state), shoe_monitor.snapshot()))
     
-    # Keep only the last MAX_HISTORY states
-    if len(state_history) > MAX_HISTORY:
-        state_history.pop(0)
+    # Keep only the last config.max_history states
+    if len(state_history) > config.max_history:
+        del state_history[:-config.max_history]
     
-    print(f"State saved. History length: {len(state_history)}")
+    state_log.debug("State saved. History length: %d", len(state_history))
 
 def create_deck():
-    """Creates and shuffles 6 standard decks for Mini Flush."""
+    """Creates and shuffles a standard deck for Mini Flush."""
     ranks = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "T", "J", "Q", "K"]
     suits = ["S", "D", "C", "H"]
     single_deck = [rank + suit for rank in ranks for suit in suits]
-    # Use 6 decks as specified in the game rules
-    
+    # One deck for dealing from the console; shoe_monitor counts the reader's shoe by config.shoe_decks
     random.shuffle(single_deck)
     return single_deck
 
@@ -283,19 +450,22 @@ def dealer_qualifies(dealer_hand):
 
 def compare_hands_main_bet(player_hand, dealer_hand):
     """Compares hands for MAIN/ANTE bet."""
+    return compare_evaluations(evaluate_high_hand(player_hand), evaluate_dealer_hand(dealer_hand))
+
+def compare_evaluations(player_high, dealer_evaluation):
+    """MAIN/ANTE bet outcome from already evaluated hands.
+
+    player_high is the player's (combination, value) from evaluate_high_hand and
+    dealer_evaluation comes from evaluate_dealer_hand.
+    """
+    player_combo, player_value = player_high
+    dealer_combo, dealer_value, qualifies = dealer_evaluation
     # First check if dealer qualifies
-    if not dealer_qualifies(dealer_hand):
+    if not qualifies:
         return "dealer_no_qualify"
     
-    player_combo, player_value = evaluate_high_hand(player_hand)
-    dealer_combo, dealer_value = evaluate_high_hand(dealer_hand)
-    
-    # Debug logging
-    # print(f"DEBUG: Player hand: {player_hand} -> {player_combo}, {player_value}")
-    # print(f"DEBUG: Dealer hand: {dealer_hand} -> {dealer_combo}, {dealer_value}")
-    
-    player_rank = HIGH_HAND_RANKINGS[player_combo]
-    dealer_rank = HIGH_HAND_RANKINGS[dealer_combo]
+    player_rank = config.high_rank[player_combo]
+    dealer_rank = config.high_rank[dealer_combo]
     
     # print(f"DEBUG: Player rank: {player_rank}, Dealer rank: {dealer_rank}")
     # print(f"DEBUG: Player value: {player_value}, Dealer value: {dealer_value}")
@@ -316,130 +486,302 @@ def compare_hands_main_bet(player_hand, dealer_hand):
             # print("DEBUG: Dealer wins by value")
             return "dealer_wins"
         else:
-            print("DEBUG: Tie")
+            # print("DEBUG: Tie")
             return "tie"
 
+# Hands are evaluated as soon as their third card lands (see evaluate_if_complete),
+# so revealing only has to settle the bets from these tuples.
+def evaluate_hand(hand):
+    """A seat's hand for the side bets: (high combination, tiebreaker value, low combination or None)."""
+    high_combo, high_value = evaluate_high_hand(hand)
+    return (high_combo, high_value, evaluate_low_hand(hand))
+
+def evaluate_dealer_hand(dealer_hand):
+    """The dealer's hand: (combination, tiebreaker value, qualifies)."""
+    dealer_combo, dealer_value = evaluate_high_hand(dealer_hand)
+    return (dealer_combo, dealer_value, dealer_qualifies(dealer_hand))
+
+def evaluate_player(hand, action_type, dealer_hand):
+    """Computes one seat's HIGH, LOW and MAIN bet results and payouts against the dealer's hand."""
+    return settle_seat(evaluate_hand(hand), action_type, evaluate_dealer_hand(dealer_hand))
+
+def settle_seat(evaluation, action_type, dealer_evaluation):
+    """Settles one seat's HIGH, LOW and MAIN bets from the evaluated hands."""
+    high_combo, high_value, low_combo = evaluation
+    results = {}
+    
+    # Evaluate HIGH side bet: win at the paytable's payout, lose when it pays 0
+    results["high_combination"] = high_combo
+    results["high_bet_result"], results["high_payout"] = config.high_settlement[high_combo]
+    
+    # Evaluate LOW side bet: win, push when it pays 0 (10_top), lose without a low hand
+    results["low_combination"], results["low_bet_result"], results["low_payout"] = config.low_settlement[low_combo]
+    
+    # Evaluate MAIN bet (only if player didn't surrender)
+    if action_type == "surrender":
+        results["main_bet_result"] = "surrender"
+        results["main_payout"] = -1  # Lose main bet
+    else:
+        main_result = compare_evaluations((high_combo, high_value), dealer_evaluation)
+        results["main_bet_result"] = main_result
+        
+        if main_result == "player_wins":
+            results["main_payout"] = 1  # 1:1 payout
+        elif main_result == "dealer_no_qualify":
+            results["main_payout"] = 0  # Push - ante gets pushed
+        elif main_result == "tie":
+            results["main_payout"] = 0  # Push
+        else:  # dealer_wins
+            results["main_payout"] = -1  # Lose main bet
+    
+    # Set overall result for display (prioritize main bet result)
+    if results["main_bet_result"] == "player_wins":
+        results["result"] = "win"
+    elif results["main_bet_result"] == "dealer_no_qualify":
+        results["result"] = "ante"
+    elif results["main_bet_result"] == "tie":
+        results["result"] = "tie"
+    elif results["main_bet_result"] == "surrender":
+        results["result"] = "surrender"  
+    else:
+        results["result"] = "lose"
+    return SeatResult(**results)
+
+def evaluate_round(dealer_hand, players, dealer_evaluation=None):
+    """Evaluates a finished round: the dealer's combination and qualification, winners and per-seat results.
+
+    players maps player ids to Player objects; only active seats holding three
+    cards are evaluated, reusing a seat's evaluation when it was made as the
+    cards landed. This is pure, so the replay tool can re-run recorded rounds
+    through it.
+    """
+    if dealer_evaluation is None:
+        dealer_evaluation = evaluate_dealer_hand(dealer_hand)
+    winners = []
+    seats = {}
+    for player_id, player in players.items():
+        if not player.active or len(player.hand) != 3:
+            continue
+        evaluation = player.evaluation or evaluate_hand(player.hand)
+        results = settle_seat(evaluation, player.action_type, dealer_evaluation)
+        if results.main_bet_result == "player_wins":
+            winners.append(player_id)
+        seats[player_id] = results
+    dealer_combo, dealer_value, qualifies = dealer_evaluation
+    return RoundResult(dealer_combo, qualifies, winners, seats)
+
+def evaluate_if_complete(target):
+    """Evaluates the target's hand the moment its third card lands."""
+    if target == "dealer":
+        if len(game_state.dealer_hand) == 3:
+            game_state.dealer_evaluation = evaluate_dealer_hand(game_state.dealer_hand)
+    else:
+        player = game_state.players[target]
+        if len(player.hand) == 3:
+            player.evaluation = evaluate_hand(player.hand)
+
+# Live dealer odds for the pit: exact probabilities of the dealer's final
+# combination given every card seen so far, for the single 52-card shoe that
+# create_deck builds. Counts come from inclusion-exclusion over tables of all
+# 22,100 three-card hands (built on first use), so an update is a few dozen
+# vector additions instead of an enumeration of the remaining shoe.
+ODDS_COMBINATIONS = list(HIGH_COMBINATIONS)
+ODDS_COMBINATION_INDEX = {combo: i for i, combo in enumerate(ODDS_COMBINATIONS)}
+ODDS_QUALIFYING = [combo not in ("high_card", "ten_top", "jack_top") for combo in ODDS_COMBINATIONS]  # As dealer_qualifies
+MAX_ODDS_CACHE = 4096
+odds_tables = None  # (all hands, hands by card, hands by card pair, combination by hand), as combination counts
+odds_cache = {}  # (dealer card codes, other seen card codes) -> combination counts
+
+def build_odds_tables():
+    """Counts the combinations of every three-card hand, in total and by the cards they contain."""
+    global odds_tables
+    size = len(ODDS_COMBINATIONS)
+    total = [0] * size
+    by_card = [[0] * size for _ in CODEC_CARDS]
+    by_pair = {}
+    by_hand = {}
+    for hand in itertools.combinations(range(len(CODEC_CARDS)), 3):
+        combo, _ = evaluate_high_hand([CODEC_CARDS[i] for i in hand])
+        c = ODDS_COMBINATION_INDEX[combo]
+        by_hand[hand] = c
+        total[c] += 1
+        for i in hand:
+            by_card[i][c] += 1
+        for pair in itertools.combinations(hand, 2):
+            counts = by_pair.get(pair)
+            if counts is None:
+                counts = by_pair[pair] = [0] * size
+            counts[c] += 1
+    odds_tables = (total, by_card, by_pair, by_hand)
+
+def dealer_hand_counts(dealer, seen):
+    """Number of ways the dealer's hand can finish as each combination.
+
+    dealer and seen are sorted tuples of card codes: the dealer's cards and
+    every other card out of the shoe. Counts the three-card hands that contain
+    all of dealer and none of seen.
+    """
+    key = (dealer, seen)
+    counts = odds_cache.get(key)
+    if counts is not None:
+        return counts
+    if odds_tables is None:
+        build_odds_tables()
+    total, by_card, by_pair, by_hand = odds_tables
+    counts = [0] * len(ODDS_COMBINATIONS)
+    for size in range(3 - len(dealer) + 1):
+        sign = -1 if size % 2 else 1
+        for excluded in itertools.combinations(seen, size):
+            cards = tuple(sorted(dealer + excluded))
+            if len(cards) == 3:
+                counts[by_hand[cards]] += sign
+                continue
+            hands = total if not cards else by_card[cards[0]] if len(cards) == 1 else by_pair[cards]
+            for c, n in enumerate(hands):
+                counts[c] += sign * n
+    if len(odds_cache) >= MAX_ODDS_CACHE:
+        odds_cache.clear()
+    odds_cache[key] = counts
+    return counts
+
+def odds_key():
+    """The seen cards the odds depend on: (dealer card codes, other seen card codes)."""
+    dealer = tuple(sorted({CARD_CODES[card] for card in game_state.dealer_hand if card in CARD_CODES}))
+    seen = set()
+    for player in game_state.players.values():
+        seen.update(CARD_CODES[card] for card in player.hand if card in CARD_CODES)
+    seen.update(CARD_CODES[card] for card in game_state.burned_cards if card in CARD_CODES)
+    return (dealer[:3], tuple(sorted(seen.difference(dealer))))
+
+def dealer_odds_message(key=None):
+    """The dealer_odds frame: qualification probability and final combination distribution."""
+    dealer, seen = key or odds_key()
+    counts = dealer_hand_counts(dealer, seen)
+    hands = sum(counts)
+    return {
+        "action": "dealer_odds",
+        "dealer_cards": len(dealer),
+        "cards_remaining": len(CODEC_CARDS) - len(dealer) - len(seen),
+        "hands": hands,
+        "qualify_probability": sum(n for n, q in zip(counts, ODDS_QUALIFYING) if q) / hands if hands else None,
+        "combinations": {combo: n / hands for combo, n in zip(ODDS_COMBINATIONS, counts) if n} if hands else {},
+    }
+
+async def publish_dealer_odds():
+    """Sends fresh odds to each dealer-role client that has not seen the current cards.
+
+    Runs after every command batch, which also covers newly connected dealer
+    clients. Automatic rounds are dealt in one go and animated by the clients,
+    so no odds are published while a deal timeline is on the table.
+    """
+    if not dealer_clients or deal_timeline is not None:
+        return
+    key = odds_key()
+    stale = [ws for ws, sent in dealer_clients.items() if sent != key and ws in connected_clients]
+    if not stale:
+        return
+    message = dealer_odds_message(key)
+    for ws in stale:
+        dealer_clients[ws] = key
+    await asyncio.gather(*[send_to_client(ws, message) for ws in stale])
+
+def connection_refused(address):
+    """The cap a new connection from address would exceed, or None to accept it."""
+    if len(last_heard) >= config.max_clients:
+        session_stats["refused_total"] += 1
+        return "max_clients"
+    if address not in LOOPBACK and connections_by_ip.get(address, 0) >= config.max_clients_per_ip:
+        session_stats["refused_per_ip"] += 1
+        return "max_clients_per_ip"
+    return None
+
 async def handle_connection(websocket):
     """Handles new player connections."""
-    connected_clients.add(websocket)
-    print(f"Client connected: {websocket.remote_address}")
-
-    # Send current game state to new client (with games played count)
-    await broadcast_game_state()
+    address = websocket.remote_address[0] if websocket.remote_address else None
+    cap = connection_refused(address)
+    if cap is not None:
+        clients_log.warning("Refused connection from %s: %s reached", address, cap)
+        await websocket.close(1013, f"{cap} reached, try again later")
+        return
+    connections_by_ip[address] = connections_by_ip.get(address, 0) + 1
+    last_heard[websocket] = time.monotonic()
 
     try:
+        params = connection_params(websocket)
+        if requested_codec(params) == "msgpack":
+            await websocket.send(msgpack.packb(codec_tables_message()))
+            msgpack_clients.add(websocket)
+        role = requested_role(params)
+        if role in game_state.players:
+            client_views[websocket] = role
+        elif role == "dealer":
+            dealer_clients[websocket] = None
+        clients_log.info("Client connected: %s (%s)", websocket.remote_address, role)
+
+        # Catch the client up (missed frames or a snapshot) and start broadcasting to it;
+        # the sends happen here so a slow client never holds up the command queue
+        await send_catch_up(websocket, await submit_command(start_session, websocket, params.get("resume")))
+
         async for message in websocket:
-            data = json.loads(message)
-            print(f"Received: {data}")
-
-            if data["action"] == "shuffle_deck":
-                await handle_shuffle_deck()
-            elif data["action"] == "burn_card":
-                await handle_burn_card()
-            elif data["action"] == "deal_cards":
-                await handle_deal_cards()
-            elif data["action"] == "add_player":
-                await handle_add_player(data.get("player"))
-            elif data["action"] == "remove_player":
-                await handle_remove_player(data.get("player"))
-            elif data["action"] == "reset_table":
-                await handle_reset_table()
-            elif data["action"] == "undo_last":
-                await handle_undo_last()
-            elif data["action"] == "reveal_hands":
-                await handle_reveal_hands()
-                await broadcast_game_state()  # update games played after a game
-            elif data["action"] == "add_card":
-                # Always use round-robin logic for dealing cards, ignore target
-                await foolproof_deal_card(data["card"])
-            elif data["action"] == "bet_changed":
-                await handle_change_bet(data["minBet"], data["maxBet"])
-            elif data["action"] == "table_number_set":
-                await handle_table_number(data["tableNumber"])
-            elif data["action"] == "delete_win":
-                await delete_win()
-            elif data["action"] == "delete_all_wins":
-                await delete_all_wins()
-            elif data["action"] == "clear_records":
-                await handle_clear_records()
-                await broadcast_game_state()  # update games played after clearing
-            elif data["action"] == "start_automatic":
-                await start_automatic()
-            elif data["action"] == "start_manual":
-                await start_manual()
-            elif data["action"] == "player_played":
-                await handle_player_played(data.get("player"))
-            elif data["action"] == "player_surrendered":
-                await handle_player_surrendered(data.get("player"))
-            elif data["action"] == "test_card_reading":
-                await handle_test_card_reading(data.get("test_data"))
-            elif data["action"] == "change_game_settings":
-                print(f"Received change_game_settings action: {data}")
-                await handle_change_game_settings(
-                    data.get("min_bet"), 
-                    data.get("max_bet"), 
-                    data.get("table_number")
-                )
-            elif data["action"] == "manual_set_result":
-                player_id = data.get("player")
-                result = data.get("result")
-                if player_id in game_state["players"] and result in ["win", "lose"]:
-                    # Save state before making changes
-                    save_state()
-                    # Clear all results first
-                    # for pid in game_state["players"]:
-                    #     game_state["players"][pid]["result"] = None
-                    game_state["players"][player_id]["result"] = result
-                    game_state["game_phase"] = "revealed"
-                    await broadcast({
-                        "action": "update_game",
-                        "game_state": {
-                            "dealer_hand": game_state["dealer_hand"],
-                            "players": game_state["players"],
-                            "game_phase": game_state["game_phase"],
-                            "winners": game_state["winners"],
-                            "min_bet": game_state["min_bet"],
-                            "max_bet": game_state["max_bet"],
-                            "table_number": game_state["table_number"]
-                        }
-                    })
-            elif data["action"] == "broadcast_ante":
-                await broadcast({ "action": "show_ante_popup" })
-                # Set all active players' result to 'ante' and update game state for stats page
-                for pid, player in game_state["players"].items():
-                    if player["active"]:
-                        player["result"] = "ante"
-                await broadcast({
-                    "action": "update_game",
-                    "game_state": {
-                        "dealer_hand": game_state["dealer_hand"],
-                        "players": game_state["players"],
-                        "game_phase": game_state["game_phase"],
-                        "winners": game_state["winners"],
-                        "min_bet": game_state["min_bet"],
-                        "max_bet": game_state["max_bet"],
-                        "table_number": game_state["table_number"]
-                    }
-                })
+            last_heard[websocket] = time.monotonic()
+            await dispatch_message(websocket, message)
 
     except websockets.ConnectionClosed:
-        print(f"Client disconnected: {websocket.remote_address}")
+        clients_log.info("Client disconnected: %s", websocket.remote_address)
     finally:
-        connected_clients.remove(websocket)
+        if last_heard.pop(websocket, None) is not None:
+            connections_by_ip[address] -= 1
+            if not connections_by_ip[address]:
+                del connections_by_ip[address]
+        connected_clients.discard(websocket)
+        catching_up.pop(websocket, None)
+        msgpack_clients.discard(websocket)
+        dealer_clients.pop(websocket, None)
+        seat = client_views.pop(websocket, None)
+        if seat is not None:
+            away_seats[seat] = last_seq
+
+async def handle_manual_set_result(player_id, result):
+    """Manually sets a single player's result from the dealer console."""
+    global game_state
+    if player_id in game_state.players and result in ["win", "lose"]:
+        # Save state before making changes
+        save_state()
+        # Clear all results first
+        # for pid in game_state.players:
+        #     game_state.players[pid].result = None
+        game_state.players[player_id].result = result
+        game_state.game_phase = "revealed"
+        mark_players_dirty(player_id)
+        mark_table_dirty()
+        await broadcast_frame("update_game", update_game_frames())
+
+async def handle_broadcast_ante():
+    """Shows the ante popup and marks every active player's result as 'ante'."""
+    global game_state
+    await broadcast({ "action": "show_ante_popup" })
+    # Set all active players' result to 'ante' and update game state for stats page
+    for pid, player in game_state.players.items():
+        if player.active:
+            player.result = "ante"
+    mark_all_dirty()
+    await broadcast_frame("update_game", update_game_frames())
 
 async def handle_shuffle_deck():
     """Shuffles the deck and optionally burns a card."""
     global game_state
     
+    await apply_config_for_new_round()
+
     # Save state before making changes
     save_state()
     
-    game_state["deck"] = create_deck()
-   
+    game_state.deck = create_deck()
+    shoe_monitor.new_shoe()
     
     await broadcast({
         "action": "deck_shuffled",
-        "deck_size": len(game_state["deck"]),
+        "deck_size": len(game_state.deck),
         
     })
     await broadcast_game_state()
@@ -448,158 +790,135 @@ async def handle_shuffle_deck():
 #     """Burns the top card from the deck."""
 #     global game_state
     
-#     if not game_state["deck"]:
+#     if not game_state.deck:
 #         await broadcast({"action": "error", "message": "No cards in deck to burn"})
 #         return
     
 #     # Save state before making changes
 #     save_state()
     
-#     burned_card = game_state["deck"].pop(0)
-#     game_state["burned_cards"].append(burned_card)
+#     burned_card = game_state.deck.pop(0)
+#     game_state.burned_cards.append(burned_card)
     
 #     await broadcast({
 #         "action": "card_burned",
 #         "burned_card": burned_card,
-#         "deck_size": len(game_state["deck"]),
-#         "burned_cards": len(game_state["burned_cards"])
+#         "deck_size": len(game_state.deck),
+#         "burned_cards": len(game_state.burned_cards)
 #     })
 
 async def handle_deal_cards():
     """Deals cards one by one to each active player (in order), then to the dealer (last), up to 3 cards each, in round-robin fashion."""
-    global game_state
+    global game_state, deal_timeline
+    
+    deal_timeline = None
+    await apply_config_for_new_round()
     
     # Get list of active players in order, dealer is last
-    active_players = [pid for pid, player in game_state["players"].items() if player["active"]]
+    active_players = [pid for pid, player in game_state.players.items() if player.active]
     deal_order = active_players + ["dealer"]  # Dealer is always last
 
     save_state()
     
-    # Reset hands and player states
-    game_state["dealer_hand"] = []
-    for player in game_state["players"].values():
-        player["hand"] = []
-        player["result"] = None
-        player["has_acted"] = False
-        player["action_type"] = None
-        # Clear previous round data
-        for key in ["main_bet_result", "high_bet_result", "low_bet_result", "high_combination", "low_combination"]:
-            if key in player:
-                del player[key]
-    # Clear dealer data
-    for key in ["dealer_combination", "dealer_qualifies"]:
-        if key in game_state:
-            del game_state[key]
+    # Reset hands, player states and the last round's results
+    game_state.clear_round()
 
     # Deal cards round-robin: 3 rounds
     for round_num in range(3):
         for target in deal_order:
             if target == "dealer":
-                if len(game_state["dealer_hand"]) < 3 and game_state["deck"]:
-                    game_state["dealer_hand"].append(game_state["deck"].pop(0))
+                if len(game_state.dealer_hand) < 3 and game_state.deck:
+                    game_state.dealer_hand.append(game_state.deck.pop(0))
             else:
-                if len(game_state["players"][target]["hand"]) < 3 and game_state["deck"]:
-                    game_state["players"][target]["hand"].append(game_state["deck"].pop(0))
+                if len(game_state.players[target].hand) < 3 and game_state.deck:
+                    game_state.players[target].hand.append(game_state.deck.pop(0))
+    for target in deal_order:
+        evaluate_if_complete(target)
 
-    game_state["game_phase"] = "dealing"
-    game_state["winners"] = []
+    game_state.game_phase = "dealing"
+    mark_all_dirty()
     
     await broadcast({
         "action": "cards_dealt",
         "game_state": {
-            "dealer_hand": game_state["dealer_hand"],
-            "players": game_state["players"],
-            "game_phase": game_state["game_phase"],
-            "deck_size": len(game_state["deck"])
+            "dealer_hand": game_state.dealer_hand,
+            "players": game_state.players_wire(),
+            "game_phase": game_state.game_phase,
+            "deck_size": len(game_state.deck)
         }
     })
     await broadcast_game_state()
 
 async def handle_deal_cards_with_delay():
-    """Deals cards one by one with delays to create a simulation effect."""
-    global game_state
+    """Deals the whole round at once and publishes it as a timeline that clients animate card by card."""
+    global game_state, deal_timeline
     
+    await apply_config_for_new_round()
+
     # Get list of active players in order, dealer is last
-    active_players = [pid for pid, player in game_state["players"].items() if player["active"]]
+    active_players = [pid for pid, player in game_state.players.items() if player.active]
     deal_order = active_players + ["dealer"]  # Dealer is always last
 
     save_state()
     
-    # Reset hands and player states
-    game_state["dealer_hand"] = []
-    for player in game_state["players"].values():
-        player["hand"] = []
-        player["result"] = None
-        player["has_acted"] = False
-        player["action_type"] = None
-        # Clear previous round data
-        for key in ["main_bet_result", "high_bet_result", "low_bet_result", "high_combination", "low_combination"]:
-            if key in player:
-                del player[key]
-    # Clear dealer data
-    for key in ["dealer_combination", "dealer_qualifies"]:
-        if key in game_state:
-            del game_state[key]
-
-    game_state["game_phase"] = "dealing"
-    game_state["winners"] = []
-    
-    # Deal cards round-robin: 3 rounds with delays
+    # Reset hands, player states and the last round's results
+    game_state.clear_round()
+    game_state.game_phase = "dealing"
+    
+    # Deal cards round-robin: 3 rounds, recording when each card should appear
+    cards = []
     for round_num in range(3):
         for target in deal_order:
-            if target == "dealer":
-                if len(game_state["dealer_hand"]) < 3 and game_state["deck"]:
-                    game_state["dealer_hand"].append(game_state["deck"].pop(0))
-                    # Broadcast the updated state after each card
-                    await broadcast({
-                        "action": "card_dealt",
-                        "target": target,
-                        "game_state": {
-                            "dealer_hand": game_state["dealer_hand"],
-                            "players": game_state["players"],
-                            "game_phase": game_state["game_phase"],
-                            "deck_size": len(game_state["deck"])
-                        }
-                    })
-                    await broadcast_game_state()
-                    # Add delay between each card
-                    await asyncio.sleep(0.5)
-            else:
-                if len(game_state["players"][target]["hand"]) < 3 and game_state["deck"]:
-                    game_state["players"][target]["hand"].append(game_state["deck"].pop(0))
-                    # Broadcast the updated state after each card
-                    await broadcast({
-                        "action": "card_dealt",
-                        "target": target,
-                        "game_state": {
-                            "dealer_hand": game_state["dealer_hand"],
-                            "players": game_state["players"],
-                            "game_phase": game_state["game_phase"],
-                            "deck_size": len(game_state["deck"])
-                        }
-                    })
-                    await broadcast_game_state()
-                    # Add delay between each card
-                    await asyncio.sleep(0.5)
-    
-    # Final broadcast when all cards are dealt
-    await broadcast({
-        "action": "cards_dealt",
+            hand = game_state.dealer_hand if target == "dealer" else game_state.players[target].hand
+            if len(hand) < 3 and game_state.deck:
+                card = game_state.deck.pop(0)
+                hand.append(card)
+                cards.append({
+                    "target": target,
+                    "card": card,
+                    "offset_ms": DEAL_LEAD_IN_MS + len(cards) * DEAL_CARD_INTERVAL_MS
+                })
+    for target in deal_order:
+        evaluate_if_complete(target)
+    mark_all_dirty()
+
+    deal_timeline = {
+        "cards": cards,
+        "started_at": clock(),
+        "duration_ms": cards[-1]["offset_ms"] if cards else 0
+    }
+    await broadcast(deal_timeline_message())
+
+def deal_timeline_message():
+    """The current deal timeline, with how far into it we are so late joiners can seek."""
+    elapsed_ms = int((clock() - deal_timeline["started_at"]) * 1000)
+    return {
+        "action": "deal_timeline",
+        "cards": deal_timeline["cards"],
+        "elapsed_ms": elapsed_ms,
         "game_state": {
-            "dealer_hand": game_state["dealer_hand"],
-            "players": game_state["players"],
-            "game_phase": game_state["game_phase"],
-            "deck_size": len(game_state["deck"])
+            "dealer_hand": game_state.dealer_hand,
+            "players": game_state.players_wire(),
+            "game_phase": game_state.game_phase,
+            "deck_size": len(game_state.deck)
         }
-    })
-    await broadcast_game_state()
+    }
+
+def deal_timeline_active():
+    return deal_timeline is not None and (clock() - deal_timeline["started_at"]) * 1000 < deal_timeline["duration_ms"]
+
+def deal_timeline_payload(websocket):
+    """The running deal timeline for a client that connects mid-deal to seek into, or None."""
+    if deal_timeline_active():
+        return pick_encoding(encode_frame(deal_timeline_message()), websocket)
+    return None
 
 async def handle_add_player(player_id=None):
     """Activates a player in the game."""
     global game_state
     
     # Check if we already have 6 active players
-    active_players = sum(1 for player in game_state["players"].values() if player["active"])
+    active_players = sum(1 for player in game_state.players.values() if player.active)
     if active_players >= 6:
         await broadcast({
             "action": "error",
@@ -612,8 +931,8 @@ async def handle_add_player(player_id=None):
     
     if player_id is None:
         # Find first inactive player
-        for pid, player in game_state["players"].items():
-            if not player["active"]:
+        for pid, player in game_state.players.items():
+            if not player.active:
                 player_id = pid
                 break
     
@@ -634,25 +953,27 @@ async def handle_add_player(player_id=None):
             })
             return
     
-    if player_id and player_id in game_state["players"]:
-        if game_state["players"][player_id]["active"]:
+    if player_id and player_id in game_state.players:
+        if game_state.players[player_id].active:
             await broadcast({
                 "action": "error",
                 "message": f"{player_id} is already active"
             })
             return
         
-        game_state["players"][player_id]["active"] = True
+        game_state.players[player_id].active = True
+        mark_players_dirty(player_id)
         
         # If the game is in revealed phase, clear all results to prevent stale modals
-        if game_state["game_phase"] == "revealed":
-            for pid in game_state["players"]:
-                game_state["players"][pid]["result"] = None
+        if game_state.game_phase == "revealed":
+            for pid in game_state.players:
+                game_state.players[pid].result = None
+            mark_all_dirty()
         
         await broadcast({
             "action": "player_added",
             "player_id": player_id,
-            "players": game_state["players"]
+            "players": game_state.players_wire()
         })
 
 async def handle_remove_player(player_id):
@@ -662,51 +983,36 @@ async def handle_remove_player(player_id):
     # Save state before making changes
     save_state()
     
-    if player_id in game_state["players"]:
-        player = game_state["players"][player_id]
-        player["active"] = False
-        player["hand"] = []
-        player["result"] = None
-        player["has_acted"] = False
-        player["action_type"] = None
-        # Clear all bet results and combinations
-        for key in ["main_bet_result", "high_bet_result", "low_bet_result", "high_combination", "low_combination"]:
-            if key in player:
-                del player[key]
+    if player_id in game_state.players:
+        player = game_state.players[player_id]
+        player.active = False
+        # Clear the hand, action, bet results and combinations
+        player.clear_round()
+        mark_players_dirty(player_id)
         
         await broadcast({
             "action": "player_removed",
             "player_id": player_id,
-            "players": game_state["players"]
+            "players": game_state.players_wire()
         })
 
 async def handle_reset_table():
     """Resets the entire game state."""
-    global game_state, state_history, foolproof_deal_state
+    global game_state, state_history, foolproof_deal_state, deal_timeline
+    
+    deal_timeline = None
     
     # Save state before making changes
     save_state()
     
-    game_state["dealer_hand"] = []
-    for player in game_state["players"].values():
-        player["hand"] = []
-        player["result"] = None
-        player["has_acted"] = False
-        player["action_type"] = None
-        # Clear all bet results and combinations
-        for key in ["main_bet_result", "high_bet_result", "low_bet_result", "high_combination", "low_combination"]:
-            if key in player:
-                del player[key]
-    
-    # Clear dealer data
-    for key in ["dealer_combination", "dealer_qualifies"]:
-        if key in game_state:
-            del game_state[key]
-        
-    game_state["game_phase"] = "waiting"
-    game_state["winners"] = []
-    game_state["current_dealing_player"] = None
-    game_state["cards_dealt"] = 0
+    # Clear hands, bet results, combinations and dealer data
+    game_state.clear_round()
+    game_state.game_phase = "waiting"
+    game_state.current_dealing_player = None
+    game_state.cards_dealt = 0
+    mark_all_dirty()
+    shoe_monitor.new_shoe()  # Each game is dealt from a freshly shuffled deck
+    tracer.new_round()
 
     # Reset the round robin queue (foolproof_deal_state)
     foolproof_deal_state = {
@@ -715,75 +1021,70 @@ async def handle_reset_table():
         "dealer_cards": 0
     }
     
+    # A config version staged during the round goes live now, before the next deal
+    apply_staged_config()
+    
     await broadcast({
         "action": "table_reset",
         "game_state": {
-            "dealer_hand": game_state["dealer_hand"],
-            "players": game_state["players"],
-            "game_phase": game_state["game_phase"],
-            "winners": game_state["winners"],
-            "table_number": game_state["table_number"],
-            "min_bet": game_state["min_bet"],
-            "max_bet": game_state["max_bet"]
+            "dealer_hand": game_state.dealer_hand,
+            "players": game_state.players_wire(),
+            "game_phase": game_state.game_phase,
+            "winners": game_state.winners,
+            "table_number": game_state.table_number,
+            "min_bet": game_state.min_bet,
+            "max_bet": game_state.max_bet
             # Do NOT reset games_played here
         }
     })
 
 async def handle_undo_last():
     """Undoes the last action by restoring previous state, including deal order state."""
-    global game_state, state_history, foolproof_deal_state
+    global game_state, state_history, foolproof_deal_state, deal_timeline
     
     if not state_history:
         await broadcast({
             "action": "error", 
             "message": "No previous state to undo to"
         })
-        print("No previous state available for undo")
+        state_log.info("No previous state available for undo")
         return
     
-    # Restore the last saved state
-    previous_state = state_history.pop()
-    game_state = copy.deepcopy(previous_state)
+    # Restore the last saved state and the deal state saved with it; the
+    # popped copies are not referenced anywhere else. The shoe monitor forgets
+    # the undone cards so a corrected re-read is not counted twice.
+    game_state, foolproof_deal_state, monitor_snapshot = state_history.pop()
+    shoe_monitor.rewind(monitor_snapshot)
+    deal_timeline = None
+    mark_all_dirty()
 
-    # Also restore foolproof_deal_state if it was saved
-    if "foolproof_deal_state" in previous_state:
-        foolproof_deal_state = copy.deepcopy(previous_state["foolproof_deal_state"])
-    else:
-        # Try to reconstruct deal state from hands (fallback)
-        active_players = get_active_player_ids()
-        foolproof_deal_state = {
-            "current_index": 0,
-            "player_cards": {pid: len(game_state["players"][pid]["hand"]) for pid in active_players},
-            "dealer_cards": len(game_state["dealer_hand"])
-        }
-
-    print(f"Undid last action. History length: {len(state_history)}")
+    state_log.info("Undid last action. History length: %d", len(state_history))
     
     await broadcast({
         "action": "undo_completed",
         "game_state": {
-            "dealer_hand": game_state["dealer_hand"],
-            "players": game_state["players"],
-            "game_phase": game_state["game_phase"],
-            "winners": game_state["winners"],
-            "deck_size": len(game_state["deck"]),
-            "burned_cards": len(game_state["burned_cards"])
+            "dealer_hand": game_state.dealer_hand,
+            "players": game_state.players_wire(),
+            "game_phase": game_state.game_phase,
+            "winners": game_state.winners,
+            "deck_size": len(game_state.deck),
+            "burned_cards": len(game_state.burned_cards)
         }
     })
 
 async def handle_reveal_hands():
     """Reveals all hands and calculates results for all bet types."""
-    global game_state
+    global game_state, deal_timeline
     
     # Validate that all active players have acted
-    active_players = [player for player in game_state["players"].values() if player["active"]]
+    active_players = [player for player in game_state.players.values() if player.active]
     if not active_players:
         await broadcast({"action": "error", "message": "No active players in the game"})
         return
         
-    if not all(player["has_acted"] for player in active_players):
-        remaining_players = [pid for pid, player in game_state["players"].items() 
-                           if player["active"] and not player["has_acted"]]
+    if not all(player.has_acted for player in active_players):
+        remaining_players = [pid for pid, player in game_state.players.items() 
+                           if player.active and not player.has_acted]
         await broadcast({
             "action": "error", 
             "message": f"Waiting for players to act: {', '.join(remaining_players)}"
@@ -793,122 +1094,78 @@ async def handle_reveal_hands():
     # Save state before making changes
     save_state()
     
-    game_state["game_phase"] = "revealed"
-    game_state["winners"] = []
-    
-    # Evaluate dealer's hand
-    dealer_combo, dealer_value = evaluate_high_hand(game_state["dealer_hand"])
-    game_state["dealer_combination"] = dealer_combo
-    game_state["dealer_qualifies"] = dealer_qualifies(game_state["dealer_hand"])
-    
-    # Evaluate each active player
-    for player_id, player in game_state["players"].items():
-        if not player["active"] or len(player["hand"]) != 3:
-            continue
-            
-        # Evaluate HIGH side bet
-        high_combo, high_value = evaluate_high_hand(player["hand"])
-        player["high_combination"] = high_combo
-        
-        if HIGH_PAYOUTS[high_combo] > 0:
-            player["high_bet_result"] = "win"
-            player["high_payout"] = HIGH_PAYOUTS[high_combo]
-        else:
-            player["high_bet_result"] = "lose"
-            player["high_payout"] = 0
-        
-        # Evaluate LOW side bet
-        low_combo = evaluate_low_hand(player["hand"])
-        player["low_combination"] = low_combo if low_combo else "no_qualify"
-        
-        if low_combo:
-            if LOW_PAYOUTS[low_combo] > 0:
-                player["low_bet_result"] = "win"
-                player["low_payout"] = LOW_PAYOUTS[low_combo]
-            else:  # 10_top is push
-                player["low_bet_result"] = "push"
-                player["low_payout"] = 0
-        else:
-            player["low_bet_result"] = "lose"
-            player["low_payout"] = 0
-        
-        # Evaluate MAIN bet (only if player didn't surrender)
-        if player.get("action_type") == "surrender":
-            player["main_bet_result"] = "surrender"
-            player["main_payout"] = -1  # Lose main bet
-        else:
-            main_result = compare_hands_main_bet(player["hand"], game_state["dealer_hand"])
-            player["main_bet_result"] = main_result
-            
-            if main_result == "player_wins":
-                player["main_payout"] = 1  # 1:1 payout
-                game_state["winners"].append(player_id)
-            elif main_result == "dealer_no_qualify":
-                player["main_payout"] = 0  # Push - ante gets pushed
-            elif main_result == "tie":
-                player["main_payout"] = 0  # Push
-            else:  # dealer_wins
-                player["main_payout"] = -1  # Lose main bet
-        
-        # Set overall result for display (prioritize main bet result)
-        if player["main_bet_result"] == "player_wins":
-            player["result"] = "win"
-        elif player["main_bet_result"] == "dealer_no_qualify":
-            player["result"] = "ante"
-        elif player["main_bet_result"] == "tie":
-            player["result"] = "tie"
-        elif player["main_bet_result"] == "surrender":
-            player["result"] = "surrender"  
-        else:
-            player["result"] = "lose"
-    
-    # Record wins in database
-    # if game_state["winners"]:
-    await record_wins(game_state["winners"])
+    deal_timeline = None
+    game_state.game_phase = "revealed"
+    mark_all_dirty()
+    
+    # Settle each active player against the dealer; the hands themselves were
+    # evaluated as their third cards landed
+    round_results = evaluate_round(game_state.dealer_hand, game_state.players, game_state.dealer_evaluation)
+    game_state.dealer_combination = round_results.dealer_combination
+    game_state.dealer_qualifies = round_results.dealer_qualifies
+    game_state.winners = round_results.winners
+    for player_id, results in round_results.seats.items():
+        player = game_state.players[player_id]
+        player.results = results
+        player.result = results.result
+    
+    # Record wins in database (in the background, see record_wins)
+    # if game_state.winners:
+    record_wins(game_state.winners)
     
     await broadcast({
         "action": "hands_revealed",
         "game_state": {
-            "dealer_hand": game_state["dealer_hand"],
-            "players": game_state["players"],
-            "game_phase": game_state["game_phase"],
-            "winners": game_state["winners"],
-            "dealer_qualifies": game_state["dealer_qualifies"],
-            "dealer_combination": game_state["dealer_combination"]
+            "dealer_hand": game_state.dealer_hand,
+            "players": game_state.players_wire(),
+            "game_phase": game_state.game_phase,
+            "winners": game_state.winners,
+            "dealer_qualifies": game_state.dealer_qualifies,
+            "dealer_combination": game_state.dealer_combination
         }
     })
-    await broadcast_game_state()  # update games played after a game
+    # Games played is sent by the reveal_hands follow-up once the record is stored
+    await broadcast_frame("update_game", update_game_frames())
 
 async def handle_add_card(card, target="dealer"):
     """Adds a specific card to dealer or player hand for manual corrections."""
     global game_state
+    trace = active_trace
+    if trace is not None:
+        start = time.perf_counter()
     
     # Save state before making changes
     save_state()
+    if trace is not None:
+        trace.stage("save_state", start)
     
     # Check for duplicate cards across all hands and burned cards
-    all_cards = game_state["dealer_hand"] + game_state["burned_cards"]
-    for player in game_state["players"].values():
-        all_cards.extend(player["hand"])
+    all_cards = game_state.dealer_hand + game_state.burned_cards
+    for player in game_state.players.values():
+        all_cards.extend(player.hand)
     
     if card in all_cards:
         await broadcast({"action": "duplicate_card", "card": card})
-        print(f"Duplicate card detected: {card}")
+        deal_log.info("Duplicate card detected: %s", card, extra={"card": card})
         return
     
     # Add card to specified target
     if target == "dealer":
-        if len(game_state["dealer_hand"]) < 3:
-            game_state["dealer_hand"].append(card)
+        if len(game_state.dealer_hand) < 3:
+            game_state.dealer_hand.append(card)
+            evaluate_if_complete("dealer")
+            mark_table_dirty()
         else:
             await broadcast({"action": "error", "message": "Dealer already has 3 cards"})
             return
     else:
         # target should be player1, player2, etc.
-        if target in game_state["players"]:
-            if game_state["players"][target]["active"]:
-                if len(game_state["players"][target]["hand"]) < 3:
-                    game_state["players"][target]["hand"].append(card)
+        if target in game_state.players:
+            if game_state.players[target].active:
+                if len(game_state.players[target].hand) < 3:
+                    game_state.players[target].hand.append(card)
+                    evaluate_if_complete(target)
+                    mark_players_dirty(target)
                 else:
                     await broadcast({"action": "error", "message": f"{target} already has 3 cards"})
                     return
@@ -919,30 +1176,150 @@ async def handle_add_card(card, target="dealer"):
             await broadcast({"action": "error", "message": f"Invalid target: {target}"})
             return
     
-    await broadcast({
+    message = {
         "action": "card_added",
         "card": card,
         "target": target,
         "game_state": {
-            "dealer_hand": game_state["dealer_hand"],
-            "players": game_state["players"]
+            "dealer_hand": game_state.dealer_hand,
+            "players": game_state.players_wire()
+        }
+    }
+    if trace is not None:
+        trace.target = target
+        message["trace"] = trace.id  # Clients answer with trace_ack once it is on screen
+        trace.stage("handle_add_card", start)
+    await broadcast(message)
+
+# Turbo mode: automatic rounds back to back for soak testing (headless, python server.py --turbo)
+turbo_random = random.Random()
+TURBO_SURRENDER_RATE = 0.2  # Share of seats that surrender instead of playing
+TURBO_REPORT_SECONDS = 60
+
+async def turbo_round():
+    """One automatic round with no pauses: shuffle, deal, every seat acts, reveal and record.
+
+    Returns a list of state drift problems found after the round (empty when consistent).
+    """
+    global virtual_now
+    await handle_shuffle_deck()
+    await handle_deal_cards_with_delay()
+    # Skip the clients' deal animation on the virtual clock
+    virtual_now = clock() + deal_timeline["duration_ms"] / 1000
+    for pid in get_active_player_ids():
+        if turbo_random.random() < TURBO_SURRENDER_RATE:
+            await handle_player_surrendered(pid)
+        else:
+            await handle_player_played(pid)
+    await handle_reveal_hands()
+    return check_state_drift()
+
+def check_state_drift():
+    """Checks the invariants a finished automatic round must satisfy."""
+    problems = []
+    hands = [game_state.dealer_hand] + [game_state.players[pid].hand for pid in get_active_player_ids()]
+    dealt = [card for hand in hands for card in hand]
+    if any(len(hand) != 3 for hand in hands):
+        problems.append("hand without 3 cards")
+    if len(set(dealt)) != len(dealt):
+        problems.append("duplicate card dealt")
+    if len(dealt) + len(game_state.deck) != 52:
+        problems.append(f"card count {len(dealt) + len(game_state.deck)} != 52")
+    if game_state.game_phase != "revealed":
+        problems.append(f"phase {game_state.game_phase} after reveal")
+    if len(state_history) > config.max_history:
+        problems.append(f"history length {len(state_history)}")
+    if game_state.dealer_evaluation != evaluate_dealer_hand(game_state.dealer_hand):
+        problems.append("stale dealer evaluation")
+    if any(game_state.players[pid].evaluation != evaluate_hand(game_state.players[pid].hand) for pid in get_active_player_ids()):
+        problems.append("stale hand evaluation")
+    return problems
+
+def current_rss_mb():
+    """Resident set size of this process in MB, or the peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows without /proc
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def run_turbo(rounds=None, seconds=None, report_seconds=TURBO_REPORT_SECONDS):
+    """Plays turbo rounds back to back until the round or time limit, reporting as it goes.
+
+    Rounds are recorded to an in-memory MongoDB stand-in so the real game
+    records are untouched. Reports carry rounds/sec, virtual table time covered,
+    RSS growth, broadcast frames and their JSON bytes (what one display would
+    receive; turbo serves none) and the number of rounds that failed
+    check_state_drift().
+    """
+    global virtual_now, wins_collection, games_played
+    from standins import MemoryCollection
+    real_collection, real_games_played = wins_collection, games_played
+    wins_collection = MemoryCollection(keep=1000)
+    games_played = 0
+    virtual_now = time.monotonic()
+    start = time.perf_counter()
+    start_virtual = virtual_now
+    start_rss = current_rss_mb()
+    start_frames, start_bytes = broadcast_stats["frames"], broadcast_stats["frame_bytes"]
+    played = drifted = 0
+    last_report = start
+
+    def report():
+        elapsed = time.perf_counter() - start
+        rss = current_rss_mb()
+        return {
+            "action": "turbo_report",
+            "rounds": played,
+            "elapsed_s": round(elapsed, 3),
+            "rounds_per_sec": round(played / elapsed, 2) if elapsed else 0.0,
+            "virtual_hours": round((clock() - start_virtual) / 3600, 3),
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "rss_growth_mb": round(rss - start_rss, 1) if rss is not None and start_rss is not None else None,
+            "frames": broadcast_stats["frames"] - start_frames,
+            "frame_bytes": broadcast_stats["frame_bytes"] - start_bytes,
+            "drifted_rounds": drifted,
         }
-    })
+
+    try:
+        while (rounds is None or played < rounds) and (seconds is None or time.perf_counter() - start < seconds):
+            problems = await submit_command(turbo_round)
+            played += 1
+            if problems:
+                drifted += 1
+                turbo_log.warning("State drift after round %d: %s", played, problems)
+            if time.perf_counter() - last_report >= report_seconds:
+                last_report = time.perf_counter()
+                turbo_log.info("%s", report())
+                await submit_command(broadcast, report())
+    except asyncio.CancelledError:
+        turbo_log.info("Stopped")
+    await records_settled()
+    final = report()
+    virtual_now = None
+    wins_collection, games_played = real_collection, real_games_played
+    turbo_log.info("Finished: %s", final)
+    await submit_command(broadcast, final)
+    return final
+
+automatic_deal_queued = False  # start_automatic has shuffled and its deal is waiting in the queue
 
 async def start_automatic():
-    """Automatically plays a complete round."""
-    global game_state
-    
-    # Step 1: Shuffle and burn
+    """Starts an automatic round by shuffling; deal_automatic follows as a separate command."""
+    global automatic_deal_queued
     await handle_shuffle_deck()
-    await asyncio.sleep(1)
-    
-    # Step 2: Deal all cards one by one with delays
+    automatic_deal_queued = True
+
+async def deal_automatic():
+    """Deals the round start_automatic shuffled for; clients play it out from its timeline."""
+    global automatic_deal_queued
+    automatic_deal_queued = False
     await handle_deal_cards_with_delay()
-    await asyncio.sleep(2)
-    
-    # Step 3: Reveal hands (commented out for manual control)
-    # await handle_reveal_hands()
 
 async def start_manual():
     """Starts manual mode - just shuffle the deck."""
@@ -955,8 +1332,9 @@ async def handle_change_bet(min_bet, max_bet):
     # Save state before making changes
     save_state()
     
-    game_state["min_bet"] = min_bet
-    game_state["max_bet"] = max_bet
+    game_state.min_bet = min_bet
+    game_state.max_bet = max_bet
+    mark_table_dirty()
     
     await broadcast({
         "action": "bet_changed",
@@ -966,12 +1344,18 @@ async def handle_change_bet(min_bet, max_bet):
 
 async def handle_clear_records():
     """Clears all game records from the database."""
+    global games_played
+    if await records_offline():
+        return
+    await records_settled()
     try:
-        await wins_collection.delete_many({})
+        await timed_mongo("delete_many", wins_collection.delete_many({}))
+        games_played = 0
+        forget_rounds()
         await broadcast({"action": "records_cleared", "message": "All game records have been cleared."})
         # games_played will be updated by broadcast_game_state
     except Exception as e:
-        logging.error(f"Error clearing records: {e}")
+        records_log.error("Error clearing records: %s", e)
         await broadcast({"action": "error", "message": "Failed to clear game records."})
 
 async def handle_table_number(table_number):
@@ -981,45 +1365,47 @@ async def handle_table_number(table_number):
     # Save state before making changes
     save_state()
     
-    game_state["table_number"] = table_number
+    game_state.table_number = table_number
+    mark_table_dirty()
     
     await broadcast({
         "action": "table_number_set",
-        "table_number": game_state["table_number"]
+        "table_number": game_state.table_number
     })
 
 async def handle_player_played(player_id):
     """Handles when a player chooses to play (continue with main bet)."""
     global game_state
-    if player_id and player_id in game_state["players"]:
-        game_state["players"][player_id]["has_acted"] = True
-        game_state["players"][player_id]["action_type"] = "play"
+    if player_id and player_id in game_state.players:
+        game_state.players[player_id].has_acted = True
+        game_state.players[player_id].action_type = "play"
+        mark_players_dirty(player_id)
         await broadcast({
             "action": "player_acted",
             "player_id": player_id,
             "action_type": "play",
-            "game_state": game_state
+            "game_state": game_state.to_wire()
         })
 
 async def handle_player_surrendered(player_id):
     """Handles when a player surrenders (forfeit main bet, keep side bets)."""
     global game_state
-    if player_id and player_id in game_state["players"]:
-        game_state["players"][player_id]["has_acted"] = True
-        game_state["players"][player_id]["action_type"] = "surrender"
+    if player_id and player_id in game_state.players:
+        game_state.players[player_id].has_acted = True
+        game_state.players[player_id].action_type = "surrender"
+        mark_players_dirty(player_id)
         await broadcast({
             "action": "player_acted",
             "player_id": player_id,
             "action_type": "surrender",
-            "game_state": game_state
+            "game_state": game_state.to_wire()
         })
 
 async def handle_test_card_reading(test_data):
     """Handles testing of card reading functionality."""
     if test_data:
         card = extract_card_value(test_data)
-        print(f"Test data: {test_data}")
-        print(f"Extracted card: {card}")
+        serial_log.info("Test data: %s, extracted card: %s", test_data, card)
         
         if card:
             await handle_add_card(card)
@@ -1047,121 +1433,696 @@ async def handle_change_game_settings(min_bet=None, max_bet=None, table_number=N
     """Changes the minimum bet, maximum bet, and table number settings."""
     global game_state
     
-    print(f"handle_change_game_settings called with: min_bet={min_bet}, max_bet={max_bet}, table_number={table_number}")
     
     # Save state before making changes
     save_state()
     
     # Update only the provided values
     if min_bet is not None:
-        game_state["min_bet"] = min_bet
-        print(f"Min bet changed to: {min_bet}")
+        game_state.min_bet = min_bet
     
     if max_bet is not None:
-        game_state["max_bet"] = max_bet
-        print(f"Max bet changed to: {max_bet}")
+        game_state.max_bet = max_bet
     
     if table_number is not None:
-        game_state["table_number"] = table_number
-        print(f"Table number changed to: {table_number}")
+        game_state.table_number = table_number
     
-    print(f"Current game state after update: min_bet={game_state['min_bet']}, max_bet={game_state['max_bet']}, table_number={game_state['table_number']}")
+    mark_table_dirty()
+    log.info("Game settings changed: min_bet=%s, max_bet=%s, table_number=%s", game_state.min_bet, game_state.max_bet, game_state.table_number)
     
     # Broadcast the updated settings
     await broadcast({
         "action": "game_settings_changed",
-        "min_bet": game_state["min_bet"],
-        "max_bet": game_state["max_bet"],
-        "table_number": game_state["table_number"],
+        "min_bet": game_state.min_bet,
+        "max_bet": game_state.max_bet,
+        "table_number": game_state.table_number,
         "message": "Game settings updated successfully"
     })
 
-async def record_wins(winners):
-    """Records game wins in MongoDB."""
+def record_wins(winners):
+    """Records game wins in MongoDB without holding up the reveal.
+
+    The record is built from the current state right away; the insert runs as a
+    background task that records_settled() waits for.
+    """
     win_record = {
         "winners": winners,
-        "dealer_hand": game_state["dealer_hand"],
-        "dealer_combination": game_state.get("dealer_combination", "unknown"),
-        "dealer_qualifies": game_state.get("dealer_qualifies", False),
-        "players": {pid: player for pid, player in game_state["players"].items() if player["active"]},
+        "dealer_hand": list(game_state.dealer_hand),
+        "dealer_combination": game_state.dealer_combination or "unknown",
+        "dealer_qualifies": game_state.dealer_qualifies or False,
+        "players": {pid: player.to_wire() for pid, player in game_state.players.items() if player.active},
+        "config_version": config.version,
         "timestamp": datetime.utcnow(),
     }
-    await wins_collection.insert_one(win_record)
-    print(f"Recorded wins: {win_record}")
+    remember_round(win_record)
+    if wins_collection is None:
+        held_records.append(win_record)  # Inserted by database_connected()
+        return
+    schedule_record(win_record)
+
+def remember_round(win_record):
+    """Keeps a copy of a win record for GET /rounds (the insert adds an _id to the original)."""
+    global rounds_version
+    recent_rounds.append({**win_record, "timestamp": win_record["timestamp"].isoformat() + "Z"})
+    rounds_version += 1
+
+def forget_rounds(last_only=False):
+    """Drops the newest remembered round, or all of them, after records are deleted."""
+    global rounds_version
+    if last_only:
+        if recent_rounds:
+            recent_rounds.pop()
+    else:
+        recent_rounds.clear()
+    rounds_version += 1
+
+def schedule_record(win_record):
+    """Starts inserting a win record in the background and counts it as played."""
+    global games_played
+    if games_played is not None:
+        games_played += 1
+    task = asyncio.create_task(insert_win_record(wins_collection, win_record))
+    pending_records.add(task)
+    task.add_done_callback(pending_records.discard)
+
+async def insert_win_record(collection, win_record):
+    global games_played
+    try:
+        await timed_mongo("insert_one", collection.insert_one(win_record))
+        records_log.debug("Recorded wins: %s", win_record)
+    except Exception as e:
+        records_log.error("Failed to record wins: %s", e)
+        if collection is wins_collection and games_played is not None:
+            games_played -= 1
+
+async def timed_mongo(operation, call):
+    """Awaits a MongoDB call, recording its latency under operation."""
+    start = time.perf_counter()
+    try:
+        return await call
+    finally:
+        MONGO_SECONDS.observe(time.perf_counter() - start, operation)
+
+async def records_settled():
+    """Waits for win records still being inserted, so counts and deletes see them."""
+    if pending_records:
+        await asyncio.gather(*pending_records, return_exceptions=True)
+
+async def records_offline():
+    """Tells clients, and returns True, when MongoDB has not connected yet."""
+    if wins_collection is not None:
+        return False
+    await broadcast({"action": "error", "message": "Game records are not available until the database connects."})
+    return True
 
 async def delete_win():
     """Deletes the most recent game win from MongoDB."""
-    last_win = await wins_collection.find_one(sort=[("timestamp", -1)])
+    global games_played
+    if await records_offline():
+        return
+    await records_settled()
+    last_win = await timed_mongo("find_one", wins_collection.find_one(sort=[("timestamp", -1)]))
     if last_win:
-        result = await wins_collection.delete_one({"_id": last_win["_id"]})
+        result = await timed_mongo("delete_one", wins_collection.delete_one({"_id": last_win["_id"]}))
         if result.deleted_count > 0:
-            print(f"Deleted last win: {last_win}")
+            games_played = max(games_played - 1, 0) if games_played is not None else None
+            forget_rounds(last_only=True)
+            records_log.info("Deleted last win: %s", last_win.get("_id"))
             await broadcast({"action": "delete_win"})
             await broadcast_game_state()  # Broadcast updated games played
             await handle_reset_table()    # Reset the table
         else:
-            print("Failed to delete the last win.")
+            records_log.warning("Failed to delete the last win.")
     else:
-        print("No win records found to delete.")
+        records_log.info("No win records found to delete.")
 
 async def delete_all_wins():
     """Deletes all game wins from MongoDB."""
-    result = await wins_collection.delete_many({})
+    global games_played
+    if await records_offline():
+        return
+    await records_settled()
+    result = await timed_mongo("delete_many", wins_collection.delete_many({}))
+    games_played = 0
+    forget_rounds()
     if result.deleted_count > 0:
-        print(f"Deleted all wins: {result.deleted_count} records")
+        records_log.info("Deleted all wins: %d records", result.deleted_count)
         await broadcast({"action": "delete_all_wins"})
         await broadcast_game_state()  # Broadcast updated games played
         await handle_reset_table()    # Reset the table
     else:
-        print("No win records found to delete.")
+        records_log.info("No win records found to delete.")
+
+def table_between_rounds():
+    """True when no cards are on the table, so a new config cannot split a round."""
+    return (
+        deal_timeline is None
+        and not game_state.dealer_hand
+        and not any(player.hand for player in game_state.players.values())
+    )
+
+def apply_staged_config():
+    """Makes the staged config live, reconnecting whatever it changed.
+
+    Runs as part of a command, so every handler sees either the old config or
+    the new one, never a mix. Returns True if the table's bet limits changed.
+    """
+    global config, staged_config, ser
+    if staged_config is None:
+        return False
+    old, config, staged_config = config, staged_config, None
+    config_log.info("Table config version %s is live (was %s)", config.version, old.version)
+    if config.mongo_uri != old.mongo_uri:
+        # Inserts already in flight keep the collection they were handed
+        start_database()
+    if config.shoe_decks != old.shoe_decks:
+        shoe_monitor.set_decks(config.shoe_decks)
+    if config.serial_port != old.serial_port and ser is not None:
+        ser.close()
+        ser = None  # read_from_serial opens the new port
+    if (config.min_bet, config.max_bet) != (old.min_bet, old.max_bet):
+        game_state.min_bet = config.min_bet
+        game_state.max_bet = config.max_bet
+        mark_table_dirty()
+        return True
+    return False
+
+async def apply_config_for_new_round():
+    """Applies a staged config as a shuffle or deal starts the next round.
+
+    Tables that go straight from a reveal to the next shuffle never reset, so
+    this is where a version staged during their last round goes live.
+    """
+    if (game_state.game_phase == "revealed" or table_between_rounds()) and apply_staged_config():
+        await broadcast_game_state()
+
+async def install_config(new_config):
+    """Stages a reloaded config; it goes live now if no round is in progress, else when the next one starts."""
+    global staged_config
+    staged_config = new_config
+    if not table_between_rounds():
+        config_log.info("Table config version %s staged until the next round", new_config.version)
+        return
+    if apply_staged_config():
+        await broadcast_game_state()
+
+def reap(websocket):
+    """Drops a client that stopped answering heartbeats from every broadcast set and aborts its connection.
+
+    Its socket is presumed dead (a sleeping tablet, lost Wi-Fi), so there is no
+    close handshake to wait for; aborting also fails any send still stuck on it.
+    """
+    session_stats["reaped"] += 1
+    clients_log.info("Reaping %s: no heartbeat for %ss", websocket.remote_address, config.heartbeat_timeout)
+    connected_clients.discard(websocket)
+    catching_up.pop(websocket, None)
+    msgpack_clients.discard(websocket)
+    dealer_clients.pop(websocket, None)
+    seat = client_views.pop(websocket, None)
+    if seat is not None:
+        away_seats[seat] = last_seq
+    last_heard[websocket] = float("inf")  # Not reaped again while handle_connection unwinds
+    websocket.transport.abort()
+
+async def send_heartbeats():
+    """Sends every open connection a heartbeat each config.heartbeat_interval and reaps silent ones.
+
+    Clients answer each heartbeat, and any message counts, so a client not heard
+    from for config.heartbeat_timeout is gone even if TCP has not noticed yet.
+    Heartbeats are written without waiting, skipping clients whose send buffer is full.
+    """
+    while True:
+        await asyncio.sleep(config.heartbeat_interval)
+        if config.heartbeat_timeout:
+            silent_since = time.monotonic() - config.heartbeat_timeout
+            for websocket in [ws for ws, heard in last_heard.items() if heard < silent_since]:
+                reap(websocket)
+        websockets.broadcast(last_heard, HEARTBEAT_FRAME)
+
+async def watch_config():
+    """Polls the config file and stages each new, valid version of it."""
+    last_stamp = table_config.file_stamp(CONFIG_PATH)
+    while True:
+        await asyncio.sleep(CONFIG_POLL_SECONDS)
+        stamp = table_config.file_stamp(CONFIG_PATH)
+        if stamp == last_stamp:
+            continue
+        last_stamp = stamp
+        current = staged_config or config
+        try:
+            new_config = table_config.load_config(CONFIG_PATH)
+        except table_config.ConfigError as e:
+            config_log.error("Config file rejected, keeping version %s: %s", current.version, e)
+            continue
+        if new_config == current:
+            continue
+        if new_config.version == current.version:
+            config_log.error("Config file changed but is still version %s; bump the version to apply it", current.version)
+            continue
+        await submit_command(install_config, new_config)
 
 async def broadcast(message):
-    """Sends a message to all connected clients."""
+    """Sends a message to all connected clients.
+
+    While a command batch is running the frame is encoded immediately (so it
+    reflects the state at this point) but held until the batch is flushed.
+    """
+    await broadcast_frame(message.get("action"), encode_frame(message), has_seat_data(message))
+
+async def broadcast_frame(action, frame, seat_data=True):
+    """Sends (or holds, during a command batch) a frame already encoded by encode_frame.
+
+    seat_data says whether the message carries per-seat data, i.e. whether
+    player-role clients get a projected view of it.
+    """
+    if pending_frames is not None:
+        pending_frames.append((action, frame, seat_data))
+        return
+    await send_to_clients(frame, seat_data)
+
+def encode_view(message):
+    """Encodes one view of a message once per codec in use: (json text, msgpack bytes or None)."""
+    binary = None
+    if msgpack_clients:
+        binary = msgpack.packb(to_compact(message))
+    return (json.dumps(message), binary)
+
+def has_seat_data(message):
+    state = message.get("game_state")
+    return "players" in message or (isinstance(state, dict) and "players" in state)
+
+def encode_frame(message):
+    """Encodes a message for every view in use: {seat or None for the full view: encoded view}."""
+    frame = {None: encode_view(message)}
+    seats = seats_in_use()
+    if seats and has_seat_data(message):
+        for seat in seats:
+            frame[seat] = encode_view(project_message(message, seat))
+    return frame
+
+def seats_in_use():
+    """Seats that need a projected view: connected player clients plus ones that may still resume."""
+    if away_seats and replay_buffer:
+        oldest = replay_buffer[0][0]
+        for seat, seq in list(away_seats.items()):
+            if seq < oldest - 1:
+                del away_seats[seat]
+    return set(client_views.values()) | away_seats.keys()
+
+def pick_encoding(frame, websocket):
+    """The payload of a frame matching a client's view and codec."""
+    text, binary = frame.get(client_views.get(websocket), frame[None])
+    return binary if binary is not None and websocket in msgpack_clients else text
+
+def tag_encoded(encoded, seq):
+    """Adds "seq" to an encoded message without re-encoding it."""
+    text, binary = encoded
+    tagged_text = f'{{"seq": {seq}, ' + text[1:]
+    if binary is None:
+        return (tagged_text, None)
+    if binary[0] == 0xde:  # map16
+        size, body = int.from_bytes(binary[1:3], "big"), binary[3:]
+    else:  # fixmap
+        size, body = binary[0] & 0x0f, binary[1:]
+    return (tagged_text, msgpack_map_header(size + 1) + msgpack.packb("seq") + msgpack.packb(seq) + body)
+
+async def send_to_clients(frame, seat_data=True):
+    """Sends an already encoded frame to all connected clients in their view and codec.
+
+    The frame is numbered and kept in the replay buffer for reconnecting clients.
+    """
+    global last_seq
+    last_seq += 1
+    replay_buffer.append((last_seq, frame, seat_data))
+    broadcast_stats["frames"] += 1
+    broadcast_stats["frame_bytes"] += len(frame[None][0])
     if connected_clients:
+        start = time.perf_counter()
+        tagged = {view: tag_encoded(encoded, last_seq) for view, encoded in frame.items()}
+        for text, binary in tagged.values():
+            FRAME_BYTES.observe(len(text), "json")
+            if binary is not None:
+                FRAME_BYTES.observe(len(binary), "msgpack")
+        payloads = [(client, pick_encoding(tagged, client)) for client in connected_clients]
+        broadcast_stats["bytes"] += sum(len(payload) for _, payload in payloads)
+        if catching_up:
+            payloads = hold_for_catch_up(payloads)
         await asyncio.gather(
-            *[client.send(json.dumps(message)) for client in connected_clients],
+            *[client.send(payload) for client, payload in payloads],
             return_exceptions=True
         )
+        BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+def hold_for_catch_up(payloads):
+    """Queues payloads for clients still being sent their catch-up; returns the rest to send now.
+
+    A client that falls REPLAY_BUFFER_SIZE frames behind is disconnected and resumes when it reconnects.
+    """
+    send_now = []
+    for client, payload in payloads:
+        held = catching_up.get(client)
+        if held is None:
+            send_now.append((client, payload))
+        elif len(held) < REPLAY_BUFFER_SIZE:
+            held.append(payload)
+        else:
+            clients_log.warning("Disconnecting %s: %d frames behind during catch-up", client.remote_address, len(held))
+            del catching_up[client]
+            connected_clients.discard(client)
+            asyncio.create_task(client.close(1013, "too far behind; reconnect to resume"))
+    return send_now
+
+async def send_to_client(websocket, message):
+    """Sends a message to a single client in its view and codec, outside the numbered stream."""
+    try:
+        await websocket.send(pick_encoding(encode_frame(message), websocket))
+    except websockets.ConnectionClosed:
+        pass
+
+def missed_frames(resume, seat=None):
+    """The buffered frames after a resume token "<epoch>.<seq>", or None if a snapshot is needed.
+
+    A player-role client also needs a snapshot if one of the frames it missed
+    carried seat data but was not encoded for its seat.
+    """
+    try:
+        epoch, seq = resume.split(".")
+        seq = int(seq)
+    except (AttributeError, ValueError):
+        return None
+    if epoch != SERVER_EPOCH or seq > last_seq:
+        return None
+    if seq == last_seq:
+        return []
+    if not replay_buffer or replay_buffer[0][0] > seq + 1:
+        return None  # Too far behind, the frames it missed are gone
+    missed = [entry for entry in replay_buffer if entry[0] > seq]
+    if seat is not None and any(seat_data and seat not in frame for _, frame, seat_data in missed):
+        return None
+    return missed
+
+async def start_session(websocket, resume=None):
+    """Adds a newly connected client to the broadcast set and returns the payloads that bring it up to date.
+
+    A client resuming within this server run gets only the frames it missed;
+    otherwise it gets the current game state (with games played count). Runs
+    in the command queue but sends nothing: send_catch_up() does that from the
+    client's own task, while later broadcasts are held for it in catching_up.
+    """
+    await flush_broadcasts()
+    missed = missed_frames(resume, client_views.get(websocket))
+    payloads = [pick_encoding(encode_frame({"action": "session", "epoch": SERVER_EPOCH, "seq": last_seq}), websocket)]
+    timeline = deal_timeline_payload(websocket)
+    if missed is None:
+        # A running deal timeline goes first so the client masks the dealt hands
+        if timeline is not None:
+            payloads.append(timeline)
+        games_played = await get_games_played_count()
+        payloads.append(pick_encoding(update_game_frames(games_played), websocket))
+    else:
+        for seq, frame, _ in missed:
+            payloads.append(pick_encoding({view: tag_encoded(encoded, seq) for view, encoded in frame.items()}, websocket))
+        if timeline is not None:
+            payloads.append(timeline)
+    catching_up[websocket] = deque()
+    connected_clients.add(websocket)
+    away_seats.pop(client_views.get(websocket), None)
+    return payloads
+
+async def send_catch_up(websocket, payloads):
+    """Sends a new client its catch-up payloads, then the broadcasts held for it meanwhile, in order."""
+    try:
+        for payload in payloads:
+            await websocket.send(payload)
+        held = catching_up.get(websocket)
+        while held:
+            await websocket.send(held.popleft())
+    finally:
+        catching_up.pop(websocket, None)  # Broadcasts now go to it directly
+
+async def flush_broadcasts():
+    """Sends the frames held during the current command batch, in order.
+
+    Only the last full-state "update_game" frame of a batch is sent, since it
+    supersedes the earlier ones.
+    """
+    global pending_frames
+    if not pending_frames:
+        return
+    frames = pending_frames
+    pending_frames = []
+    last_update = max((i for i, (action, _, _) in enumerate(frames) if action == "update_game"), default=-1)
+    for i, (action, frame, seat_data) in enumerate(frames):
+        if action == "update_game" and i != last_update:
+            continue
+        await send_to_clients(frame, seat_data)
+
+async def submit_command(handler, *args):
+    """Queues a state mutation for the command processor and waits for it to finish."""
+    future = asyncio.get_running_loop().create_future()
+    await command_queue.put((handler, args, future))
+    return await future
+
+async def run_command(handler, args, future, completed):
+    """Runs a single queued command; its future is resolved once the batch is flushed."""
+    try:
+        result = await handler(*args)
+    except Exception as e:
+        log.exception("Command %s failed: %s", handler.__name__, e)
+        completed.append((future, None, e))
+    else:
+        completed.append((future, result, None))
+
+async def process_commands():
+    """Applies queued commands one at a time, in order, batching their broadcasts.
 
-async def main():
-    """Starts the WebSocket server."""
-    # Initialize serial port for shoe reader
-    global ser
+    This is the only task that mutates game_state, so handlers never interleave
+    across await points. Commands that are already waiting when a batch starts
+    run in the same batch and share one flush. A handler must not wait on a
+    timer, since everything queued behind it waits too: a timed sequence is
+    queued as separate steps, or played out by the clients as a deal timeline is.
+    """
+    global pending_frames
+    while True:
+        handler, args, future = await command_queue.get()
+        pending_frames = []
+        completed = []
+        try:
+            await run_command(handler, args, future, completed)
+            while not command_queue.empty() and len(completed) < MAX_COMMAND_BATCH:
+                handler, args, future = command_queue.get_nowait()
+                await run_command(handler, args, future, completed)
+            await flush_broadcasts()
+            if batch_traces:
+                sent_at = time.perf_counter()
+                for trace, handled_at in batch_traces:
+                    trace.stage("broadcast", handled_at, sent_at)
+                    tracer.sent(trace, sent_at, last_seq)
+                batch_traces.clear()
+            await publish_dealer_odds()
+            await publish_shoe_alerts()
+        finally:
+            pending_frames = None
+            for future, result, error in completed:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+def open_shoe_reader():
+    """Opens the shoe reader on config.serial_port; returns the port, or None if it is unavailable."""
+    import serial  # Imported here so pyserial stays off the startup path
     try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.5)
-        print(f"Connected to shoe reader on {SERIAL_PORT}")
+        port = serial.Serial(config.serial_port, BAUD_RATE, timeout=0.5)
     except serial.SerialException as e:
-        print(f"Serial port error: {e}")
-        logging.error(f"Failed to connect to shoe reader on {SERIAL_PORT}: {e}")
-        ser = None
-    
-    # Start the serial reader as a background task
-    serial_task = asyncio.create_task(read_from_serial())
-    
-    async with websockets.serve(handle_connection, "0.0.0.0", 6789):
-        print("Mini Flush WebSocket server running on ws://localhost:6789")
-        print(f"Shoe reader attempting to connect on {SERIAL_PORT}")
+        serial_log.error("Failed to connect to shoe reader on %s: %s", config.serial_port, e)
+        return None
+    log.info("Connected to shoe reader on %s", config.serial_port)
+    return port
+
+def open_database(uri):
+    """Creates the Motor client for uri and returns its game_wins collection (no I/O yet)."""
+    global client, db
+    import motor.motor_asyncio  # Imported here so Motor and PyMongo stay off the startup path
+    client = motor.motor_asyncio.AsyncIOMotorClient(uri, serverSelectionTimeoutMS=5000)
+    db = client[DB_NAME]
+    return db[COLLECTION_NAME]
+
+def start_database():
+    """(Re)starts connecting to config.mongo_uri in the background; win records are held until it answers."""
+    global database_task, wins_collection, games_played
+    if database_task is not None:
+        database_task.cancel()
+    wins_collection = None
+    games_played = None
+    database_task = asyncio.create_task(connect_database())
+
+async def connect_database():
+    """Pings MongoDB until it answers, backing off between attempts, then brings the records online."""
+    # Importing Motor takes longer than the rest of startup; keep the event loop free meanwhile
+    await asyncio.to_thread(importlib.import_module, "motor.motor_asyncio")
+    collection = open_database(config.mongo_uri)
+    delay = 1
+    while True:
+        try:
+            await timed_mongo("ping", client.admin.command("ping"))
+            break
+        except Exception as e:
+            records_log.error("❌ Could not connect to MongoDB, retrying in %ss: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+    records_log.info("✅ Connected to MongoDB successfully.")
+    records_log.info("Using database: %s, collection: %s", DB_NAME, COLLECTION_NAME)
+    await submit_command(database_connected, collection)
+
+async def database_connected(collection):
+    """Inserts the held win records, loads the games played count and sends it to clients."""
+    global wins_collection, held_records, games_played
+    wins_collection = collection
+    records, held_records = held_records, []
+    for record in records:
+        schedule_record(record)
+    await records_settled()
+    games_played = await timed_mongo("count_documents", wins_collection.count_documents({}))
+    await broadcast_game_state()
+
+HTTP_STATUS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+def http_metrics(headers):
+    return 200, {"Content-Type": metrics.CONTENT_TYPE}, metrics.render().encode()
+
+def cached_json(path, etag, build, headers):
+    """Answers a poll from a JSON body encoded once per ETag.
+
+    A client that already holds etag gets a 304; otherwise the body, gzipped
+    when the client accepts it.
+    """
+    entry = http_bodies.get(path)
+    if entry is None or entry[0] != etag:
+        body = build().encode()
+        entry = http_bodies[path] = (etag, body, gzip.compress(body, 6))
+    response_headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",  # Browsers revalidate every poll, which costs a 304
+        "Vary": "Accept-Encoding",
+        "Access-Control-Allow-Origin": "*",
+    }
+    if etag in (tag.strip().removeprefix("W/") for tag in headers.get("if-none-match", "").split(",")):
+        return 304, response_headers, b""
+    response_headers["Content-Type"] = "application/json"
+    if "gzip" in headers.get("accept-encoding", ""):
+        response_headers["Content-Encoding"] = "gzip"
+        return 200, response_headers, entry[2]
+    return 200, response_headers, entry[1]
+
+def http_snapshot(headers):
+    """The table as the update_game message a stats screen gets on connecting."""
+    etag = f'"{SERVER_EPOCH}-{state_version}-{games_played}"'
+    return cached_json("/snapshot", etag, lambda: update_game_frame(games_played)[0], headers)
+
+def http_rounds(headers):
+    """Win records of the last RECENT_ROUNDS rounds played since the server started, newest first."""
+    etag = f'"{SERVER_EPOCH}-r{rounds_version}"'
+    return cached_json("/rounds", etag, lambda: json.dumps({"rounds": list(reversed(recent_rounds))}), headers)
+
+# Plain HTTP endpoints served next to the websocket server: path -> handler(request headers) -> (status, headers, body)
+HTTP_ROUTES = {
+    "/metrics": http_metrics,
+}
+SNAPSHOT_ROUTES = {
+    "/snapshot": http_snapshot,
+    "/rounds": http_rounds,
+}
+
+async def handle_http(reader, writer, routes=HTTP_ROUTES):
+    """Answers one HTTP/1.x GET request from routes, then closes the connection."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            status, response_headers, body = 400, {}, b""
+        elif parts[0] not in ("GET", "HEAD"):
+            status, response_headers, body = 405, {"Allow": "GET, HEAD"}, b""
+        else:
+            route = routes.get(urlparse(parts[1]).path)
+            status, response_headers, body = route(headers) if route else (404, {}, b"")
+        head = [f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}", f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in response_headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        if parts[:1] != ["HEAD"]:
+            writer.write(body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+        pass
+    finally:
+        writer.close()
+
+async def start_http(port, routes=HTTP_ROUTES, host="127.0.0.1"):
+    """Serves routes on host:port; logs and carries on if the port is taken."""
+    try:
+        server = await asyncio.start_server(lambda reader, writer: handle_http(reader, writer, routes), host, port)
+    except OSError as e:
+        log.error("HTTP endpoints %s not started on port %s: %s", ", ".join(routes), port, e)
+        return None
+    log.info("Serving %s on http://%s:%s", ", ".join(routes), host, port)
+    return server
+
+async def main(port=6789, memory_db=False, metrics_port=METRICS_PORT, trace_file=None, trace_sample=0.1,
+               snapshot_port=SNAPSHOT_PORT):
+    """Starts the WebSocket server, then connects MongoDB and the shoe reader in the background.
+
+    With memory_db, win records go to an in-memory stand-in instead of MongoDB
+    (for load testing on a box without a database). With trace_file, that share
+    of shoe reader cards is traced to it (see tracing.py).
+    """
+    global wins_collection, games_played, tracer
+    command_task = asyncio.create_task(process_commands())
+    if trace_file:
+        tracer = tracing.Tracer(trace_file, trace_sample)
+        trace_task = asyncio.create_task(tracer.run())
+        log.info("Tracing %.0f%% of shoe reader cards to %s", trace_sample * 100, trace_file)
+    
+    # Listen first: displays get the table straight away while the dependencies connect
+    async with websockets.serve(handle_connection, "0.0.0.0", port):
+        log.info("Mini Flush WebSocket server running on ws://localhost:%s", port)
+        http_server = await start_http(metrics_port) if metrics_port else None
+        snapshot_server = await start_http(snapshot_port, SNAPSHOT_ROUTES, "0.0.0.0") if snapshot_port else None
+        if memory_db:
+            from standins import MemoryCollection
+            wins_collection = MemoryCollection(keep=1000)
+            games_played = 0
+            log.info("Recording wins in memory; MongoDB is not used")
+        else:
+            start_database()
+        serial_task = asyncio.create_task(read_from_serial())
+        config_task = asyncio.create_task(watch_config())
+        heartbeat_task = asyncio.create_task(send_heartbeats())
+        log.info("Shoe reader attempting to connect on %s", config.serial_port)
+        log.info("Table config version %s from %s", config.version, CONFIG_PATH)
         
         # Wait for both the WebSocket server and serial reader
         try:
             await asyncio.gather(
                 asyncio.Future(),  # Keep WebSocket server running
-                serial_task
+                command_task,
+                serial_task,
+                config_task,
+                heartbeat_task
             )
         except KeyboardInterrupt:
-            print("Shutting down server...")
+            log.info("Shutting down server...")
             if ser and ser.is_open:
                 ser.close()
 
-async def check_connection():
-    try:
-        await client.admin.command('ping')
-        logging.info("✅ Connected to MongoDB successfully.")
-        logging.info(f"Using database: {DB_NAME}, collection: {COLLECTION_NAME}")
-    except ServerSelectionTimeoutError as e:
-        logging.error("❌ Could not connect to MongoDB: %s", e)
-        exit(1)
-
 def extract_card_value(input_string):
     """
     Extract the card value from the input string formatted like:
@@ -1172,7 +2133,7 @@ def extract_card_value(input_string):
 
 # Helper to get list of active player IDs in order
 def get_active_player_ids():
-    return [pid for pid, player in game_state["players"].items() if player["active"]]
+    return game_state.active_player_ids()
 
 # State to track dealing progress for foolproof_deal_card
 foolproof_deal_state = {
@@ -1181,18 +2142,54 @@ foolproof_deal_state = {
     "dealer_cards": 0
 }
 
+def copy_deal_state(deal_state):
+    """Copies foolproof_deal_state for the undo history."""
+    return {
+        "current_index": deal_state["current_index"],
+        "player_cards": dict(deal_state["player_cards"]),
+        "dealer_cards": deal_state["dealer_cards"]
+    }
+
 def get_deal_order():
     """Returns the current round-robin deal order: all active players (in order), then dealer (last)."""
     active_players = get_active_player_ids()
     return active_players + ["dealer"]  # Dealer is always last
 
+def queue_shoe_alert(kind, card, message):
+    """Holds a shoe alert until the current command batch has been flushed."""
+    pending_shoe_alerts.append({"kind": kind, "card": card, "message": message, "timestamp": datetime.now().isoformat()})
+
+async def publish_shoe_alerts():
+    """Logs the shoe alerts raised by the last command batch and sends them to dealer clients."""
+    global pending_shoe_alerts
+    if not pending_shoe_alerts:
+        return
+    alerts = pending_shoe_alerts
+    pending_shoe_alerts = []
+    for alert in alerts:
+        shoe_log.warning("%s: %s", alert["kind"], alert["message"], extra={"card": alert["card"]})
+    dealers = [ws for ws in dealer_clients if ws in connected_clients]
+    if dealers:
+        message = {"action": "shoe_alert", "alerts": alerts}
+        await asyncio.gather(*[send_to_client(ws, message) for ws in dealers])
+
 async def foolproof_deal_card(card):
+    """Deals a card read by the shoe reader or entered at the console, then checks it for shoe anomalies.
+
+    The monitor sees the card after the deal, so the undo snapshot the deal
+    saves is from before the card was counted.
+    """
+    await deal_in_order(card)
+    for kind, message in shoe_monitor.observe(card, time.monotonic()):
+        queue_shoe_alert(kind, card, message)
+
+async def deal_in_order(card):
+    """Gives a card to the next seat in round-robin order that still needs one, dealer last."""
     deal_order = get_deal_order()
     n = len(deal_order)
-    logging.info(f"[Deal] Current deal order: {deal_order}")
-    logging.info(f"[Deal] Current round-robin index: {foolproof_deal_state['current_index']}")
+    deal_log.debug("Current deal order: %s, round-robin index: %d", deal_order, foolproof_deal_state["current_index"])
     if n == 0:
-        logging.info("[Deal] No players to deal to.")
+        deal_log.info("No players to deal to.")
         return
     # Initialize player_cards for new players
     for pid in get_active_player_ids():
@@ -1209,24 +2206,24 @@ async def foolproof_deal_card(card):
     for _ in range(n):
         idx = foolproof_deal_state["current_index"] % n
         target = deal_order[idx]
-        logging.info(f"[Deal] Considering target: {target}")
+        deal_log.debug("Considering target: %s", target)
         card_dealt = False
         if target == "dealer":
             if foolproof_deal_state["dealer_cards"] < 3:
-                logging.info(f"[Deal] Dealing card {card} to dealer (current count: {foolproof_deal_state['dealer_cards']})")
+                deal_log.debug("Dealing card %s to dealer (current count: %d)", card, foolproof_deal_state["dealer_cards"])
                 # Try to add card, but only advance pointer if not duplicate
-                before = len(game_state["dealer_hand"])
+                before = len(game_state.dealer_hand)
                 await handle_add_card(card, "dealer")
-                after = len(game_state["dealer_hand"])
+                after = len(game_state.dealer_hand)
                 if after > before:
                     foolproof_deal_state["dealer_cards"] += 1
                     card_dealt = True
         else:
             if foolproof_deal_state["player_cards"].get(target, 0) < 3:
-                logging.info(f"[Deal] Dealing card {card} to {target} (current count: {foolproof_deal_state['player_cards'].get(target, 0)})")
-                before = len(game_state["players"][target]["hand"])
+                deal_log.debug("Dealing card %s to %s (current count: %d)", card, target, foolproof_deal_state["player_cards"].get(target, 0))
+                before = len(game_state.players[target].hand)
                 await handle_add_card(card, target)
-                after = len(game_state["players"][target]["hand"])
+                after = len(game_state.players[target].hand)
                 if after > before:
                     foolproof_deal_state["player_cards"][target] += 1
                     card_dealt = True
@@ -1234,44 +2231,548 @@ async def foolproof_deal_card(card):
             foolproof_deal_state["current_index"] = (foolproof_deal_state["current_index"] + 1) % n
             return
         else:
-            logging.info(f"[Deal] Card {card} was not dealt to {target} (likely duplicate or error), pointer not advanced.")
+            deal_log.info("Card %s was not dealt to %s (likely duplicate or error), pointer not advanced.", card, target)
         foolproof_deal_state["current_index"] = foolproof_deal_state["current_index"] % n
     # If all have 3 cards, ignore the card
-    logging.info(f"[Deal] All players and dealer have 3 cards, ignoring: {card}")
+    deal_log.info("All players and dealer have 3 cards, ignoring: %s", card)
+    if foolproof_deal_state["dealer_cards"] >= 3 and all(count >= 3 for count in foolproof_deal_state["player_cards"].values()):
+        queue_shoe_alert("card_discarded", card, f"{card} read after every hand had three cards; not dealt")
 
 # Replace smart_deal_card with foolproof_deal_card in read_from_serial
+async def traced_deal_card(card, trace, queued_at):
+    """foolproof_deal_card for a sampled card, timing its stages into trace."""
+    global active_trace
+    start = time.perf_counter()
+    trace.stage("queue_wait", queued_at, start)
+    active_trace = trace
+    try:
+        await foolproof_deal_card(card)
+    finally:
+        active_trace = None
+        handled_at = time.perf_counter()
+        trace.stage("foolproof_deal_card", start, handled_at)
+        batch_traces.append((trace, handled_at))
+
 async def read_from_serial():
-    """Continuously reads card values from the casino shoe reader and adds them to the game."""
+    """Continuously reads card values from the casino shoe reader and adds them to the game.
+
+    Opens the reader itself, retrying with backoff while it is missing, and
+    reopens it if it fails mid-shift or config.serial_port changes.
+    """
+    global ser, serial_backlog
+    delay = 1
     while True:
-        if ser and ser.in_waiting > 0:
-            raw_data = ser.readline().decode("utf-8").strip()
-            logging.info(f"Raw data from serial: {raw_data}")
+        if ser is None:
+            ser = await asyncio.to_thread(open_shoe_reader)
+            if ser is None:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+                continue
+            delay = 1
+        try:
+            read_start = time.perf_counter()
+            serial_backlog = ser.in_waiting
+            raw_data = ser.readline().decode("utf-8").strip() if serial_backlog > 0 else None
+        except OSError as e:  # serial.SerialException is an OSError
+            serial_log.error("Shoe reader on %s failed, reconnecting: %s", config.serial_port, e)
+            ser.close()
+            ser = None
+            continue
+        if raw_data is not None:
+            read_at = time.perf_counter()
+            serial_log.debug("Raw data from serial: %s", raw_data)
             card = extract_card_value(raw_data)
-            logging.info(f"Extracted card: {card}")
-            if card:
-                await foolproof_deal_card(card)
+            serial_log.debug("Extracted card: %s", card)
+            if card and tracer.sample():
+                trace = tracer.start(card, read_start)
+                trace.stage("serial_read", read_start, read_at)
+                await submit_command(traced_deal_card, card, trace, time.perf_counter())
+                CARD_SECONDS.observe(time.perf_counter() - read_at)
+            elif card:
+                await submit_command(foolproof_deal_card, card)  # Resolves once the batch's broadcasts are sent
+                CARD_SECONDS.observe(time.perf_counter() - read_at)
             else:
-                logging.info("No valid card extracted from serial data.")
+                serial_log.info("No valid card extracted from serial data: %r", raw_data)
         await asyncio.sleep(0.01)  # Minimal sleep to yield control
 
 async def get_games_played_count():
-    """Returns the number of games played (number of records in wins_collection)."""
-    return await wins_collection.count_documents({})
+    """Returns the number of games played (records in wins_collection), or None until MongoDB has been counted.
+
+    Served from the games_played cache, which record_wins and the deletes keep
+    in step with the collection, so connecting clients never wait on MongoDB.
+    """
+    return games_played
 
 async def broadcast_game_state():
     """Broadcasts the current game state to all clients, including games played count."""
     games_played = await get_games_played_count()
-    state = {
-        "dealer_hand": game_state["dealer_hand"],
-        "players": game_state["players"],
-        "game_phase": game_state["game_phase"],
-        "winners": game_state["winners"],
-        "min_bet": game_state["min_bet"],
-        "max_bet": game_state["max_bet"],
-        "table_number": game_state["table_number"],
-        "games_played": games_played
-    }
-    await broadcast({"action": "update_game", "game_state": state})
+    await broadcast_frame("update_game", update_game_frames(games_played))
+
+# Cached update_game fragments: each seat and the table-level fields are encoded
+# once and only re-encoded after a handler marks them dirty. Assembled views are
+# cached until the next change (i.e. per state version).
+TABLE_FRAGMENT_FIELDS = ("dealer_hand", "game_phase", "winners", "min_bet", "max_bet", "table_number")
+player_fragments = {}  # player_id -> (full view, public view), each a keyed (json member, msgpack entry or None)
+table_fragment = None  # (json object body, msgpack map entries or None, entry count)
+view_cache = {}  # (seat or None, games_played, binary) -> encoded update_game view
+
+def mark_players_dirty(*player_ids):
+    """Drops the cached fragments of the given seats."""
+    global state_version
+    for pid in player_ids:
+        player_fragments.pop(pid, None)
+    view_cache.clear()
+    state_version += 1
+
+def mark_table_dirty():
+    """Drops the cached table-level fragment (dealer hand, phase, winners, settings)."""
+    global table_fragment, state_version
+    table_fragment = None
+    view_cache.clear()
+    state_version += 1
+
+def mark_all_dirty():
+    """Drops every cached fragment, e.g. after bulk changes or when game_state is replaced."""
+    player_fragments.clear()
+    mark_table_dirty()
+
+def msgpack_map_header(size):
+    return bytes([0x80 | size]) if size < 16 else b"\xde" + size.to_bytes(2, "big")
+
+def encode_member(pid, value, compact=None):
+    """Encodes one keyed map member: (json '"pid": {...}', msgpack key + compact value or None)."""
+    return (
+        f'"{pid}": {json.dumps(value)}',
+        msgpack.packb(pid) + msgpack.packb(compact) if compact is not None else None,
+    )
+
+def update_game_frame(games_played=None, seat=None):
+    """Assembles an update_game view from cached fragments, re-encoding only dirty pieces.
+
+    seat selects a player-role projection; None gives the full view.
+    """
+    global table_fragment
+    binary = bool(msgpack_clients)
+    cache_key = (seat, games_played, binary)
+    cached = view_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    players = game_state.players
+    for pid, player in players.items():
+        fragment = player_fragments.get(pid)
+        if fragment is None or (binary and fragment[0][1] is None):
+            player_fragments[pid] = (
+                encode_member(pid, player.to_wire(), player.to_wire(WIRE_CODES) if binary else None),
+                encode_member(pid, player.public_wire(), player.public_wire(WIRE_CODES) if binary else None),
+            )
+    if table_fragment is None or (binary and table_fragment[1] is None):
+        table = {key: getattr(game_state, key) for key in TABLE_FRAGMENT_FIELDS}
+        entries = None
+        if binary:
+            compact = to_compact(table)
+            entries = b"".join(msgpack.packb(key) + msgpack.packb(value) for key, value in compact.items())
+        table_fragment = (json.dumps(table)[1:-1], entries, len(table))
+
+    members = [player_fragments[pid][0 if seat is None or pid == seat else 1] for pid in players]
+    table_body, table_entries, table_size = table_fragment
+    players_body = ", ".join([member[0] for member in members])
+    extra = f', "games_played": {json.dumps(games_played)}' if games_played is not None else ""
+    text = '{"action": "update_game", "game_state": {' + table_body + ', "players": {' + players_body + '}' + extra + '}}'
+    encoded = None
+    if binary:
+        state_size = table_size + 1 + (games_played is not None)
+        parts = [
+            b"\x82", msgpack.packb("action"), msgpack.packb("update_game"),
+            msgpack.packb("game_state"), msgpack_map_header(state_size), table_entries,
+            msgpack.packb("players"), msgpack_map_header(len(players)),
+        ]
+        parts.extend(member[1] for member in members)
+        if games_played is not None:
+            parts.append(msgpack.packb("games_played") + msgpack.packb(games_played))
+        encoded = b"".join(parts)
+    view_cache[cache_key] = (text, encoded)
+    return (text, encoded)
+
+def update_game_frames(games_played=None):
+    """The update_game frame for every view in use, shaped like encode_frame's result."""
+    frame = {None: update_game_frame(games_played)}
+    for seat in seats_in_use():
+        frame[seat] = update_game_frame(games_played, seat)
+    return frame
+
+# Card codes as sent by the dealer console and the shoe reader, e.g. "AS", "TD"
+CARD_PATTERN = re.compile(r"^[A2-9TJQK][SDCH]$")
+NUMBER = (int, float)
+
+def compile_validator(fields):
+    """Builds a validator that pulls an action's handler arguments out of a message.
+
+    fields is a sequence of (key, types, required, check) tuples. The returned
+    function gives the positional arguments for the handler, or raises ValueError
+    naming the first missing or malformed field.
+    """
+    fields = tuple(fields)
+    if not fields:
+        return lambda data: ()
+
+    def validate(data):
+        args = []
+        for key, types, required, check in fields:
+            value = data.get(key)
+            if value is None:
+                if required:
+                    raise ValueError(f"Missing '{key}'")
+            elif (not isinstance(value, types) or (isinstance(value, bool) and bool not in types)
+                    or (check is not None and not check(value))):
+                raise ValueError(f"Invalid '{key}': {value!r}")
+            args.append(value)
+        return tuple(args)
+    return validate
+
+def field(key, types, required=True, check=None):
+    """Describes one message field for compile_validator."""
+    return (key, types if isinstance(types, tuple) else (types,), required, check)
+
+def is_card(value):
+    return CARD_PATTERN.match(value) is not None
+
+# Action name -> (handler, compiled validator, follow-up handlers run after it)
+ACTION_ROUTES = {
+    "shuffle_deck": (handle_shuffle_deck, compile_validator([]), ()),
+    "deal_cards": (handle_deal_cards, compile_validator([]), ()),
+    "add_player": (handle_add_player, compile_validator([field("player", str, required=False)]), ()),
+    "remove_player": (handle_remove_player, compile_validator([field("player", str)]), ()),
+    "reset_table": (handle_reset_table, compile_validator([]), ()),
+    "undo_last": (handle_undo_last, compile_validator([]), ()),
+    # update games played after a game
+    "reveal_hands": (handle_reveal_hands, compile_validator([]), (broadcast_game_state,)),
+    # Always use round-robin logic for dealing cards, ignore target
+    "add_card": (foolproof_deal_card, compile_validator([field("card", str, check=is_card)]), ()),
+    "bet_changed": (handle_change_bet, compile_validator([field("minBet", NUMBER), field("maxBet", NUMBER)]), ()),
+    "table_number_set": (handle_table_number, compile_validator([field("tableNumber", (str, int))]), ()),
+    "delete_win": (delete_win, compile_validator([]), ()),
+    "delete_all_wins": (delete_all_wins, compile_validator([]), ()),
+    # update games played after clearing
+    "clear_records": (handle_clear_records, compile_validator([]), (broadcast_game_state,)),
+    # Shuffle, then deal as a command of its own
+    "start_automatic": (start_automatic, compile_validator([]), (deal_automatic,)),
+    "start_manual": (start_manual, compile_validator([]), ()),
+    "player_played": (handle_player_played, compile_validator([field("player", str)]), ()),
+    "player_surrendered": (handle_player_surrendered, compile_validator([field("player", str)]), ()),
+    "test_card_reading": (handle_test_card_reading, compile_validator([field("test_data", str)]), ()),
+    "change_game_settings": (handle_change_game_settings, compile_validator([
+        field("min_bet", NUMBER, required=False),
+        field("max_bet", NUMBER, required=False),
+        field("table_number", (str, int), required=False),
+    ]), ()),
+    "manual_set_result": (handle_manual_set_result, compile_validator([
+        field("player", str),
+        field("result", str, check=lambda r: r in ("win", "lose")),
+    ]), ()),
+    "broadcast_ante": (handle_broadcast_ante, compile_validator([]), ()),
+}
+
+# Per-action counters: action -> {"count", "rejected", "total_ms", "max_ms"}
+action_stats = {}
+
+def record_action_stat(action, elapsed_ms=None):
+    """Counts a handled action and its latency, or a rejected one when elapsed_ms is None."""
+    stats = action_stats.get(action)
+    if stats is None:
+        stats = action_stats[action] = {"count": 0, "rejected": 0, "total_ms": 0.0, "max_ms": 0.0}
+    if elapsed_ms is None:
+        stats["rejected"] += 1
+        return
+    stats["count"] += 1
+    stats["total_ms"] += elapsed_ms
+    if elapsed_ms > stats["max_ms"]:
+        stats["max_ms"] = elapsed_ms
+
+# Duplicate dealer commands (a double tap, a message re-sent after a reconnect) are
+# ignored before they reach the command queue, so they cost no state copy, broadcast
+# or database work. Clients tag each action with a unique "id"; an id seen within
+# ACTION_ID_SECONDS is a re-send. An action in DEBOUNCED_ACTIONS straight after the
+# same action, within DEBOUNCE_SECONDS, is a double tap. PHASE_GUARDS check the table
+# when a command's turn comes in the queue, before its handler runs; an action is
+# only debounced against once it has passed its guard.
+ACTION_ID_SECONDS = 60
+ACTION_ID_LIMIT = 4096
+MAX_ACTION_ID_LENGTH = 64
+DEBOUNCE_SECONDS = 1.0
+DEBOUNCED_ACTIONS = {"start_automatic", "shuffle_deck", "deal_cards", "reveal_hands", "reset_table", "delete_win", "delete_all_wins", "clear_records"}
+seen_action_ids = {}  # client-supplied id -> time.monotonic() when accepted, oldest first
+last_accepted = (None, float("-inf"))  # (action, time.monotonic()) of the last action accepted from any client
+ignored_stats = {"duplicate_id": 0, "debounced": 0, "phase": 0}
+metrics.counter("miniflush_actions_ignored_total", "Duplicate client actions ignored without being applied.", lambda: ignored_stats, label="reason")
+
+def action_id_of(data):
+    """The client-supplied id of an action, or None; raises ValueError if it is malformed."""
+    action_id = data.get("id")
+    if action_id is not None and (not isinstance(action_id, str) or not 0 < len(action_id) <= MAX_ACTION_ID_LENGTH):
+        raise ValueError(f"id must be a string of 1 to {MAX_ACTION_ID_LENGTH} characters")
+    return action_id
+
+def duplicate_of(action, action_id):
+    """Why an action is a duplicate, or None after recording its id."""
+    now = time.monotonic()
+    while seen_action_ids and (len(seen_action_ids) > ACTION_ID_LIMIT or next(iter(seen_action_ids.values())) < now - ACTION_ID_SECONDS):
+        del seen_action_ids[next(iter(seen_action_ids))]
+    if action_id is not None and action_id in seen_action_ids:
+        ignored_stats["duplicate_id"] += 1
+        return "already received"
+    if action in DEBOUNCED_ACTIONS and last_accepted[0] == action and now - last_accepted[1] < DEBOUNCE_SECONDS:
+        ignored_stats["debounced"] += 1
+        return f"repeated within {DEBOUNCE_SECONDS:g}s"
+    if action_id is not None:
+        seen_action_ids[action_id] = now
+    return None
+
+def accept_action(action):
+    """Records the action a repeat is debounced against, once it is certain to run."""
+    global last_accepted
+    last_accepted = (action, time.monotonic())
+
+def revealed_this_round():
+    # manual_set_result also moves the phase to "revealed"; only a real reveal settles dealer_qualifies
+    if game_state.game_phase == "revealed" and game_state.dealer_qualifies is not None:
+        return "hands already revealed this round"
+    return None
+
+def dealt_this_round():
+    return "cards already dealt; reset the table first" if game_state.game_phase == "dealing" else None
+
+def automatic_deal_started():
+    if automatic_deal_queued:
+        return "an automatic deal is already starting"
+    return dealt_this_round()
+
+# action -> check run in the command queue; a reason string means the command is ignored
+PHASE_GUARDS = {
+    "reveal_hands": revealed_this_round,
+    "deal_cards": dealt_this_round,
+    "start_automatic": automatic_deal_started,
+}
+
+async def run_guarded(guard, action, handler, *args):
+    """Runs handler unless guard gives a reason not to, which is returned."""
+    reason = guard()
+    if reason is not None:
+        ignored_stats["phase"] += 1
+        return reason
+    accept_action(action)
+    await handler(*args)
+    return None
+
+async def send_ignored(websocket, action, action_id, reason):
+    """Tells the sender its action was a duplicate; nothing is broadcast."""
+    clients_log.info("Ignored %s from %s: %s", action, websocket.remote_address, reason)
+    try:
+        await websocket.send(json.dumps({"action": "action_ignored", "request": action, "id": action_id, "reason": reason}))
+    except websockets.ConnectionClosed:
+        pass
+
+# Dealer-only profiling of the live process (see profiling.py); nothing runs until started
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+PROFILE_DEFAULT_SECONDS = 30
+profile_session = None
+profile_timer = None
+
+def profiled_handlers():
+    """Functions the profile summary reports time under: action handlers plus the broadcast path."""
+    names = {handler.__name__ for handler, _, _ in ACTION_ROUTES.values()}
+    names.update(follow_up.__name__ for _, _, follow_ups in ACTION_ROUTES.values() for follow_up in follow_ups)
+    names.update(("dispatch_message", "start_session", "send_catch_up", "flush_broadcasts", "send_to_clients", "publish_dealer_odds",
+                  "publish_shoe_alerts", "save_state", "traced_deal_card", "read_from_serial"))
+    return names
+
+async def send_profile_status(files=None, handlers=None):
+    """Tells every dealer client whether a profile is running, and where the last one was written."""
+    message = {"action": "profile_status", "running": profile_session is not None}
+    if profile_session is not None:
+        message.update(mode=profile_session.mode, seconds=profile_session.seconds)
+    if files is not None:
+        message.update(files=files, handlers=handlers)
+    dealers = [ws for ws in dealer_clients if ws in connected_clients]
+    await asyncio.gather(*[send_to_client(ws, message) for ws in dealers])
+
+async def start_profile(mode=None, seconds=None, memory=None):
+    """Starts a bounded profiling window; it stops by itself after seconds."""
+    global profile_session, profile_timer
+    if profile_session is not None:
+        raise ValueError(f"a {profile_session.mode} profile is already running")
+    session = profiling.ProfileSession(
+        mode or "sampling", seconds or PROFILE_DEFAULT_SECONDS, PROFILE_DIR,
+        memory=memory if memory is not None else True, source=__file__, handlers=profiled_handlers(),
+    )
+    session.start()
+    profile_session = session
+    profile_timer = asyncio.get_running_loop().call_later(session.seconds, lambda: asyncio.create_task(stop_profile()))
+    log.warning("Profiling started: %s for up to %ss", session.mode, session.seconds)
+    await send_profile_status()
+
+async def stop_profile():
+    """Stops the running profile and writes its results to PROFILE_DIR."""
+    global profile_session, profile_timer
+    session = profile_session
+    if session is None:
+        await send_profile_status()
+        return
+    profile_session = None
+    profile_timer.cancel()
+    profile_timer = None
+    session.finish()
+    try:
+        files = await asyncio.to_thread(session.write)
+        with open(files[-1]) as f:
+            handlers = json.load(f).get("handlers")
+    except OSError as e:
+        log.error("Could not write profile results to %s: %s", PROFILE_DIR, e)
+        await send_profile_status()
+        return
+    log.warning("Profiling stopped after %.1fs; results in %s", session.elapsed, ", ".join(files))
+    await send_profile_status(files, handlers)
+
+def admin_allowed(websocket):
+    """Admin actions need the dealer role and a connection from this machine or config.admin_addresses.
+
+    The role is only what the client asked for, so the address is what the server checks.
+    """
+    address = websocket.remote_address[0] if websocket.remote_address else None
+    return websocket in dealer_clients and (address in LOOPBACK or address in config.admin_addresses)
+
+# Admin actions: dealer clients on an allowed address only, run directly rather than through the command queue
+ADMIN_ROUTES = {
+    "start_profile": (start_profile, compile_validator([
+        field("mode", str, required=False, check=lambda m: m in profiling.MODES),
+        field("seconds", NUMBER, required=False, check=lambda s: 0 < s <= profiling.MAX_SECONDS),
+        field("memory", bool, required=False),
+    ])),
+    "stop_profile": (stop_profile, compile_validator([])),
+}
+
+async def send_error(websocket, message):
+    """Sends an error frame to a single client without affecting the others."""
+    try:
+        await websocket.send(json.dumps({"action": "error", "message": message}))
+    except websockets.ConnectionClosed:
+        pass
+
+async def dispatch_message(websocket, message):
+    """Validates one incoming message and routes it to its handler via the command queue.
+
+    Malformed or unknown messages are answered with an error frame to the sender
+    only; the connection stays open.
+    """
+    try:
+        data = json.loads(message)
+    except (TypeError, ValueError):
+        record_action_stat("<invalid>")
+        await send_error(websocket, "Malformed message")
+        return
+    action = data.get("action") if isinstance(data, dict) else None
+    if action == "heartbeat":
+        return  # The answer to a heartbeat; handle_connection has already noted the client is alive
+    if action == "action_stats":
+        await websocket.send(json.dumps({"action": "action_stats", "stats": action_stats}))
+        return
+    if action == "trace_ack":
+        # A traced card reached this client's screen; not a game action, so not queued
+        role = client_views.get(websocket) or ("dealer" if websocket in dealer_clients else "stats")
+        tracer.ack(data.get("trace"), role, time.perf_counter())
+        return
+    admin = ADMIN_ROUTES.get(action)
+    if admin is not None:
+        handler, validate = admin
+        try:
+            if not admin_allowed(websocket):
+                raise ValueError("dealer console on an admin address only")
+            await handler(*validate(data))
+        except ValueError as e:
+            record_action_stat(action)
+            await send_error(websocket, f"{action}: {e}")
+        except Exception as e:
+            # e.g. tracemalloc or the profile directory failing; the dealer's connection stays up
+            log.exception("Admin action %s failed: %s", action, e)
+            await send_error(websocket, f"{action} failed: {e}")
+        return
+    route = ACTION_ROUTES.get(action)
+    if route is None:
+        record_action_stat("<unknown>")
+        await send_error(websocket, f"Unknown action: {action}")
+        return
+    handler, validate, follow_ups = route
+    try:
+        args = validate(data)
+        action_id = action_id_of(data)
+    except ValueError as e:
+        record_action_stat(action)
+        await send_error(websocket, f"{action}: {e}")
+        return
+    duplicate = duplicate_of(action, action_id)
+    if duplicate is not None:
+        await send_ignored(websocket, action, action_id, duplicate)
+        return
+    clients_log.debug("Received: %s", data)
+    start = time.perf_counter()
+    try:
+        guard = PHASE_GUARDS.get(action)
+        if guard is not None:
+            ignored = await submit_command(run_guarded, guard, action, handler, *args)
+            if ignored is not None:
+                await send_ignored(websocket, action, action_id, ignored)
+                return
+        else:
+            accept_action(action)
+            await submit_command(handler, *args)
+        for follow_up in follow_ups:
+            await submit_command(follow_up)
+    except Exception:
+        # Already logged by the command processor
+        await send_error(websocket, f"{action} failed")
+    elapsed = time.perf_counter() - start
+    record_action_stat(action, elapsed * 1000)
+    ACTION_SECONDS.observe(elapsed, action)
+
+async def main_turbo(rounds, seconds, players):
+    """Runs turbo rounds headless, without serving clients or opening the shoe reader."""
+    command_task = asyncio.create_task(process_commands())
+    for i in range(1, players + 1):
+        await submit_command(handle_add_player, f"player{i}")
+    report = await run_turbo(rounds, seconds)
+    command_task.cancel()
+    print(json.dumps(report))
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Mini Flush game server")
+    parser.add_argument("--port", type=int, default=6789, help="websocket port")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="localhost port for GET /metrics; 0 turns it off")
+    parser.add_argument("--snapshot-port", type=int, default=SNAPSHOT_PORT, help="port for GET /snapshot and /rounds; 0 turns it off")
+    parser.add_argument("--trace-file", help="append sampled card traces to this file (see tracing.py)")
+    parser.add_argument("--trace-sample", type=float, default=0.1, help="share of shoe reader cards to trace")
+    parser.add_argument("--log-level", default="INFO", help="level for everything not listed in --log-levels")
+    parser.add_argument("--log-levels", help="per-logger levels, e.g. deal=DEBUG,serial=INFO (deal, serial and state default to WARNING)")
+    parser.add_argument("--log-file", help="also write JSON lines to this file, rotated by size")
+    parser.add_argument("--log-max-mb", type=float, default=10, help="size at which --log-file is rotated")
+    parser.add_argument("--log-backups", type=int, default=5, help="rotated log files kept")
+    parser.add_argument("--memory-db", action="store_true", help="record wins in memory instead of MongoDB (load testing)")
+    parser.add_argument("--turbo", action="store_true", help="run automatic rounds back to back headless (soak test)")
+    parser.add_argument("--rounds", type=int, help="turbo: stop after this many rounds")
+    parser.add_argument("--seconds", type=float, help="turbo: stop after this many seconds")
+    parser.add_argument("--players", type=int, default=6, help="turbo: number of active seats")
+    args = parser.parse_args()
+    try:
+        log_levels = log_config.parse_levels(args.log_levels)
+    except ValueError as e:
+        parser.error(f"--log-levels: {e}")
+    log_listener = log_config.configure(
+        args.log_level, log_levels, args.log_file,
+        max_bytes=int(args.log_max_mb * 1024 * 1024), backup_count=args.log_backups,
+    )
+    try:
+        if args.turbo:
+            asyncio.run(main_turbo(args.rounds, args.seconds, args.players))
+        else:
+            asyncio.run(main(args.port, args.memory_db, args.metrics_port, args.trace_file, args.trace_sample, args.snapshot_port))
+    finally:
+        log_listener.stop()  # Writes out whatever is still queued
\ No newline at end of file
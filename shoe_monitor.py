@@ -0,0 +1,155 @@
+"""Streaming integrity checks on the cards coming out of the shoe.
+
+server.py feeds every card read (shoe reader or dealer console) to
+ShoeMonitor.observe(), which answers in constant time with the anomalies that
+card reveals:
+
+    reader_stutter    the same card read again within stutter_seconds - most
+                      likely a double read rather than a second physical card
+    impossible_count  more copies of a card, or more cards in total, than the
+                      configured number of decks holds since the last shuffle
+    over_represented  a card or rank turning up in the recent window far more
+                      often than a shuffled shoe plausibly allows
+    repeat_sequence   a run of sequence_length cards that already came out in
+                      the same order earlier - a stacked shoe or replayed input
+
+Each check keeps a small counter or index that is updated incrementally as
+cards enter and leave the sliding window, so observe() never scans history.
+"""
+from collections import deque
+from math import comb
+
+DECK_SIZE = 52
+
+
+def window_limit(window, copies, decks, probability):
+    """Smallest count of one card (or rank) in a window of draws that a fresh shuffle reaches with < probability.
+
+    Hypergeometric tail: window cards drawn from decks * 52, of which copies match.
+    """
+    shoe = DECK_SIZE * decks
+    window = min(window, shoe)
+    total = comb(shoe, window)
+    tail = 1.0
+    for k in range(0, min(copies, window) + 1):
+        if tail < probability:
+            return k
+        tail -= comb(copies, k) * comb(shoe - copies, window - k) / total
+    return min(copies, window) + 1
+
+
+class ShoeMonitor:
+    """Per-card anomaly detector over the current shoe and a sliding window of recent reads."""
+
+    def __init__(self, decks=1, window=52, sequence_length=5, sequence_history=2048,
+                 stutter_seconds=0.5, alert_probability=1e-5):
+        self.window = window
+        self.sequence_length = sequence_length
+        self.sequence_history = sequence_history
+        self.stutter_seconds = stutter_seconds
+        self.alert_probability = alert_probability
+        self.set_decks(decks)
+        self.reads = 0  # Cards accepted over the monitor's lifetime; positions in the sequence index
+        self.last_card = None
+        self.last_read_at = None
+        # Repeat-sequence index, kept across shuffles: run of cards -> position it last ended at
+        self.recent_run = deque(maxlen=sequence_length)
+        self.run_index = {}
+        self.run_history = deque()  # (position, run) in read order, for eviction
+        self.repeat_offset = None  # Distance to the earlier copy while a repeated run is being extended
+        self.new_shoe()
+
+    def set_decks(self, decks):
+        """Counts against a shoe of this many decks from now on, e.g. after a config change."""
+        self.decks = decks
+        # Counts at or above these in the window are flagged as over-represented
+        self.card_limit = window_limit(self.window, decks, decks, self.alert_probability)
+        self.rank_limit = window_limit(self.window, 4 * decks, decks, self.alert_probability)
+
+    def new_shoe(self):
+        """Starts counting a freshly shuffled shoe; the repeat-sequence index is kept."""
+        self.shoe_cards = 0
+        self.shoe_counts = {}
+        self.recent = deque()
+        self.recent_cards = {}
+        self.recent_ranks = {}
+
+    def snapshot(self):
+        """What rewind() needs to forget the reads after this point."""
+        return (self.reads, self.last_card, self.last_read_at, self.repeat_offset, tuple(self.recent_run),
+                self.shoe_cards, dict(self.shoe_counts), tuple(self.recent))
+
+    def rewind(self, snapshot):
+        """Returns to a snapshot(), e.g. when the dealer undoes the cards read since.
+
+        Runs indexed since the snapshot are dropped too, so reading the same
+        cards again is not reported as a repeated sequence.
+        """
+        (reads, self.last_card, self.last_read_at, self.repeat_offset, recent_run,
+         self.shoe_cards, self.shoe_counts, recent) = snapshot
+        while self.run_history and self.run_history[-1][0] > reads:
+            position, run = self.run_history.pop()
+            if self.run_index.get(run) == position:
+                del self.run_index[run]
+        self.reads = reads
+        self.recent_run = deque(recent_run, maxlen=self.sequence_length)
+        self.recent = deque(recent)
+        self.recent_cards = {}
+        self.recent_ranks = {}
+        for card in recent:
+            self.recent_cards[card] = self.recent_cards.get(card, 0) + 1
+            self.recent_ranks[card[0]] = self.recent_ranks.get(card[0], 0) + 1
+
+    def observe(self, card, now):
+        """Records one card read at monotonic time now; returns [(kind, message), ...]."""
+        if card == self.last_card and now - self.last_read_at < self.stutter_seconds:
+            self.last_read_at = now
+            return [("reader_stutter", f"{card} read twice within {self.stutter_seconds:g}s; likely a double read")]
+        self.last_card = card
+        self.last_read_at = now
+        self.reads += 1
+        alerts = []
+
+        # Composition of the shoe since the last shuffle
+        self.shoe_cards += 1
+        count = self.shoe_counts.get(card, 0) + 1
+        self.shoe_counts[card] = count
+        impossible = count > self.decks
+        if impossible:
+            alerts.append(("impossible_count", f"{card} seen {count} times; a {self.decks}-deck shoe holds {self.decks}"))
+        if self.shoe_cards == DECK_SIZE * self.decks + 1:
+            alerts.append(("impossible_count", f"more than {DECK_SIZE * self.decks} cards read since the last shuffle"))
+
+        # Sliding window of the most recent reads
+        rank = card[0]
+        self.recent.append(card)
+        card_count = self.recent_cards.get(card, 0) + 1
+        self.recent_cards[card] = card_count
+        rank_count = self.recent_ranks.get(rank, 0) + 1
+        self.recent_ranks[rank] = rank_count
+        if len(self.recent) > self.window:
+            old = self.recent.popleft()
+            self.recent_cards[old] -= 1
+            self.recent_ranks[old[0]] -= 1
+        if not impossible:
+            if card_count == self.card_limit:
+                alerts.append(("over_represented", f"{card} {card_count} times in the last {len(self.recent)} cards"))
+            elif rank_count == self.rank_limit:
+                alerts.append(("over_represented", f"rank {rank} {rank_count} times in the last {len(self.recent)} cards"))
+
+        # Runs of cards repeating in the same order
+        self.recent_run.append(card)
+        if len(self.recent_run) == self.sequence_length:
+            run = tuple(self.recent_run)
+            earlier = self.run_index.get(run)
+            offset = self.reads - earlier if earlier is not None else None
+            if offset is not None and offset != self.repeat_offset:
+                alerts.append(("repeat_sequence", f"{' '.join(run)} already came out in this order {offset} cards ago"))
+            self.repeat_offset = offset
+            self.run_index[run] = self.reads
+            self.run_history.append((self.reads, run))
+            if len(self.run_history) > self.sequence_history:
+                position, old_run = self.run_history.popleft()
+                if self.run_index.get(old_run) == position:
+                    del self.run_index[old_run]
+        return alerts
@@ -7,10 +7,34 @@ import CardSelector from '@/components/CardSelector';
 import Notification from '@/components/Notification';
 import ControlPanelPopup from '@/components/ControlPanelPopup';
 import Navbar from '@/components/Header';
-import { IP } from "@/ip";
+
+// Live odds from server.py's dealer_odds frames (sent to the dealer view only)
+interface DealerOdds {
+  dealer_cards: number;
+  cards_remaining: number;
+  hands: number;
+  qualify_probability: number | null;
+  combinations: { [combination: string]: number };
+}
+
+// Anomalies server.py's shoe monitor found in the cards read (shoe_alert frames)
+interface ShoeAlert {
+  kind: string;
+  card: string;
+  message: string;
+  timestamp: string;
+}
+
+// Live profiling of server.py (profile_status frames, dealer clients only)
+interface ProfileStatus {
+  running: boolean;
+  mode?: string;
+  seconds?: number;
+  files?: string[];
+}
 
 export default function DealerView() {
-  const { gameState, sendMessage, isConnected, notifications, removeNotification } = useWebSocket();
+  const { gameState, sendMessage, isConnected, notifications, removeNotification, registerActionHandler, unregisterActionHandler } = useWebSocket();
   const [isManualMode, setIsManualMode] = useState(false);
   const [selectedPlayer, setSelectedPlayer] = useState<string | null>(null);
   const [lastUndoneAction, setLastUndoneAction] = useState<string | null>(null);
@@ -21,6 +45,9 @@ export default function DealerView() {
   const [nextPlayerToDeal, setNextPlayerToDeal] = useState<string | null>(null);
   const [showCardDealingBox, setShowCardDealingBox] = useState(true);
   const [isControlPanelOpen, setIsControlPanelOpen] = useState(false);
+  const [dealerOdds, setDealerOdds] = useState<DealerOdds | null>(null);
+  const [shoeAlerts, setShoeAlerts] = useState<ShoeAlert[]>([]);
+  const [profileStatus, setProfileStatus] = useState<ProfileStatus>({ running: false });
 
   // Count active players and check if all have acted
   const activePlayers = Object.entries(gameState.players)
@@ -177,23 +204,36 @@ export default function DealerView() {
     }
   };
 
-  // Handle WebSocket messages
+  // Show server errors from the shared connection
   useEffect(() => {
-    const handleMessage = (event: MessageEvent) => {
-      try {
-        const data = JSON.parse(event.data);
-        if (data.action === 'error') {
-          setErrorMessage(data.message);
-        }
-      } catch (error) {
-        console.error('Error processing message:', error);
-      }
-    };
+    if (!registerActionHandler || !unregisterActionHandler) return;
+    const handler = (data: any) => setErrorMessage(data.message);
+    registerActionHandler('error', handler);
+    return () => unregisterActionHandler('error', handler);
+  }, [registerActionHandler, unregisterActionHandler]);
 
-    const ws = new WebSocket(`ws://${IP}:6789`);
-    ws.addEventListener('message', handleMessage);
-    return () => ws.removeEventListener('message', handleMessage);
-  }, []);
+  useEffect(() => {
+    if (!registerActionHandler || !unregisterActionHandler) return;
+    const handler = (data: any) => setDealerOdds(data);
+    registerActionHandler('dealer_odds', handler);
+    return () => unregisterActionHandler('dealer_odds', handler);
+  }, [registerActionHandler, unregisterActionHandler]);
+
+  useEffect(() => {
+    if (!registerActionHandler || !unregisterActionHandler) return;
+    // Keep the five most recent alerts, newest first
+    const handler = (data: any) => setShoeAlerts(prev => [...data.alerts.reverse(), ...prev].slice(0, 5));
+    registerActionHandler('shoe_alert', handler);
+    return () => unregisterActionHandler('shoe_alert', handler);
+  }, [registerActionHandler, unregisterActionHandler]);
+
+  useEffect(() => {
+    if (!registerActionHandler || !unregisterActionHandler) return;
+    // Keep the last files written while a new profile runs
+    const handler = (data: any) => setProfileStatus(prev => ({ ...data, files: data.files ?? prev.files }));
+    registerActionHandler('profile_status', handler);
+    return () => unregisterActionHandler('profile_status', handler);
+  }, [registerActionHandler, unregisterActionHandler]);
 
   useEffect(() => {
     // Only show dealer cards when the game phase is 'revealed'
@@ -425,7 +465,21 @@ export default function DealerView() {
             >
               Clear All Records
             </button>
+            <button
+              onClick={() => sendMessage(profileStatus.running ? { action: 'stop_profile' } : { action: 'start_profile', mode: 'sampling', seconds: 30 })}
+              className={`px-4 py-2 bg-gray-600 text-white rounded hover:bg-gray-700 transition-colors duration-200 ${!isConnected && 'opacity-50 cursor-not-allowed'}`}
+              disabled={!isConnected}
+            >
+              {profileStatus.running ? 'Stop Profiling' : 'Profile Server (30s)'}
+            </button>
           </div>
+          {(profileStatus.running || profileStatus.files) && (
+            <div className="mt-2 p-2 bg-gray-100 text-gray-800 rounded text-sm">
+              {profileStatus.running
+                ? `Profiling (${profileStatus.mode}) for up to ${profileStatus.seconds}s...`
+                : `Profile written: ${profileStatus.files?.map(f => f.split(/[\\/]/).pop()).join(', ')}`}
+            </div>
+          )}
           {lastUndoneAction && (
             <div className="mt-4 p-2 bg-blue-100 text-blue-800 rounded text-sm">
               {lastUndoneAction}...
@@ -488,6 +542,42 @@ export default function DealerView() {
                 <span className="text-xl font-bold">New Game</span>
               </button>
             </div>
+
+            {/* Live dealer odds */}
+            {dealerOdds && dealerOdds.qualify_probability !== null && (
+              <div className="rounded-lg shadow bg-white text-[#741003] px-4 py-2" style={{ minWidth: 220 }}>
+                <div className="text-lg font-bold">
+                  Dealer qualifies: {(dealerOdds.qualify_probability * 100).toFixed(1)}%
+                </div>
+                <div className="text-xs mb-1">
+                  {dealerOdds.dealer_cards}/3 dealer cards, {dealerOdds.cards_remaining} left in shoe
+                </div>
+                {Object.entries(dealerOdds.combinations)
+                  .sort(([, a], [, b]) => b - a)
+                  .slice(0, 5)
+                  .map(([combination, probability]) => (
+                    <div key={combination} className="flex justify-between text-sm gap-4">
+                      <span>{combination.replace(/_/g, ' ')}</span>
+                      <span>{(probability * 100).toFixed(1)}%</span>
+                    </div>
+                  ))}
+              </div>
+            )}
+
+            {/* Shoe integrity alerts */}
+            {shoeAlerts.length > 0 && (
+              <div className="rounded-lg shadow bg-yellow-100 text-[#741003] px-4 py-2" style={{ minWidth: 220, maxWidth: 360 }}>
+                <div className="flex justify-between items-center">
+                  <span className="text-lg font-bold">Shoe alerts</span>
+                  <button className="text-sm underline" onClick={() => setShoeAlerts([])}>Dismiss</button>
+                </div>
+                {shoeAlerts.map((alert, i) => (
+                  <div key={`${alert.timestamp}-${i}`} className="text-sm">
+                    <span className="font-semibold">{alert.kind.replace(/_/g, ' ')}:</span> {alert.message}
+                  </div>
+                ))}
+              </div>
+            )}
           </div>
 
           {/* Player Hands */}
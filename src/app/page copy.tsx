@@ -7,7 +7,7 @@ import CardSelector from '@/components/CardSelector';
 import Notification from '@/components/Notification';
 
 export default function DealerView() {
-  const { gameState, sendMessage, isConnected, notifications, removeNotification } = useWebSocket();
+  const { gameState, sendMessage, isConnected, notifications, removeNotification, registerActionHandler, unregisterActionHandler } = useWebSocket();
   const [isManualMode, setIsManualMode] = useState(false);
   const [selectedPlayer, setSelectedPlayer] = useState<string | null>(null);
   const [lastUndoneAction, setLastUndoneAction] = useState<string | null>(null);
@@ -165,21 +165,11 @@ export default function DealerView() {
 
   // Handle WebSocket messages
   useEffect(() => {
-    const handleMessage = (event: MessageEvent) => {
-      try {
-        const data = JSON.parse(event.data);
-        if (data.action === 'error') {
-          setErrorMessage(data.message);
-        }
-      } catch (error) {
-        console.error('Error processing message:', error);
-      }
-    };
-
-    const ws = new WebSocket('ws://localhost:6789');
-    ws.addEventListener('message', handleMessage);
-    return () => ws.removeEventListener('message', handleMessage);
-  }, []);
+    if (!registerActionHandler || !unregisterActionHandler) return;
+    const handler = (data: any) => setErrorMessage(data.message);
+    registerActionHandler('error', handler);
+    return () => unregisterActionHandler('error', handler);
+  }, [registerActionHandler, unregisterActionHandler]);
 
   useEffect(() => {
     // Only show dealer cards when the game phase is 'revealed'
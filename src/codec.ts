@@ -0,0 +1,102 @@
+// Wire codec negotiated with server.py at connect time.
+// 'json' sends plain text frames; 'msgpack' asks for compact binary frames
+// where cards and enum strings are integer coded. A display opts in with
+// ?codec=msgpack in its page URL.
+export type WsCodec = 'json' | 'msgpack';
+
+export function connectionCodec(): WsCodec {
+  return new URLSearchParams(window.location.search).get('codec') === 'msgpack' ? 'msgpack' : 'json';
+}
+
+export interface CodecTables {
+  cards: string[];
+  enums: string[];
+  card_fields: string[];
+  card_list_fields: string[];
+  enum_fields: string[];
+}
+
+// Minimal MessagePack decoder covering the types server.py emits
+export function decodeMsgpack(buffer: ArrayBuffer): any {
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  const textDecoder = new TextDecoder();
+  let offset = 0;
+
+  const readString = (length: number) => {
+    const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+    offset += length;
+    return value;
+  };
+  const readArray = (length: number) => {
+    const value = new Array(length);
+    for (let i = 0; i < length; i++) value[i] = read();
+    return value;
+  };
+  const readMap = (length: number) => {
+    const value: { [key: string]: any } = {};
+    for (let i = 0; i < length; i++) {
+      const key = read();
+      value[key] = read();
+    }
+    return value;
+  };
+
+  const read = (): any => {
+    const type = bytes[offset++];
+    if (type <= 0x7f) return type;
+    if (type <= 0x8f) return readMap(type & 0x0f);
+    if (type <= 0x9f) return readArray(type & 0x0f);
+    if (type <= 0xbf) return readString(type & 0x1f);
+    if (type >= 0xe0) return type - 0x100;
+    let value: any;
+    switch (type) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: { const n = bytes[offset]; offset += 1; value = bytes.slice(offset, offset + n); offset += n; return value; }
+      case 0xc5: { const n = view.getUint16(offset); offset += 2; value = bytes.slice(offset, offset + n); offset += n; return value; }
+      case 0xc6: { const n = view.getUint32(offset); offset += 4; value = bytes.slice(offset, offset + n); offset += n; return value; }
+      case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+      case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+      case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+      case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+      case 0xce: value = view.getUint32(offset); offset += 4; return value;
+      case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+      case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+      case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+      case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+      case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+      case 0xd9: { const n = view.getUint8(offset); offset += 1; return readString(n); }
+      case 0xda: { const n = view.getUint16(offset); offset += 2; return readString(n); }
+      case 0xdb: { const n = view.getUint32(offset); offset += 4; return readString(n); }
+      case 0xdc: { const n = view.getUint16(offset); offset += 2; return readArray(n); }
+      case 0xdd: { const n = view.getUint32(offset); offset += 4; return readArray(n); }
+      case 0xde: { const n = view.getUint16(offset); offset += 2; return readMap(n); }
+      case 0xdf: { const n = view.getUint32(offset); offset += 4; return readMap(n); }
+      default:
+        throw new Error(`Unsupported msgpack type 0x${type.toString(16)}`);
+    }
+  };
+
+  return read();
+}
+
+// Replaces integer-coded cards and enums with their string values
+export function expandCompact(value: any, tables: CodecTables): any {
+  if (Array.isArray(value)) return value.map(item => expandCompact(item, tables));
+  if (value === null || typeof value !== 'object') return value;
+  const out: { [key: string]: any } = {};
+  for (const [key, item] of Object.entries(value)) {
+    if (tables.card_list_fields.includes(key) && Array.isArray(item)) {
+      out[key] = item.map(card => (typeof card === 'number' ? tables.cards[card] : card));
+    } else if (tables.card_fields.includes(key) && typeof item === 'number') {
+      out[key] = tables.cards[item];
+    } else if (tables.enum_fields.includes(key) && typeof item === 'number') {
+      out[key] = tables.enums[item];
+    } else {
+      out[key] = expandCompact(item, tables);
+    }
+  }
+  return out;
+}
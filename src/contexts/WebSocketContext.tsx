@@ -2,7 +2,8 @@
 
 import React, { createContext, useContext, useEffect, useState } from 'react';
 import { NotificationType } from '@/components/Notification';
-import { IP } from '@/ip';
+import { IP, RELAY } from '@/ip';
+import { connectionCodec, CodecTables, decodeMsgpack, expandCompact } from '@/codec';
 
 interface Notification {
   id: string;
@@ -37,6 +38,12 @@ interface GameState {
   games_played?: number;
 }
 
+interface DealTimeline {
+  cards: { target: string; card?: string; offset_ms: number }[];
+  startedAt: number;
+  timers: NodeJS.Timeout[];
+}
+
 interface WebSocketContextType {
   ws: WebSocket | null;
   gameState: GameState;
@@ -85,6 +92,22 @@ export function safeMaxBet(max_bet: any) {
   return max_bet;
 }
 
+let actionCounter = 0;
+const actionPrefix = Math.random().toString(36).slice(2, 10);
+
+function nextActionId(): string {
+  actionCounter += 1;
+  return `${actionPrefix}-${actionCounter}`;
+}
+
+// Subscription role for this screen: player tablets only receive their own seat in full
+function connectionRole(): string {
+  const segment = window.location.pathname.split('/').filter(Boolean).pop() || '';
+  if (/^player[1-6]$/.test(segment)) return segment;
+  if (segment === 'dealer') return 'dealer';
+  return 'stats';
+}
+
 export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
   const [ws, setWs] = useState<WebSocket | null>(null);
   const [gameState, setGameState] = useState<GameState>(defaultGameState);
@@ -92,6 +115,10 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
   const [notifications, setNotifications] = useState<Notification[]>([]);
   const [previousGameState, setPreviousGameState] = useState<GameState | null>(null);
   const actionHandlers = React.useRef<{ [action: string]: Set<(data: any) => void> }>({});
+  const codecTables = React.useRef<CodecTables | null>(null);
+  const dealTimeline = React.useRef<DealTimeline | null>(null);
+  // Resume point for reconnects: the server epoch and the last numbered frame seen
+  const session = React.useRef<{ epoch: string; seq: number } | null>(null);
 
   const addNotification = (message: string, type: NotificationType) => {
     const id = Math.random().toString(36).substr(2, 9);
@@ -111,6 +138,45 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     actionHandlers.current[action]?.delete(handler);
   };
 
+  // While an automatic deal is playing, hands only show the cards whose time has come
+  const maskDealtHands = (state: GameState): GameState => {
+    const timeline = dealTimeline.current;
+    if (!timeline) return state;
+    const elapsed = Date.now() - timeline.startedAt;
+    const shown: { [target: string]: string[] } = {};
+    for (const entry of timeline.cards) {
+      if (entry.card === undefined) continue;
+      if (!shown[entry.target]) shown[entry.target] = [];
+      if (entry.offset_ms <= elapsed) shown[entry.target].push(entry.card);
+    }
+    const players = { ...state.players };
+    for (const [target, hand] of Object.entries(shown)) {
+      if (target !== 'dealer' && players[target]) players[target] = { ...players[target], hand };
+    }
+    return { ...state, dealer_hand: shown.dealer ?? state.dealer_hand, players };
+  };
+
+  const stopDealTimeline = () => {
+    dealTimeline.current?.timers.forEach(clearTimeout);
+    dealTimeline.current = null;
+  };
+
+  // Plays a deal_timeline locally, seeking to elapsed_ms for clients that join mid-deal
+  const playDealTimeline = (data: any) => {
+    stopDealTimeline();
+    const timeline: DealTimeline = { cards: data.cards, startedAt: Date.now() - data.elapsed_ms, timers: [] };
+    dealTimeline.current = timeline;
+    const refresh = () => setGameState(prev => maskDealtHands(prev));
+    for (const entry of timeline.cards) {
+      const delay = entry.offset_ms - data.elapsed_ms;
+      if (delay > 0) timeline.timers.push(setTimeout(refresh, delay));
+    }
+    const duration = timeline.cards.length ? timeline.cards[timeline.cards.length - 1].offset_ms : 0;
+    timeline.timers.push(setTimeout(() => {
+      if (dealTimeline.current === timeline) dealTimeline.current = null;
+    }, Math.max(0, duration - data.elapsed_ms) + 1));
+  };
+
   const determineUndoneAction = (oldState: GameState, newState: GameState): string => {
     // Check if it was a reveal hands action
     if (oldState.game_phase === 'revealed' && newState.game_phase !== 'revealed') {
@@ -127,7 +193,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     // Check if it was a player action (play/surrender)
     for (const [playerId, oldPlayer] of Object.entries(oldState.players)) {
       const newPlayer = newState.players[playerId];
-      if (oldPlayer.has_acted && !newPlayer.has_acted) {
+      if (oldPlayer.has_acted && !newPlayer?.has_acted) {
         return `${playerId}'s ${oldPlayer.action_type || 'action'}`;
       }
     }
@@ -135,7 +201,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     // Check if it was a card addition
     for (const [playerId, oldPlayer] of Object.entries(oldState.players)) {
       const newPlayer = newState.players[playerId];
-      if (oldPlayer.hand.length > newPlayer.hand.length) {
+      if ((oldPlayer.hand?.length ?? 0) > (newPlayer?.hand?.length ?? 0)) {
         return `Card addition to ${playerId}`;
       }
     }
@@ -146,10 +212,10 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     // Check if it was a player add/remove
     for (const [playerId, oldPlayer] of Object.entries(oldState.players)) {
       const newPlayer = newState.players[playerId];
-      if (oldPlayer.active && !newPlayer.active) {
+      if (oldPlayer.active && !newPlayer?.active) {
         return `Player ${playerId} removal`;
       }
-      if (!oldPlayer.active && newPlayer.active) {
+      if (!oldPlayer.active && newPlayer?.active) {
         return `Player ${playerId} addition`;
       }
     }
@@ -163,7 +229,13 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     let reconnectTimeout: NodeJS.Timeout;
 
     const connect = () => {
-      websocket = new WebSocket(`ws://${IP}:6789`);
+      const role = connectionRole();
+      const params = new URLSearchParams({ role });
+      if (connectionCodec() === 'msgpack') params.set('codec', 'msgpack');
+      if (session.current) params.set('resume', `${session.current.epoch}.${session.current.seq}`);
+      const host = role === 'stats' && RELAY ? RELAY : `${IP}:6789`;
+      websocket = new WebSocket(`ws://${host}/?${params}`);
+      websocket.binaryType = 'arraybuffer';
 
       websocket.onopen = () => {
         console.log('Connected to WebSocket');
@@ -193,20 +265,60 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
 
       websocket.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          let data;
+          if (event.data instanceof ArrayBuffer) {
+            data = decodeMsgpack(event.data);
+            if (data.action === 'codec_tables') {
+              codecTables.current = data;
+              return;
+            }
+            if (codecTables.current) data = expandCompact(data, codecTables.current);
+          } else {
+            data = JSON.parse(event.data);
+          }
           
+          if (data.action === 'session') {
+            session.current = { epoch: data.epoch, seq: data.seq };
+            return;
+          }
+          if (data.action === 'heartbeat') {
+            // Answer so the server knows this screen is still alive and keeps it in the broadcast set
+            websocket.send(JSON.stringify({ action: 'heartbeat' }));
+            return;
+          }
+          if (typeof data.seq === 'number' && session.current && data.seq > session.current.seq) {
+            session.current.seq = data.seq;
+          }
+
           // Custom action handlers
           if (data.action && actionHandlers.current[data.action]) {
             actionHandlers.current[data.action].forEach(fn => fn(data));
           }
+          if (['cards_dealt', 'hands_revealed', 'table_reset', 'undo_completed'].includes(data.action)) {
+            stopDealTimeline();
+          }
+          // A traced card (server --trace-file): acknowledge once it has been painted
+          if (typeof data.trace === 'string') {
+            const trace = data.trace;
+            requestAnimationFrame(() => requestAnimationFrame(() => {
+              if (websocket.readyState === WebSocket.OPEN) {
+                websocket.send(JSON.stringify({ action: 'trace_ack', trace }));
+              }
+            }));
+          }
           switch (data.action) {
+            case 'deal_timeline':
+              playDealTimeline(data);
+              setPreviousGameState(gameState);
+              setGameState(prev => maskDealtHands({ ...prev, ...data.game_state }));
+              break;
             case 'update_game':
             case 'cards_dealt':
             case 'hands_revealed':
             case 'player_acted':
             case 'card_added':
               setPreviousGameState(gameState);
-              setGameState(prev => ({
+              setGameState(prev => maskDealtHands({
                 ...prev,
                 ...data.game_state,
                 min_bet: data.game_state.min_bet !== undefined ? data.game_state.min_bet : prev.min_bet,
@@ -263,6 +375,10 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
             case 'error':
               addNotification(data.message, 'error');
               break;
+            case 'action_ignored':
+              // A double tap or re-sent action the server dropped; nothing changed
+              console.log(`Server ignored ${data.request}: ${data.reason}`);
+              break;
             case 'notification':
               addNotification(data.message, data.type || 'info');
               break;
@@ -281,6 +397,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     connect();
 
     return () => {
+      stopDealTimeline();
       if (websocket) {
         websocket.close();
       }
@@ -304,7 +421,9 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
     }
   }, [isConnected, messageQueue, ws]);
 
-  const sendMessage = (message: any) => {
+  const sendMessage = (action: any) => {
+    // A unique id per action, kept if it is queued and re-sent, so the server can drop duplicates
+    const message = action.id ? action : { ...action, id: nextActionId() };
     try {
       if (ws?.readyState === WebSocket.OPEN) {
         ws.send(JSON.stringify(message));
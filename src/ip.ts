@@ -1,4 +1,7 @@
 export const IP = "192.168.2.190"; //casino's ethernet
 // export const IP = "192.168.1.2"; //kk's laptop
 // export const IP = "192.168.31.60"; //pk's laptop
-// export const IP = "192.168.1.39"; //pk-office laptop
\ No newline at end of file
+// export const IP = "192.168.1.39"; //pk-office laptop
+
+// Display screens (role=stats) connect here instead when set, e.g. "192.168.2.190:6790" for relay.py
+export const RELAY: string | null = null;
@@ -0,0 +1,104 @@
+"""Offline stand-ins for the server's external dependencies.
+
+Used by the turbo soak mode, the benchmarks and the load generator so they can
+run on a single box without MongoDB or a shoe reader attached.
+"""
+import copy
+import itertools
+
+
+class InsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class MemoryCursor:
+    """The subset of a Motor cursor the server uses: sort, limit, async iteration, to_list."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        self.docs = sorted(self.docs, key=lambda doc: doc.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length] if length else list(self.docs)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class MemoryCollection:
+    """In-memory stand-in for the Motor collection used by server.py.
+
+    Documents are deep-copied on insert, as BSON encoding would. With keep set,
+    only the most recent documents are retained (the count stays exact) so long
+    soak runs do not measure the stand-in's own growth.
+    """
+
+    def __init__(self, keep=None):
+        self.docs = []
+        self.keep = keep
+        self.dropped = 0
+        self.ids = itertools.count(1)
+
+    async def insert_one(self, doc):
+        doc["_id"] = next(self.ids)
+        self.docs.append(copy.deepcopy(doc))
+        if self.keep is not None and len(self.docs) > self.keep:
+            del self.docs[0]
+            self.dropped += 1
+        return InsertResult(doc["_id"])
+
+    async def count_documents(self, query):
+        return len(self.docs) + self.dropped
+
+    async def find_one(self, query=None, sort=None):
+        docs = self.docs
+        if sort:
+            key, direction = sort[0]
+            docs = sorted(docs, key=lambda doc: doc.get(key), reverse=direction < 0)
+        return docs[0] if docs else None
+
+    def find(self, query=None):
+        return MemoryCursor(list(self.docs))
+
+    async def delete_one(self, query):
+        for i, doc in enumerate(self.docs):
+            if doc["_id"] == query.get("_id"):
+                del self.docs[i]
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def delete_many(self, query):
+        deleted = len(self.docs) + self.dropped
+        self.docs.clear()
+        self.dropped = 0
+        return DeleteResult(deleted)
+
+
+class MemoryWebSocket:
+    """A connected client that accepts every frame and only counts what it was sent."""
+
+    def __init__(self, number=0):
+        self.remote_address = ("127.0.0.1", 50000 + number)
+        self.frames = 0
+        self.bytes = 0
+
+    async def send(self, payload):
+        self.frames += 1
+        self.bytes += len(payload)
@@ -0,0 +1,80 @@
+"""Measures how long server.py takes from launch to its first accepted websocket connection.
+
+Starts the server as a fresh process several times (so imports are paid for
+each run, as the packaged run_script launch pays them), connects as soon as
+the port answers and reports the times. MongoDB and the shoe reader need not
+be present; the server connects to them in the background.
+
+    python startup_bench.py                 # 5 runs on port 6799
+    python startup_bench.py --runs 20 --target-ms 300
+
+Exits 1 when the median run misses the target.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import websockets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+async def first_connection(port, process, timeout):
+    """Connects as soon as the server accepts; returns the time it took, or None if it never did.
+
+    The port is probed with plain TCP connects until it is open, which costs the
+    server far less CPU than repeated failed websocket handshakes would.
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=timeout).close()
+        except OSError:
+            await asyncio.sleep(0.005)
+            continue
+        async with websockets.connect(f"ws://127.0.0.1:{port}/?role=stats", open_timeout=timeout):
+            return time.perf_counter()
+    return None
+
+
+def run_once(port, timeout):
+    """Launches server.py and returns milliseconds to the first accepted connection."""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "server", "--port", str(port)],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        accepted = asyncio.run(first_connection(port, process, timeout))
+    finally:
+        process.kill()
+        process.wait()
+    return (accepted - started) * 1000 if accepted is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time server.py from launch to first accepted connection")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=6799)
+    parser.add_argument("--target-ms", type=float, default=300)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for each run")
+    args = parser.parse_args()
+    times = [run_once(args.port, args.timeout) for _ in range(args.runs)]
+    if None in times:
+        print(f"Server did not accept a connection within {args.timeout}s")
+        raise SystemExit(1)
+    report = {
+        "runs": args.runs,
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "max_ms": round(max(times), 1),
+        "target_ms": args.target_ms,
+    }
+    print(json.dumps(report))
+    raise SystemExit(0 if report["median_ms"] <= args.target_ms else 1)
@@ -0,0 +1,169 @@
+"""Table configuration for server.py: paytables, hand rankings, bet limits and connections.
+
+The settings live in a JSON file (table_config.json next to server.py, or the
+path in MINIFLUSH_CONFIG) that carries a version number. load_config() checks
+every field and compiles the paytables into settlement tables, so settling a
+seat is one lookup per bet instead of a chain of comparisons. server.py polls
+the file and swaps a new version in between rounds; each recorded round is
+stamped with the version that settled it.
+
+Any key left out of the file takes its value from DEFAULT_CONFIG.
+"""
+import json
+import os
+
+# What evaluate_high_hand / evaluate_low_hand can return, weakest first. The
+# paytables must price exactly these; the wire codec tables are built from them.
+HIGH_COMBINATIONS = (
+    "high_card", "ten_top", "jack_top", "queen_top", "king_top", "ace_top",
+    "pair", "flush", "straight", "straight_flush", "three_of_a_kind",
+)
+LOW_COMBINATIONS = ("5_top", "6_top", "7_top", "8_top", "9_top", "10_top")
+
+DEFAULT_CONFIG = {
+    "version": 0,  # Built-in settings, used when there is no config file
+    # HIGH side bet payouts (typical casino payouts)
+    "high_payouts": {
+        "three_of_a_kind": 5, "straight_flush": 4, "straight": 3, "flush": 2, "pair": 1,
+        "ace_top": 0, "king_top": 0, "queen_top": 0, "jack_top": 0, "ten_top": 0, "high_card": 0,
+    },
+    # LOW side bet payouts; 0 is a push
+    "low_payouts": {"5_top": 5, "6_top": 4, "7_top": 3, "8_top": 2, "9_top": 1, "10_top": 0},
+    # Hand rankings for the MAIN bet (higher rank = better hand; equal ranks compare card values)
+    "high_hand_rankings": {
+        "high_card": 0, "ten_top": 0, "jack_top": 0, "queen_top": 0, "king_top": 0, "ace_top": 0,
+        "pair": 1, "flush": 2, "straight": 3, "straight_flush": 4, "three_of_a_kind": 5,
+    },
+    "max_history": 10,  # Undo steps kept
+    "serial_port": "COM1",  # Shoe reader
+    "shoe_decks": 1,  # Decks in the physical shoe, for the shoe monitor's counts
+    "mongo_uri": "mongodb://localhost:27017",  # or your Atlas URI
+    "min_bet": 10,
+    "max_bet": 1000,
+    "heartbeat_interval": 10,  # Seconds between heartbeats to each client
+    "heartbeat_timeout": 30,  # Clients silent this long are dropped; 0 never drops them
+    "max_clients": 512,  # Open websocket connections
+    "max_clients_per_ip": 16,  # Per address; loopback (relays, local tools) is exempt
+    "admin_addresses": [],  # Addresses besides loopback whose dealer clients may profile the server
+}
+
+
+class ConfigError(ValueError):
+    """The config file is unreadable or one of its settings is invalid."""
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_table(settings, key, combinations, check, expected):
+    table = settings[key]
+    if not isinstance(table, dict) or set(table) != set(combinations):
+        missing = sorted(set(combinations) - set(table)) if isinstance(table, dict) else combinations
+        extra = sorted(set(table) - set(combinations)) if isinstance(table, dict) else []
+        raise ConfigError(f"{key} must price exactly {', '.join(combinations)} (missing {missing}, unknown {extra})")
+    for combination, value in table.items():
+        if not check(value):
+            raise ConfigError(f"{key}.{combination} must be {expected}, got {value!r}")
+
+
+def validate(settings):
+    """Raises ConfigError unless settings (DEFAULT_CONFIG's keys) are all usable."""
+    version = settings["version"]
+    if not isinstance(version, int) or isinstance(version, bool) or version < 0:
+        raise ConfigError(f"version must be a whole number, got {version!r}")
+    check_table(settings, "high_payouts", HIGH_COMBINATIONS, lambda v: is_number(v) and v >= 0, "a number >= 0")
+    check_table(settings, "low_payouts", LOW_COMBINATIONS, lambda v: is_number(v) and v >= 0, "a number >= 0")
+    check_table(settings, "high_hand_rankings", HIGH_COMBINATIONS, lambda v: isinstance(v, int) and not isinstance(v, bool), "a whole number")
+    if not isinstance(settings["max_history"], int) or isinstance(settings["max_history"], bool) or settings["max_history"] < 1:
+        raise ConfigError(f"max_history must be a whole number >= 1, got {settings['max_history']!r}")
+    if not isinstance(settings["serial_port"], str) or not settings["serial_port"]:
+        raise ConfigError("serial_port must be a port name such as COM1 or /dev/ttyUSB0")
+    decks = settings["shoe_decks"]
+    if not isinstance(decks, int) or isinstance(decks, bool) or not 1 <= decks <= 8:
+        raise ConfigError(f"shoe_decks must be a whole number from 1 to 8, got {decks!r}")
+    if not isinstance(settings["mongo_uri"], str) or not settings["mongo_uri"].startswith(("mongodb://", "mongodb+srv://")):
+        raise ConfigError(f"mongo_uri must be a mongodb:// or mongodb+srv:// URI, got {settings['mongo_uri']!r}")
+    min_bet, max_bet = settings["min_bet"], settings["max_bet"]
+    if not is_number(min_bet) or not is_number(max_bet) or not 0 < min_bet <= max_bet:
+        raise ConfigError(f"bet limits must be numbers with 0 < min_bet <= max_bet, got {min_bet!r} and {max_bet!r}")
+    interval, timeout = settings["heartbeat_interval"], settings["heartbeat_timeout"]
+    if not is_number(interval) or interval <= 0:
+        raise ConfigError(f"heartbeat_interval must be a number of seconds > 0, got {interval!r}")
+    if not is_number(timeout) or not (timeout == 0 or timeout > interval):
+        raise ConfigError(f"heartbeat_timeout must be 0 or longer than heartbeat_interval, got {timeout!r}")
+    for key in ("max_clients", "max_clients_per_ip"):
+        if not isinstance(settings[key], int) or isinstance(settings[key], bool) or settings[key] < 1:
+            raise ConfigError(f"{key} must be a whole number >= 1, got {settings[key]!r}")
+    addresses = settings["admin_addresses"]
+    if not isinstance(addresses, list) or not all(isinstance(address, str) and address for address in addresses):
+        raise ConfigError(f"admin_addresses must be a list of IP addresses, got {addresses!r}")
+
+
+class TableConfig:
+    """One validated config version, with its paytables compiled for settle_seat."""
+
+    __slots__ = (
+        "settings", "version", "high_rank", "high_settlement", "low_settlement",
+        "max_history", "serial_port", "shoe_decks", "mongo_uri", "min_bet", "max_bet",
+        "heartbeat_interval", "heartbeat_timeout", "max_clients", "max_clients_per_ip", "admin_addresses",
+    )
+
+    def __init__(self, settings):
+        validate(settings)
+        self.settings = settings
+        self.version = settings["version"]
+        self.high_rank = dict(settings["high_hand_rankings"])
+        # combination -> (high_bet_result, high_payout)
+        self.high_settlement = {
+            combo: ("win", payout) if payout > 0 else ("lose", 0)
+            for combo, payout in settings["high_payouts"].items()
+        }
+        # low combination or None -> (low_combination, low_bet_result, low_payout)
+        self.low_settlement = {
+            combo: (combo, "win", payout) if payout > 0 else (combo, "push", 0)
+            for combo, payout in settings["low_payouts"].items()
+        }
+        self.low_settlement[None] = ("no_qualify", "lose", 0)
+        self.max_history = settings["max_history"]
+        self.serial_port = settings["serial_port"]
+        self.shoe_decks = settings["shoe_decks"]
+        self.mongo_uri = settings["mongo_uri"]
+        self.min_bet = settings["min_bet"]
+        self.max_bet = settings["max_bet"]
+        self.heartbeat_interval = settings["heartbeat_interval"]
+        self.heartbeat_timeout = settings["heartbeat_timeout"]
+        self.max_clients = settings["max_clients"]
+        self.max_clients_per_ip = settings["max_clients_per_ip"]
+        self.admin_addresses = frozenset(settings["admin_addresses"])
+
+    def __eq__(self, other):
+        return isinstance(other, TableConfig) and self.settings == other.settings
+
+
+def load_config(path):
+    """Reads, validates and compiles the config file; DEFAULT_CONFIG when the file does not exist."""
+    if not os.path.exists(path):
+        return TableConfig(dict(DEFAULT_CONFIG))
+    try:
+        with open(path) as f:
+            overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"could not read {path}: {e}") from e
+    if not isinstance(overrides, dict):
+        raise ConfigError(f"{path} must hold a JSON object")
+    unknown = sorted(set(overrides) - set(DEFAULT_CONFIG))
+    if unknown:
+        raise ConfigError(f"unknown settings {', '.join(unknown)}")
+    if "version" not in overrides:
+        raise ConfigError("version is required; bump it whenever the file changes")
+    return TableConfig({**DEFAULT_CONFIG, **overrides})
+
+
+def file_stamp(path):
+    """(modification time, size) of the config file, or None while it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
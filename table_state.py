@@ -0,0 +1,223 @@
+"""Game state model for server.py: the table, its seats and each round's results.
+
+Every field is declared up front (__slots__), so copying a state for undo and
+turning it into a wire message are explicit field-by-field operations rather
+than deepcopy and dict walks. to_wire() gives exactly the dicts clients have
+always received; pass codes=(card codes, enum codes) to get the compact form
+sent to msgpack clients without a separate conversion pass.
+"""
+
+PLAYER_IDS = ("player1", "player2", "player3", "player4", "player5", "player6")
+
+
+class SeatResult:
+    """One seat's evaluated bets for a round. Never mutated, so clones share it."""
+
+    __slots__ = (
+        "result",
+        "high_combination", "high_bet_result", "high_payout",
+        "low_combination", "low_bet_result", "low_payout",
+        "main_bet_result", "main_payout",
+    )
+    def __init__(self, result, high_combination, high_bet_result, high_payout,
+                 low_combination, low_bet_result, low_payout, main_bet_result, main_payout):
+        self.result = result
+        self.high_combination = high_combination
+        self.high_bet_result = high_bet_result
+        self.high_payout = high_payout
+        self.low_combination = low_combination
+        self.low_bet_result = low_bet_result
+        self.low_payout = low_payout
+        self.main_bet_result = main_bet_result
+        self.main_payout = main_payout
+
+    def __eq__(self, other):
+        return isinstance(other, SeatResult) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        return f"SeatResult({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+    def to_wire(self, codes=None):
+        """The bet fields sent with a revealed seat; "result" is sent by Player itself."""
+        if codes is None:
+            return {
+                "high_combination": self.high_combination,
+                "high_bet_result": self.high_bet_result,
+                "high_payout": self.high_payout,
+                "low_combination": self.low_combination,
+                "low_bet_result": self.low_bet_result,
+                "low_payout": self.low_payout,
+                "main_bet_result": self.main_bet_result,
+                "main_payout": self.main_payout,
+            }
+        enums = codes[1]
+        return {
+            "high_combination": enums.get(self.high_combination, self.high_combination),
+            "high_bet_result": enums.get(self.high_bet_result, self.high_bet_result),
+            "high_payout": self.high_payout,
+            "low_combination": enums.get(self.low_combination, self.low_combination),
+            "low_bet_result": enums.get(self.low_bet_result, self.low_bet_result),
+            "low_payout": self.low_payout,
+            "main_bet_result": enums.get(self.main_bet_result, self.main_bet_result),
+            "main_payout": self.main_payout,
+        }
+
+
+class RoundResult:
+    """The outcome of a whole round as computed by server.evaluate_round."""
+
+    __slots__ = ("dealer_combination", "dealer_qualifies", "winners", "seats")
+
+    def __init__(self, dealer_combination, dealer_qualifies, winners, seats):
+        self.dealer_combination = dealer_combination
+        self.dealer_qualifies = dealer_qualifies
+        self.winners = winners
+        self.seats = seats  # player id -> SeatResult
+
+
+class Player:
+    """One seat at the table."""
+
+    __slots__ = ("hand", "active", "result", "has_acted", "action_type", "results", "evaluation")
+
+    def __init__(self, hand=None, active=False, result=None, has_acted=False, action_type=None, results=None):
+        self.hand = hand if hand is not None else []
+        self.active = active
+        self.result = result  # What the seat's modal shows: win, lose, tie, ante or surrender
+        self.has_acted = has_acted
+        self.action_type = action_type  # play or surrender
+        self.results = results  # SeatResult once the round is revealed
+        self.evaluation = None  # server.evaluate_hand() of the hand once it has three cards; not sent
+
+    def clear_round(self):
+        """Forgets the cards, action and results of the last round."""
+        self.hand = []
+        self.result = None
+        self.has_acted = False
+        self.action_type = None
+        self.results = None
+        self.evaluation = None
+
+    def clone(self):
+        player = Player.__new__(Player)
+        player.hand = self.hand[:]
+        player.active = self.active
+        player.result = self.result
+        player.has_acted = self.has_acted
+        player.action_type = self.action_type
+        player.results = self.results
+        player.evaluation = self.evaluation
+        return player
+
+    def to_wire(self, codes=None):
+        if codes is None:
+            wire = {
+                "hand": self.hand[:],
+                "active": self.active,
+                "result": self.result,
+                "has_acted": self.has_acted,
+                "action_type": self.action_type,
+            }
+        else:
+            cards, enums = codes
+            wire = {
+                "hand": [cards.get(card, card) for card in self.hand],
+                "active": self.active,
+                "result": enums.get(self.result, self.result),
+                "has_acted": self.has_acted,
+                "action_type": enums.get(self.action_type, self.action_type),
+            }
+        if self.results is not None:
+            wire.update(self.results.to_wire(codes))
+        return wire
+
+    def public_wire(self, codes=None):
+        """The fields other seats' tablets may see."""
+        return {
+            "active": self.active,
+            "has_acted": self.has_acted,
+            "action_type": codes[1].get(self.action_type, self.action_type) if codes else self.action_type,
+        }
+
+
+class TableState:
+    """The whole table: dealer hand, seats, shoe and settings."""
+
+    __slots__ = (
+        "dealer_hand", "players", "deck", "burned_cards", "game_phase", "winners",
+        "min_bet", "max_bet", "table_number", "current_dealing_player", "cards_dealt",
+        "dealer_combination", "dealer_qualifies", "dealer_evaluation",
+    )
+
+    def __init__(self, min_bet=10, max_bet=1000, table_number="1FT"):
+        self.dealer_hand = []
+        self.players = {pid: Player() for pid in PLAYER_IDS}
+        self.deck = []
+        self.burned_cards = []
+        self.game_phase = "waiting"  # waiting, dealing, revealed, finished
+        self.winners = []
+        self.min_bet = min_bet
+        self.max_bet = max_bet
+        self.table_number = table_number
+        self.current_dealing_player = None
+        self.cards_dealt = 0
+        self.dealer_combination = None  # Set when the round is revealed
+        self.dealer_qualifies = None
+        self.dealer_evaluation = None  # server.evaluate_dealer_hand() once the dealer has three cards; not sent
+
+    def clear_round(self):
+        """Clears the dealer's hand, every seat's round data and the round's results."""
+        self.dealer_hand = []
+        for player in self.players.values():
+            player.clear_round()
+        self.winners = []
+        self.dealer_combination = None
+        self.dealer_qualifies = None
+        self.dealer_evaluation = None
+
+    def active_player_ids(self):
+        return [pid for pid, player in self.players.items() if player.active]
+
+    def clone(self):
+        state = TableState.__new__(TableState)
+        state.dealer_hand = self.dealer_hand[:]
+        state.players = {pid: player.clone() for pid, player in self.players.items()}
+        state.deck = self.deck[:]
+        state.burned_cards = self.burned_cards[:]
+        state.game_phase = self.game_phase
+        state.winners = self.winners[:]
+        state.min_bet = self.min_bet
+        state.max_bet = self.max_bet
+        state.table_number = self.table_number
+        state.current_dealing_player = self.current_dealing_player
+        state.cards_dealt = self.cards_dealt
+        state.dealer_combination = self.dealer_combination
+        state.dealer_qualifies = self.dealer_qualifies
+        state.dealer_evaluation = self.dealer_evaluation
+        return state
+
+    def players_wire(self, codes=None):
+        return {pid: player.to_wire(codes) for pid, player in self.players.items()}
+
+    def to_wire(self, codes=None):
+        """The full state as one dict, in the shape game_state has always had on the wire."""
+        cards, enums = codes if codes else ({}, {})
+        wire = {
+            "dealer_hand": [cards.get(card, card) for card in self.dealer_hand],
+            "players": self.players_wire(codes),
+            "deck": self.deck[:],
+            "burned_cards": self.burned_cards[:],
+            "game_phase": enums.get(self.game_phase, self.game_phase),
+            "winners": self.winners[:],
+            "min_bet": self.min_bet,
+            "max_bet": self.max_bet,
+            "table_number": self.table_number,
+            "current_dealing_player": self.current_dealing_player,
+            "cards_dealt": self.cards_dealt,
+        }
+        if self.dealer_combination is not None:
+            wire["dealer_combination"] = enums.get(self.dealer_combination, self.dealer_combination)
+            wire["dealer_qualifies"] = self.dealer_qualifies
+        return wire
@@ -0,0 +1,171 @@
+"""Sampled traces of a card's path from the shoe reader to the screens.
+
+server.py starts a CardTrace for a sampled shoe reader line and times each
+stage it passes through:
+
+    serial_read          reading and decoding the line from the port
+    queue_wait           waiting in the command queue
+    foolproof_deal_card  picking the hand and dealing the card, which includes
+      save_state         ... the undo snapshot
+      handle_add_card    ... adding the card to the hand
+    broadcast            from the handler returning to the batch's frames
+                         being sent (other commands in the batch, encoding, fan-out)
+
+The card_added frame carries the trace id; clients answer with trace_ack once
+they have rendered it, and the time from the broadcast to each ack is recorded
+by role. A trace is written to the trace file (one JSON object per line) when
+its ack window closes, from a worker thread so the event loop never waits on
+the disk.
+
+    python tracing.py traces.jsonl          # per-stage latency, per round
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from datetime import datetime
+
+log = logging.getLogger("miniflush.tracing")
+
+STAGES = ("serial_read", "queue_wait", "foolproof_deal_card", "save_state", "handle_add_card", "broadcast")
+
+
+class CardTrace:
+    """One card's timings; stages in milliseconds."""
+
+    __slots__ = ("id", "card", "round", "started", "stages", "target", "seq", "read_at", "sent_at", "acks")
+
+    def __init__(self, trace_id, card, round_number, read_at):
+        self.id = trace_id
+        self.card = card
+        self.round = round_number
+        self.started = datetime.now().isoformat(timespec="milliseconds")
+        self.stages = {}
+        self.target = None
+        self.seq = None
+        self.read_at = read_at
+        self.sent_at = None
+        self.acks = []  # [role, ms from broadcast to ack]
+
+    def stage(self, name, start, end=None):
+        """Records a stage that ran from start (a perf_counter reading) to end, default now."""
+        self.stages[name] = round(((end if end is not None else time.perf_counter()) - start) * 1000, 3)
+
+    def to_json(self):
+        return {
+            "trace": self.id,
+            "card": self.card,
+            "round": self.round,
+            "started": self.started,
+            "target": self.target,
+            "seq": self.seq,
+            "stages": self.stages,
+            "total_ms": round((self.sent_at - self.read_at) * 1000, 3) if self.sent_at is not None else None,
+            "acks": self.acks,
+        }
+
+
+class Tracer:
+    """Samples card traces, collects client acks and writes finished traces to path."""
+
+    def __init__(self, path=None, sample_rate=0.0, ack_seconds=2.0):
+        self.path = path
+        self.sample_rate = sample_rate if path else 0.0
+        self.ack_seconds = ack_seconds
+        self.random = random.Random()
+        self.ids = itertools.count(1)
+        self.prefix = f"{int(time.time()):x}"
+        self.round = 1
+        self.awaiting = {}  # trace id -> (trace, time its ack window closes)
+
+    def sample(self):
+        return self.sample_rate > 0 and self.random.random() < self.sample_rate
+
+    def start(self, card, read_at):
+        return CardTrace(f"{self.prefix}-{next(self.ids)}", card, self.round, read_at)
+
+    def new_round(self):
+        self.round += 1
+
+    def sent(self, trace, now, seq):
+        """The trace's frames went out at now; acks are collected until its window closes."""
+        trace.sent_at = now
+        trace.seq = seq
+        self.awaiting[trace.id] = (trace, now + self.ack_seconds)
+
+    def ack(self, trace_id, role, now):
+        entry = self.awaiting.get(trace_id)
+        if entry is not None:
+            trace = entry[0]
+            trace.acks.append([role, round((now - trace.sent_at) * 1000, 3)])
+
+    def collect(self, now):
+        """Removes and returns the traces whose ack window has closed."""
+        done = [trace for trace, closes in self.awaiting.values() if closes <= now]
+        for trace in done:
+            del self.awaiting[trace.id]
+        return done
+
+    def write(self, traces):
+        with open(self.path, "a") as f:
+            for trace in traces:
+                f.write(json.dumps(trace.to_json()) + "\n")
+
+    async def run(self):
+        """Writes finished traces to the trace file as their ack windows close."""
+        while True:
+            await asyncio.sleep(self.ack_seconds / 2)
+            done = self.collect(time.perf_counter())
+            if done:
+                try:
+                    await asyncio.to_thread(self.write, done)
+                except OSError as e:
+                    log.error("Could not write traces to %s: %s", self.path, e)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+
+def summarize(path):
+    """Per-round and overall p50/p95 of every stage in a trace file, as printable lines."""
+    rounds = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                trace = json.loads(line)
+                rounds.setdefault(trace["round"], []).append(trace)
+    columns = STAGES + ("total_ms", "ack_ms")
+    lines = [f"{'round':>6} {'cards':>5} " + " ".join(f"{name:>22}" for name in columns)]
+
+    def row(label, traces):
+        cells = []
+        for name in columns:
+            if name == "total_ms":
+                values = [t["total_ms"] for t in traces if t["total_ms"] is not None]
+            elif name == "ack_ms":
+                values = [ms for t in traces for _, ms in t["acks"]]
+            else:
+                values = [t["stages"][name] for t in traces if name in t["stages"]]
+            cells.append(f"{percentile(values, 50):.2f}/{percentile(values, 95):.2f}" if values else "-")
+        return f"{label:>6} {len(traces):>5} " + " ".join(f"{cell:>22}" for cell in cells)
+
+    for number, traces in sorted(rounds.items()):
+        lines.append(row(number, traces))
+    everything = [t for traces in rounds.values() for t in traces]
+    if everything:
+        lines.append(row("all", everything))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage card latency (p50/p95 ms) from a server.py trace file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    print("Each cell is p50/p95 in ms")
+    for line in summarize(args.path):
+        print(line)